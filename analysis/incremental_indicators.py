@@ -0,0 +1,312 @@
+import copy
+import math
+import sys
+from collections import deque
+import pandas as pd
+from analysis.technical_analysis import INDICATOR_KEY_MAPPING, INDICATOR_SPECS
+
+NAN = float('nan')
+# Every column calculate_technical_indicators adds, in the order it adds them
+COLUMNS = [column for _, columns in INDICATOR_SPECS for column in columns] + ['VWAP']
+
+def _div(numerator: float, denominator: float) -> float:
+    """Division with NumPy semantics, as in the pandas_ta formulas: x/0 is +-inf and 0/0 is NaN."""
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return NAN
+        return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+    return numerator / denominator
+
+def _non_zero_range(high: float, low: float) -> float:
+    """pandas_ta non_zero_range of one value: epsilon is added to a zero range (the batch version adds it to the whole series)."""
+    diff = high - low
+    return diff + sys.float_info.epsilon if diff == 0 else diff
+
+class _Ewm:
+    """
+    One step of pandas' exponentially weighted mean (ignore_na=False), so that the
+    incremental values match Series.ewm(...).mean() bar for bar.
+    """
+    def __init__(self, alpha: float, adjust: bool, min_periods: int = 0):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.nobs = 0
+        self.old_wt = 1.0
+        self.average = NAN
+
+    def update(self, value: float) -> float:
+        is_observation = not math.isnan(value)
+        if is_observation:
+            self.nobs += 1
+        if not math.isnan(self.average):
+            self.old_wt *= 1.0 - self.alpha
+            if is_observation:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if self.average != value:
+                    self.average = (self.old_wt * self.average + new_wt * value) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif is_observation:
+            self.average = value
+        return self.average if self.nobs >= self.min_periods else NAN
+
+class _Rma(_Ewm):
+    """pandas_ta rma: Wilder's moving average, ewm(alpha=1/length, min_periods=length)."""
+    def __init__(self, length: int):
+        super().__init__(1.0 / length, adjust=True, min_periods=length)
+
+class _Ema:
+    """
+    pandas_ta ema: seeded with the SMA of the first `length` values, then ewm(span=length, adjust=False).
+    Leading NaN inputs are skipped, which is how MACD feeds its signal line.
+    """
+    def __init__(self, length: int):
+        self.length = length
+        self._seed = []
+        self._ewm = _Ewm(2.0 / (length + 1), adjust=False)
+
+    def update(self, value: float) -> float:
+        if len(self._seed) < self.length:
+            if math.isnan(value):
+                return NAN
+            self._seed.append(value)
+            if len(self._seed) < self.length:
+                return NAN
+            value = sum(self._seed) / self.length
+        return self._ewm.update(value)
+
+class _RollingStats:
+    """
+    Mean and population standard deviation over the last `length` values, updated with
+    Welford add/remove steps. Like pandas' rolling(length), the result is NaN until the
+    window holds `length` non-NaN values, and a window of identical values has exactly that
+    mean and a zero deviation.
+    """
+    def __init__(self, length: int):
+        self.length = length
+        self._window = deque()
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._same = 0  # trailing run of identical values
+
+    def _add(self, value: float) -> None:
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+
+    def _remove(self, value: float) -> None:
+        self._count -= 1
+        if self._count == 0:
+            self._mean = self._m2 = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / self._count
+        self._m2 -= delta * (value - self._mean)
+
+    def update(self, value: float) -> None:
+        if math.isnan(value):
+            self._same = 0
+        else:
+            self._same = self._same + 1 if self._window and self._window[-1] == value else 1
+            self._add(value)
+        self._window.append(value)
+        if len(self._window) > self.length:
+            dropped = self._window.popleft()
+            if not math.isnan(dropped):
+                self._remove(dropped)
+
+    @property
+    def ready(self) -> bool:
+        return self._count == self.length
+
+    def mean(self) -> float:
+        if not self.ready:
+            return NAN
+        return self._window[-1] if self._same >= self.length else self._mean
+
+    def std(self) -> float:
+        if not self.ready:
+            return NAN
+        return 0.0 if self._same >= self.length else math.sqrt(max(self._m2 / self._count, 0.0))
+
+class _RollingExtreme:
+    """Rolling max (or min) over the last `length` values, with a monotonic deque."""
+    def __init__(self, length: int, maximum: bool):
+        self.length = length
+        self.maximum = maximum
+        self._position = 0
+        self._candidates = deque()  # (position, value), values monotonic from the front
+
+    def update(self, value: float) -> float:
+        if self.maximum:
+            while self._candidates and self._candidates[-1][1] <= value:
+                self._candidates.pop()
+        else:
+            while self._candidates and self._candidates[-1][1] >= value:
+                self._candidates.pop()
+        self._candidates.append((self._position, value))
+        if self._candidates[0][0] <= self._position - self.length:
+            self._candidates.popleft()
+        self._position += 1
+        return self._candidates[0][1] if self._position >= self.length else NAN
+
+class _Sma:
+    """pandas_ta sma of a series that starts at its first valid value (as stoch smooths %K and %D)."""
+    def __init__(self, length: int):
+        self._stats = _RollingStats(length)
+        self._started = False
+
+    def update(self, value: float) -> float:
+        self._started = self._started or not math.isnan(value)
+        if not self._started:
+            return NAN
+        self._stats.update(value)
+        return self._stats.mean()
+
+class IncrementalIndicators:
+    """
+    Streaming version of calculate_technical_indicators for one symbol and timeframe.
+    Every indicator keeps just enough state to fold in the next bar in constant time, and
+    reproduces the pandas_ta formulas of the default indicator set. `latest()` returns the same
+    dict as calculate_technical_indicators(df)[0] for the bars seen so far, and `row()` the
+    latest value of each of its columns (COLUMNS).
+
+    Bars must be closed and arrive in time order; seed the state with `from_frame(history)`
+    and then call `update(...)` per new bar, or `sync(df)` with a refreshed frame. A bar that
+    is still forming can be evaluated with `preview(...)`, which leaves the state unchanged.
+    """
+    def __init__(self):
+        self.last_timestamp = None
+        self.bars = 0
+        self._prev_high = self._prev_low = self._prev_close = NAN
+
+        self._ema = {length: _Ema(length) for length in (5, 10, 20, 50)}
+        self._sma = {length: _RollingStats(length) for length in (20, 50)}
+        self._rsi_gain, self._rsi_loss = _Rma(14), _Rma(14)
+        self._macd_fast, self._macd_slow, self._macd_signal = _Ema(12), _Ema(26), _Ema(9)
+        self._stoch_high, self._stoch_low = _RollingExtreme(14, maximum=True), _RollingExtreme(14, maximum=False)
+        self._stoch_k, self._stoch_d = _Sma(3), _Sma(3)
+        self._atr, self._dm_plus, self._dm_minus, self._adx = _Rma(14), _Rma(14), _Rma(14), _Rma(14)
+        self._obv = 0.0
+        self._vwap_day = None
+        self._vwap_price_volume = self._vwap_volume = 0.0
+
+        self._values = {column: NAN for column in COLUMNS}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'IncrementalIndicators':
+        """Builds the state by folding in every bar of a historical OHLCV frame."""
+        state = cls()
+        state.sync(df)
+        return state
+
+    def sync(self, df: pd.DataFrame) -> int:
+        """Folds in the bars of `df` that are newer than the last bar seen. Returns how many were added."""
+        if df is None or df.empty:
+            return 0
+        if self.last_timestamp is not None:
+            df = df.loc[df.index > self.last_timestamp]
+        columns = [df[col].to_numpy(dtype=float) for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+        for timestamp, open_, high, low, close, volume in zip(df.index, *columns):
+            self.update(timestamp, open_, high, low, close, volume)
+        return len(df)
+
+    def update(self, timestamp, open_: float, high: float, low: float, close: float, volume: float) -> dict:
+        """Folds in one closed bar and returns the latest indicator values."""
+        timestamp = pd.Timestamp(timestamp)
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            raise ValueError(f"Bar at {timestamp} is not newer than the last bar at {self.last_timestamp}.")
+        values = self._values
+        first_bar = self.bars == 0
+
+        for length, ema in self._ema.items():
+            values[f'EMA_{length}'] = ema.update(close)
+        for length, sma in self._sma.items():
+            sma.update(close)
+            values[f'SMA_{length}'] = sma.mean()
+
+        # RSI: Wilder averages of the gains and losses
+        change = close - self._prev_close
+        gain = NAN if first_bar else max(change, 0.0)
+        loss = NAN if first_bar else -min(change, 0.0)
+        average_gain, average_loss = self._rsi_gain.update(gain), self._rsi_loss.update(loss)
+        values['RSI_14'] = _div(100.0 * average_gain, average_gain + average_loss)
+
+        # MACD: the signal line is an EMA of the MACD line from its first value
+        macd = self._macd_fast.update(close) - self._macd_slow.update(close)
+        signal = self._macd_signal.update(macd)
+        values['MACD_12_26_9'], values['MACDs_12_26_9'], values['MACDh_12_26_9'] = macd, signal, macd - signal
+
+        # Bollinger Bands (20, 2.0), population standard deviation
+        band_stats = self._sma[20]
+        middle, deviation = band_stats.mean(), band_stats.std()
+        values['BBM_20_2.0'] = middle
+        values['BBU_20_2.0'] = upper = middle + 2.0 * deviation
+        values['BBL_20_2.0'] = lower = middle - 2.0 * deviation
+        band_range = _non_zero_range(upper, lower)
+        values['BBB_20_2.0'] = _div(100.0 * band_range, middle)
+        values['BBP_20_2.0'] = _div(_non_zero_range(close, lower), band_range)
+
+        # Stochastic (14, 3, 3)
+        highest, lowest = self._stoch_high.update(high), self._stoch_low.update(low)
+        stoch = _div(100.0 * (close - lowest), _non_zero_range(highest, lowest))
+        values['STOCHk_14_3_3'] = stoch_k = self._stoch_k.update(stoch)
+        values['STOCHd_14_3_3'] = self._stoch_d.update(stoch_k)
+
+        # ATR and ADX share the Wilder-smoothed true range
+        if first_bar:
+            true_range = dm_plus = dm_minus = NAN
+        else:
+            true_range = max(abs(_non_zero_range(high, low)), abs(high - self._prev_close), abs(self._prev_close - low))
+            up, down = high - self._prev_high, self._prev_low - low
+            # Moves below epsilon count as zero
+            dm_plus = up if up > down and up >= sys.float_info.epsilon else 0.0
+            dm_minus = down if down > up and down >= sys.float_info.epsilon else 0.0
+        atr = self._atr.update(true_range)
+        scale = _div(100.0, atr)
+        di_plus = scale * self._dm_plus.update(dm_plus)
+        di_minus = scale * self._dm_minus.update(dm_minus)
+        dx = _div(100.0 * abs(di_plus - di_minus), di_plus + di_minus)
+        values['ATRr_14'] = atr
+        values['DMP_14'], values['DMN_14'] = di_plus, di_minus
+        values['ADX_14'] = self._adx.update(dx)
+
+        # OBV: the first bar counts as an up bar
+        direction = 1.0 if first_bar or change > 0 else (-1.0 if change < 0 else 0.0)
+        self._obv += direction * volume
+        values['OBV'] = self._obv
+
+        # VWAP anchored to the calendar day
+        day = timestamp.date()
+        if day != self._vwap_day:
+            self._vwap_day = day
+            self._vwap_price_volume = self._vwap_volume = 0.0
+        self._vwap_price_volume += (high + low + close) / 3.0 * volume
+        self._vwap_volume += volume
+        values['VWAP'] = _div(self._vwap_price_volume, self._vwap_volume)
+
+        self._prev_high, self._prev_low, self._prev_close = high, low, close
+        self.last_timestamp = timestamp
+        self.bars += 1
+        return self.latest()
+
+    def preview(self, timestamp, open_: float, high: float, low: float, close: float, volume: float) -> 'IncrementalIndicators':
+        """A copy of the state with a bar that is still forming folded in; this state is left unchanged."""
+        state = copy.deepcopy(self)
+        state.update(timestamp, open_, high, low, close, volume)
+        return state
+
+    def row(self) -> list[float]:
+        """The latest value of each column in COLUMNS (NaN when not yet available)."""
+        return [self._values[column] for column in COLUMNS]
+
+    def latest(self) -> dict:
+        """The latest indicator values, keyed as in INDICATOR_KEY_MAPPING (None when not yet available)."""
+        if self.bars == 0:
+            return {}
+        return {
+            new_key: (None if math.isnan(self._values[column]) else float(self._values[column]))
+            for column, new_key in INDICATOR_KEY_MAPPING.items()
+        }
@@ -0,0 +1,312 @@
+import sys
+from functools import cached_property
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Indicator kernels for the default indicator set. They reproduce the pandas_ta 0.3.14b formulas (and
+# column names) on plain float64 arrays, computing the intermediates several indicators share (the
+# close-to-close change, the true range, the 20-bar rolling statistics) once per frame. The
+# recursive and windowed steps run as loops compiled with numba (a requirement); an install
+# without numba falls back to pandas' compiled ewm/rolling routines.
+
+def _jit(func):
+    return numba.njit(cache=True, nogil=True)(func) if numba is not None else None
+
+def _ewm_loop(values, alpha, adjust, min_periods):
+    # pandas' ewma with ignore_na=False (see incremental_indicators._Ewm)
+    out = np.empty(values.size)
+    average = np.nan
+    old_wt = 1.0
+    new_wt = 1.0 if adjust else alpha
+    nobs = 0
+    for i in range(values.size):
+        value = values[i]
+        is_observation = not np.isnan(value)
+        if is_observation:
+            nobs += 1
+        if not np.isnan(average):
+            old_wt *= 1.0 - alpha
+            if is_observation:
+                if average != value:
+                    average = (old_wt * average + new_wt * value) / (old_wt + new_wt)
+                old_wt = old_wt + new_wt if adjust else 1.0
+        elif is_observation:
+            average = value
+        out[i] = average if nobs >= min_periods else np.nan
+    return out
+
+def _rolling_mean_std_loop(values, length):
+    # Mean and population standard deviation over full windows of non-NaN values, with Welford add/remove
+    # steps; like pandas, a window of identical values gets exactly that mean and a zero deviation
+    mean_out = np.full(values.size, np.nan)
+    std_out = np.full(values.size, np.nan)
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    same = 0
+    for i in range(values.size):
+        value = values[i]
+        if not np.isnan(value):
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+            same = same + 1 if i > 0 and value == values[i - 1] else 1
+        else:
+            same = 0
+        if i >= length:
+            dropped = values[i - length]
+            if not np.isnan(dropped):
+                count -= 1
+                if count == 0:
+                    mean = m2 = 0.0
+                else:
+                    delta = dropped - mean
+                    mean -= delta / count
+                    m2 -= delta * (dropped - mean)
+        if count == length:
+            if same >= length:
+                mean_out[i] = value
+                std_out[i] = 0.0
+            else:
+                mean_out[i] = mean
+                std_out[i] = np.sqrt(max(m2 / count, 0.0))
+    return mean_out, std_out
+
+def _rolling_extreme_loop(values, length, maximum):
+    out = np.full(values.size, np.nan)
+    for i in range(length - 1, values.size):
+        extreme = values[i]
+        for j in range(i - length + 1, i):
+            value = values[j]
+            if np.isnan(value) or np.isnan(extreme):
+                extreme = np.nan
+                break
+            if (value > extreme) if maximum else (value < extreme):
+                extreme = value
+        out[i] = extreme
+    return out
+
+_ewm_kernel = _jit(_ewm_loop)
+_rolling_mean_std_kernel = _jit(_rolling_mean_std_loop)
+_rolling_extreme_kernel = _jit(_rolling_extreme_loop)
+
+def ewm_mean(values: np.ndarray, alpha: float, adjust: bool = True, min_periods: int = 0) -> np.ndarray:
+    """Series.ewm(alpha=alpha, adjust=adjust, min_periods=min_periods).mean() of a float64 array."""
+    if _ewm_kernel is not None:
+        return _ewm_kernel(values, alpha, adjust, max(min_periods, 1))
+    return pd.Series(values).ewm(alpha=alpha, adjust=adjust, min_periods=min_periods).mean().to_numpy()
+
+def rolling_mean_std(values: np.ndarray, length: int) -> tuple[np.ndarray, np.ndarray]:
+    """rolling(length).mean() and rolling(length).std(ddof=0) of a float64 array, in one pass."""
+    if _rolling_mean_std_kernel is not None:
+        return _rolling_mean_std_kernel(values, length)
+    rolling = pd.Series(values).rolling(length)
+    return rolling.mean().to_numpy(), rolling.std(ddof=0).to_numpy()
+
+def rolling_extreme(values: np.ndarray, length: int, maximum: bool) -> np.ndarray:
+    """rolling(length).max() (or .min()) of a float64 array."""
+    if _rolling_extreme_kernel is not None:
+        return _rolling_extreme_kernel(values, length, maximum)
+    rolling = pd.Series(values).rolling(length)
+    return (rolling.max() if maximum else rolling.min()).to_numpy()
+
+def _from_first_valid(values: np.ndarray, func) -> np.ndarray:
+    """Applies `func` to `values` from their first non-NaN value on, as pandas_ta does with series.loc[first_valid_index():]."""
+    out = np.full(values.size, np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if valid.size:
+        out[valid[0]:] = func(values[valid[0]:])
+    return out
+
+def _non_zero_range(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """pandas_ta non_zero_range: high - low, plus machine epsilon everywhere if any range is zero."""
+    diff = high - low
+    if (diff == 0).any():
+        diff += sys.float_info.epsilon
+    return diff
+
+def sma(close: np.ndarray, length: int) -> np.ndarray:
+    return rolling_mean_std(close, length)[0]
+
+def ema(close: np.ndarray, length: int) -> np.ndarray:
+    """pandas_ta ema: seeded with the SMA of the first `length` values, then ewm(span=length, adjust=False)."""
+    seeded = np.full(close.size, np.nan)
+    if close.size >= length:
+        seeded[length - 1] = close[:length].mean()
+        seeded[length:] = close[length:]
+    return ewm_mean(seeded, 2.0 / (length + 1), adjust=False)
+
+def rma(values: np.ndarray, length: int) -> np.ndarray:
+    """pandas_ta rma (Wilder's moving average): ewm(alpha=1/length, min_periods=length)."""
+    return ewm_mean(values, 1.0 / length, adjust=True, min_periods=length)
+
+class Inputs:
+    """The OHLCV columns of a frame as contiguous float64 arrays, with the intermediates that several indicators share."""
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        self.open = df['Open'].to_numpy(dtype=np.float64)
+        self.high = df['High'].to_numpy(dtype=np.float64)
+        self.low = df['Low'].to_numpy(dtype=np.float64)
+        self.close = df['Close'].to_numpy(dtype=np.float64)
+        self.volume = df['Volume'].to_numpy(dtype=np.float64)
+        self.size = self.close.size
+        self._atr = {}
+        self._close_stats = {}
+
+    @cached_property
+    def change(self) -> np.ndarray:
+        """close.diff(1)"""
+        change = np.empty(self.size)
+        change[:1] = np.nan
+        np.subtract(self.close[1:], self.close[:-1], out=change[1:])
+        return change
+
+    @cached_property
+    def true_range(self) -> np.ndarray:
+        """pandas_ta true_range: max(|high - low|, |high - prev close|, |prev close - low|), NaN on the first bar."""
+        prev_close = np.concatenate([[np.nan], self.close[:-1]])
+        ranges = np.abs(np.vstack([_non_zero_range(self.high, self.low), self.high - prev_close, prev_close - self.low]))
+        true_range = np.fmax(np.fmax(ranges[0], ranges[1]), ranges[2])
+        true_range[:1] = np.nan
+        return true_range
+
+    def atr(self, length: int) -> np.ndarray:
+        """rma of the true range, shared by ATR and ADX."""
+        if length not in self._atr:
+            self._atr[length] = rma(self.true_range, length)
+        return self._atr[length]
+
+    def rolling_mean_std(self, length: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rolling mean and population standard deviation of the close, shared by SMA and the Bollinger Bands."""
+        if length not in self._close_stats:
+            self._close_stats[length] = rolling_mean_std(self.close, length)
+        return self._close_stats[length]
+
+def _ema(inputs: Inputs, length: int = 10) -> dict:
+    if inputs.size < length:
+        return {}
+    return {f'EMA_{length}': ema(inputs.close, length)}
+
+def _sma(inputs: Inputs, length: int = 10) -> dict:
+    if inputs.size < length:
+        return {}
+    return {f'SMA_{length}': inputs.rolling_mean_std(length)[0]}
+
+def _rsi(inputs: Inputs, length: int = 14) -> dict:
+    if inputs.size < length:
+        return {}
+    change = inputs.change
+    positive_avg = rma(np.where(change < 0, 0.0, change), length)
+    negative_avg = rma(np.where(change > 0, 0.0, change), length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {f'RSI_{length}': 100.0 * positive_avg / (positive_avg + np.abs(negative_avg))}
+
+def _macd(inputs: Inputs, fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
+    if inputs.size < max(fast, slow, signal):
+        return {}
+    macd = ema(inputs.close, fast) - ema(inputs.close, slow)
+    signal_line = _from_first_valid(macd, lambda values: ema(values, signal))
+    props = f'_{fast}_{slow}_{signal}'
+    return {f'MACD{props}': macd, f'MACDh{props}': macd - signal_line, f'MACDs{props}': signal_line}
+
+def _bbands(inputs: Inputs, length: int = 5, std: float = 2.0) -> dict:
+    if inputs.size < length:
+        return {}
+    std = float(std)
+    mid, deviation = inputs.rolling_mean_std(length)
+    lower, upper = mid - std * deviation, mid + std * deviation
+    props = f'_{length}_{std}'
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upper_lower_range = _non_zero_range(upper, lower)
+        return {f'BBL{props}': lower, f'BBM{props}': mid, f'BBU{props}': upper,
+                f'BBB{props}': 100.0 * upper_lower_range / mid,
+                f'BBP{props}': _non_zero_range(inputs.close, lower) / upper_lower_range}
+
+def _stoch(inputs: Inputs, k: int = 14, d: int = 3, smooth_k: int = 3) -> dict:
+    if inputs.size < max(k, d, smooth_k):
+        return {}
+    lowest_low = rolling_extreme(inputs.low, k, maximum=False)
+    highest_high = rolling_extreme(inputs.high, k, maximum=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stoch = 100.0 * (inputs.close - lowest_low) / _non_zero_range(highest_high, lowest_low)
+    stoch_k = _from_first_valid(stoch, lambda values: sma(values, smooth_k))
+    stoch_d = _from_first_valid(stoch_k, lambda values: sma(values, d))
+    props = f'_{k}_{d}_{smooth_k}'
+    return {f'STOCHk{props}': stoch_k, f'STOCHd{props}': stoch_d}
+
+def _adx(inputs: Inputs, length: int = 14) -> dict:
+    if inputs.size < length:
+        return {}
+    up = np.concatenate([[np.nan], np.diff(inputs.high)])
+    down = np.concatenate([[np.nan], -np.diff(inputs.low)])
+    # (condition) * move, so the first bar stays NaN; moves below epsilon count as zero
+    positive = ((up > down) & (up > 0)) * up
+    negative = ((down > up) & (down > 0)) * down
+    positive[np.abs(positive) < sys.float_info.epsilon] = 0.0
+    negative[np.abs(negative) < sys.float_info.epsilon] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = 100.0 / inputs.atr(length)
+        dmp = scale * rma(positive, length)
+        dmn = scale * rma(negative, length)
+        dx = 100.0 * np.abs(dmp - dmn) / (dmp + dmn)
+    return {f'ADX_{length}': rma(dx, length), f'DMP_{length}': dmp, f'DMN_{length}': dmn}
+
+def _obv(inputs: Inputs) -> dict:
+    # The first bar counts as an up bar
+    sign = np.sign(inputs.change)
+    sign[:1] = 1.0
+    return {'OBV': np.cumsum(sign * inputs.volume)}
+
+def _atr(inputs: Inputs, length: int = 14) -> dict:
+    if inputs.size < length:
+        return {}
+    return {f'ATRr_{length}': inputs.atr(length)}
+
+def vwap(inputs: Inputs) -> np.ndarray:
+    """pandas_ta vwap anchored to the calendar day of each timestamp: cumulative (hlc3 * volume) / cumulative volume."""
+    index = pd.DatetimeIndex(inputs.index)
+    index = index.tz_localize(None) if index.tz is not None else index
+    days = index.asi8 // (24 * 3600 * 10**9)
+    order = np.argsort(days, kind='stable')
+    price_volume = ((inputs.high + inputs.low + inputs.close) / 3.0 * inputs.volume)[order]
+    volume = inputs.volume[order]
+    starts = np.flatnonzero(np.concatenate([[True], days[order][1:] != days[order][:-1]])) if inputs.size else np.empty(0, dtype=int)
+    out = np.empty(inputs.size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[order] = _group_cumsum(price_volume, starts) / _group_cumsum(volume, starts)
+    return out
+
+def _group_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Cumulative sums restarting at each of `starts`."""
+    totals = np.cumsum(values)
+    offsets = np.concatenate([[0.0], totals[starts[1:] - 1]]) if starts.size else np.empty(0)
+    return totals - np.repeat(offsets, np.diff(np.append(starts, values.size)))
+
+KERNELS = {
+    'ema': _ema,
+    'sma': _sma,
+    'rsi': _rsi,
+    'macd': _macd,
+    'bbands': _bbands,
+    'stoch': _stoch,
+    'adx': _adx,
+    'obv': _obv,
+    'atr': _atr,
+}
+
+def compute(inputs: Inputs, spec: dict) -> dict:
+    """
+    The columns of one indicator spec ({"kind": ..., **params}, as in INDICATOR_SPECS), named as pandas_ta
+    names them. Like pandas_ta, an indicator returns no columns for a frame shorter than its length.
+    """
+    params = {key: value for key, value in spec.items() if key != 'kind'}
+    kind = spec['kind']
+    if kind not in KERNELS:
+        raise ValueError(f"No indicator kernel for '{kind}'. Expected one of {list(KERNELS)}.")
+    return KERNELS[kind](inputs, **params)
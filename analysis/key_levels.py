@@ -0,0 +1,148 @@
+import bisect
+import numpy as np
+import pandas as pd
+
+LEVELS_LOOKBACK = pd.Timedelta(days=90)
+
+# Every level of the index with its side, in the order get_key_levels lists them
+LEVEL_SIDES = {
+    'daily_90d_low': 'support',
+    'previous_day_low': 'support',
+    'swing_50_retracement': 'support',
+    'daily_90d_high': 'resistance',
+    'previous_day_high': 'resistance',
+    'measured_move_1x': 'resistance',
+    'measured_move_2x': 'resistance',
+}
+
+def _window_reduce(ufunc, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """ufunc.reduce over values[start:end] for every window at once; NaN for empty windows."""
+    bounds = np.empty(2 * len(starts), dtype=np.intp)
+    bounds[0::2], bounds[1::2] = starts, ends
+    # The sentinel keeps end == len(values) a valid reduceat index
+    reduced = ufunc.reduceat(np.append(values, np.nan), bounds)[0::2] if len(starts) else np.empty(0)
+    return np.where(ends > starts, reduced, np.nan)
+
+def _range_levels(high: np.ndarray, low: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> dict:
+    high_90d = _window_reduce(np.maximum, high, starts, ends)
+    low_90d = _window_reduce(np.minimum, low, starts, ends)
+    return {'daily_90d_high': high_90d, 'daily_90d_low': low_90d,
+            'swing_50_retracement': high_90d - 0.5 * (high_90d - low_90d)}
+
+def _previous_day_levels(high: np.ndarray, low: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> dict:
+    prev = ends - 1
+    has_prev = prev >= 0
+    prev_high = np.where(has_prev, high[prev], np.nan) if len(high) else np.full(len(ends), np.nan)
+    prev_low = np.where(has_prev, low[prev], np.nan) if len(low) else np.full(len(ends), np.nan)
+    prev_range = prev_high - prev_low
+    return {'previous_day_high': prev_high, 'previous_day_low': prev_low,
+            'measured_move_1x': prev_high + prev_range, 'measured_move_2x': prev_high + 2 * prev_range}
+
+# Each builder gets the daily highs and lows with, per date, the first bar of its lookback and the
+# end (exclusive) of the bars before it, and returns one array per level. New kinds of levels
+# (e.g. swing pivots) are added with a builder here and their sides in LEVEL_SIDES.
+LEVEL_BUILDERS = [_range_levels, _previous_day_levels]
+
+class SortedLevels:
+    """Key levels as one sorted array, so that proximity checks are a bisection instead of a scan."""
+    def __init__(self, key_levels: dict):
+        items = sorted((float(value), side) for side, levels in key_levels.items() for value in levels.values())
+        self.values = [value for value, _ in items]
+        self.sides = [side for _, side in items]
+
+    def side_values(self, side: str) -> np.ndarray:
+        return np.array([value for value, s in zip(self.values, self.sides) if s == side], dtype=float)
+
+    def nearest(self, price: float, tolerance_percent: float = 0.005) -> tuple[str | None, float | None]:
+        """
+        The level nearest to `price` among those within tolerance (|price - level| / level), as
+        (side, level), or (None, None). Levels are positive prices, so the levels within tolerance
+        form an interval around the price and only its two neighbours need checking.
+        """
+        i = bisect.bisect_left(self.values, price)
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.values):
+                value = self.values[j]
+                if abs(price - value) / value <= tolerance_percent and (
+                        best is None or abs(price - value) < abs(price - self.values[best])):
+                    best = j
+        if best is None:
+            return None, None
+        return self.sides[best], self.values[best]
+
+def near_level(prices: np.ndarray, level_values: np.ndarray, tolerance_percent: float) -> np.ndarray:
+    """
+    True where a price is within tolerance of any of the ascending `level_values`: one
+    searchsorted over the whole series, then the neighbours on both sides are checked.
+    """
+    if level_values.size == 0:
+        return np.zeros(prices.shape, dtype=bool)
+    i = np.searchsorted(level_values, prices)
+    below = level_values[np.maximum(i - 1, 0)]
+    above = level_values[np.minimum(i, level_values.size - 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.abs(prices - below) / below <= tolerance_percent) | (np.abs(prices - above) / above <= tolerance_percent)
+
+class KeyLevelIndex:
+    """
+    Key levels of one symbol per date, as known at the open of that date: the 90-day range and its
+    50% retracement, and the previous day's range with its measured moves, from the daily bars
+    before the date only. Held as one (dates x levels) array; to_frame/from_frame persist it.
+    """
+    def __init__(self, dates: pd.DatetimeIndex, values: np.ndarray):
+        self.dates = pd.DatetimeIndex(dates)
+        self.values = values
+        self.names = list(LEVEL_SIDES)
+
+    @classmethod
+    def build(cls, df_daily: pd.DataFrame, dates: pd.DatetimeIndex = None) -> 'KeyLevelIndex':
+        """Builds the levels for `dates` (by default, the date of every daily bar) in one vectorized pass."""
+        if df_daily is None:
+            df_daily = pd.DataFrame({'High': [], 'Low': []}, index=pd.DatetimeIndex([]))
+        if not df_daily.index.is_monotonic_increasing:
+            df_daily = df_daily.sort_index()
+        dates = pd.DatetimeIndex(df_daily.index if dates is None else dates)
+        stamps = pd.DatetimeIndex(df_daily.index).asi8
+        high = df_daily['High'].to_numpy(dtype=float)
+        low = df_daily['Low'].to_numpy(dtype=float)
+        ends = np.searchsorted(stamps, dates.asi8, side='left')
+        starts = np.searchsorted(stamps, dates.asi8 - LEVELS_LOOKBACK.value, side='left')
+
+        levels = {}
+        for builder in LEVEL_BUILDERS:
+            levels.update(builder(high, low, starts, ends))
+        values = np.column_stack([levels[name] for name in LEVEL_SIDES]) if len(dates) else np.empty((0, len(LEVEL_SIDES)))
+        return cls(dates, values)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.dates.rename('date'), columns=self.names)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'KeyLevelIndex':
+        return cls(df.index, df[list(LEVEL_SIDES)].to_numpy(dtype=float))
+
+    def price_action(self, date, current_high: float = None, current_low: float = None) -> dict:
+        """
+        The levels of the latest date at or before `date`, without the missing ones. With the
+        high and low of `date`'s bar so far, the 90-day range includes it, as analyze_price_action
+        does with the forming daily bar.
+        """
+        row = int(self.dates.searchsorted(pd.Timestamp(date), side='right')) - 1
+        levels = dict(zip(self.names, self.values[row].tolist())) if row >= 0 else dict.fromkeys(self.names, np.nan)
+        if current_high is not None and current_low is not None:
+            levels['daily_90d_high'] = np.fmax(levels['daily_90d_high'], current_high)
+            levels['daily_90d_low'] = np.fmin(levels['daily_90d_low'], current_low)
+            high_90d, low_90d = levels['daily_90d_high'], levels['daily_90d_low']
+            levels['swing_50_retracement'] = high_90d - 0.5 * (high_90d - low_90d)
+        return {name: value for name, value in levels.items() if not np.isnan(value)}
+
+    def key_levels(self, date, current_high: float = None, current_low: float = None) -> dict:
+        """The levels in the {'support': {...}, 'resistance': {...}} form of get_key_levels."""
+        levels = {'support': {}, 'resistance': {}}
+        for name, value in self.price_action(date, current_high, current_low).items():
+            levels[LEVEL_SIDES[name]][name] = value
+        return levels
+
+    def sorted_levels(self, date, current_high: float = None, current_low: float = None) -> SortedLevels:
+        return SortedLevels(self.key_levels(date, current_high, current_low))
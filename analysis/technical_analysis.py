@@ -1,6 +1,7 @@
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
+from analysis import indicator_kernels
+from analysis.key_levels import SortedLevels, near_level
 
 def get_key_levels(analysis_data: dict) -> dict:
     """Extracts all key support and resistance levels from the analysis data."""
@@ -25,16 +26,75 @@ def get_key_levels(analysis_data: dict) -> dict:
     levels['resistance'] = {k: v for k, v in levels['resistance'].items() if v is not None}
     return levels
 
-def check_proximity_to_levels(price: float, levels: dict, tolerance_percent: float = 0.005) -> tuple[str | None, float | None]:
-    """Checks if a price is close to any of the key levels."""
-    for level_type, level_values in levels.items():
-        for name, value in level_values.items():
-            if abs(price - value) / value <= tolerance_percent:
-                return level_type, value
-    return None, None
-
+def check_proximity_to_levels(price: float, levels, tolerance_percent: float = 0.005) -> tuple[str | None, float | None]:
+    """
+    Checks if a price is close to any of the key levels; returns the (level_type, value) of the nearest one.
+    `levels` is a get_key_levels dict, or a SortedLevels built from one to reuse across checks.
+    """
+    if not isinstance(levels, SortedLevels):
+        levels = SortedLevels(levels)
+    return levels.nearest(price, tolerance_percent)
+
+def _level_values(levels: dict) -> np.ndarray:
+    """Level values in ascending order, for near_level."""
+    return np.sort(np.fromiter(levels.values(), dtype=float, count=len(levels)))
+
+PIN_BAR_COLUMNS = ['Body', 'Upper_Shadow', 'Lower_Shadow', 'Pin_Bar', 'shadow_to_body_ratio']
+
+# Each spec of the default indicator set, with the columns it appends (named as pandas_ta names
+# them; see indicator_kernels). Specs whose columns are already present are not recomputed.
+INDICATOR_SPECS = [
+    ({"kind": "ema", "length": 5}, ['EMA_5']),
+    ({"kind": "ema", "length": 10}, ['EMA_10']),
+    ({"kind": "ema", "length": 20}, ['EMA_20']),
+    ({"kind": "ema", "length": 50}, ['EMA_50']),
+    ({"kind": "sma", "length": 20}, ['SMA_20']),
+    ({"kind": "sma", "length": 50}, ['SMA_50']),
+    ({"kind": "rsi"}, ['RSI_14']),
+    ({"kind": "macd"}, ['MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9']),
+    ({"kind": "bbands", "length": 20}, ['BBL_20_2.0', 'BBM_20_2.0', 'BBU_20_2.0', 'BBB_20_2.0', 'BBP_20_2.0']),
+    ({"kind": "stoch"}, ['STOCHk_14_3_3', 'STOCHd_14_3_3']),
+    ({"kind": "adx"}, ['ADX_14', 'DMP_14', 'DMN_14']),
+    ({"kind": "obv"}, ['OBV']),
+    ({"kind": "atr"}, ['ATRr_14']),
+]
+
+# Maps indicator columns to the keys of the latest-values dict.
+INDICATOR_KEY_MAPPING = {
+    'EMA_5': 'ema_5',
+    'EMA_10': 'ema_10',
+    'EMA_20': 'ema_20',
+    'EMA_50': 'ema_50',
+    'SMA_20': 'sma_20',
+    'SMA_50': 'sma_50',
+    'RSI_14': 'rsi',
+    'MACD_12_26_9': 'macd_line',
+    'MACDs_12_26_9': 'macd_signal',
+    'MACDh_12_26_9': 'macd_hist',
+    'BBU_20_2.0': 'bb_upper',
+    'BBM_20_2.0': 'bb_middle',
+    'BBL_20_2.0': 'bb_lower',
+    'STOCHk_14_3_3': 'stoch_k',
+    'STOCHd_14_3_3': 'stoch_d',
+    'ADX_14': 'adx',
+    'OBV': 'obv',
+    'ATRr_14': 'atr',
+    'VWAP': 'vwap'
+}
+
+def has_pin_bar_columns(df: pd.DataFrame) -> bool:
+    return all(col in df.columns for col in PIN_BAR_COLUMNS)
+
+def missing_indicator_specs(df: pd.DataFrame) -> list:
+    """Returns the indicator specs whose output columns are not yet in the DataFrame."""
+    return [spec for spec, columns in INDICATOR_SPECS if not all(col in df.columns for col in columns)]
+
+def has_indicators(df: pd.DataFrame) -> bool:
+    return 'VWAP' in df.columns and not missing_indicator_specs(df)
 
 def detect_pin_bar(df):
+    if has_pin_bar_columns(df):
+        return df
     df['Body'] = abs(df['Close'] - df['Open'])
     df['Upper_Shadow'] = df['High'] - df[['Open', 'Close']].max(axis=1)
     df['Lower_Shadow'] = df[['Open', 'Close']].min(axis=1) - df['Low']
@@ -43,75 +103,53 @@ def detect_pin_bar(df):
     df['shadow_to_body_ratio'] = np.where(df['Body'] > 0, (df['Upper_Shadow'] + df['Lower_Shadow']) / df['Body'], 0)
     return df
 
-def calculate_vwap(df):
-    df['VWAP'] = ta.vwap(df['High'], df['Low'], df['Close'], df['Volume'])
+def calculate_vwap(df, inputs: indicator_kernels.Inputs = None):
+    df['VWAP'] = indicator_kernels.vwap(inputs or indicator_kernels.Inputs(df))
     return df
 
+def get_latest_indicators(df: pd.DataFrame) -> dict:
+    """Extracts the latest value of each indicator column, keyed as in INDICATOR_KEY_MAPPING."""
+    indicators = {}
+    if df is None or df.empty:
+        return indicators
+
+    latest = df.iloc[-1]
+    for original_key, new_key in INDICATOR_KEY_MAPPING.items():
+        value = latest.get(original_key)
+        indicators[new_key] = float(value) if pd.notna(value) else None
+    return indicators
+
 def calculate_technical_indicators(df: pd.DataFrame) -> tuple[dict, pd.DataFrame]:
     """
     Calculates a wide range of technical indicators for a given DataFrame.
+    Indicators whose columns are already present are not recomputed, and the DataFrame
+    is only modified (in place) when columns have to be added.
     Returns a tuple: (latest_indicators_dict, df_with_indicators).
     """
     if df is None or df.empty:
         return {}, df
 
-    # Create a custom strategy for comprehensive indicators
-    custom_strategy = ta.Strategy(
-        name="Comprehensive Indicators",
-        description="A collection of common technical indicators.",
-        ta=[
-            {"kind": "ema", "length": 5},
-            {"kind": "ema", "length": 10},
-            {"kind": "ema", "length": 20},
-            {"kind": "ema", "length": 50},
-            {"kind": "sma", "length": 20},
-            {"kind": "sma", "length": 50},
-            {"kind": "rsi"},
-            {"kind": "macd"},
-            {"kind": "bbands", "length": 20},
-            {"kind": "stoch"},
-            {"kind": "adx"},
-            {"kind": "obv"},
-            {"kind": "atr"},
-        ]
-    )
-    
-    # Apply the strategy to the DataFrame (modifies df in place)
-    df.ta.strategy(custom_strategy)
-    df = calculate_vwap(df)
+    missing_specs = missing_indicator_specs(df)
+    if missing_specs or 'VWAP' not in df.columns:
+        # The OHLCV arrays and the intermediates the indicators share are extracted once
+        inputs = indicator_kernels.Inputs(df)
+        for spec in missing_specs:
+            for column, values in indicator_kernels.compute(inputs, spec).items():
+                df[column] = values
+        if 'VWAP' not in df.columns:
+            df = calculate_vwap(df, inputs)
 
-    indicators = {}
-    # Ensure there's at least one row after TA calculation
-    if not df.empty:
-        latest = df.iloc[-1]
-
-        key_mapping = {
-            'EMA_5': 'ema_5',
-            'EMA_10': 'ema_10',
-            'EMA_20': 'ema_20',
-            'EMA_50': 'ema_50',
-            'SMA_20': 'sma_20',
-            'SMA_50': 'sma_50',
-            'RSI_14': 'rsi',
-            'MACD_12_26_9': 'macd_line',
-            'MACDs_12_26_9': 'macd_signal',
-            'MACDh_12_26_9': 'macd_hist',
-            'BBU_20_2.0': 'bb_upper',
-            'BBM_20_2.0': 'bb_middle',
-            'BBL_20_2.0': 'bb_lower',
-            'STOCHk_14_3_3': 'stoch_k',
-            'STOCHd_14_3_3': 'stoch_d',
-            'ADX_14': 'adx',
-            'OBV': 'obv',
-            'ATR_14': 'atr',
-            'VWAP': 'vwap'
-        }
-
-        for original_key, new_key in key_mapping.items():
-            value = latest.get(original_key)
-            indicators[new_key] = float(value) if pd.notna(value) else None
-
-    return indicators, df
+    return get_latest_indicators(df), df
+
+def _prepare_frame(df: pd.DataFrame) -> tuple[dict, pd.DataFrame]:
+    """
+    Returns (latest_indicators, df) with indicator and pin bar columns.
+    The caller's DataFrame is only copied when columns have to be added to it.
+    """
+    if not has_indicators(df) or not has_pin_bar_columns(df):
+        df = df.copy()
+    latest_indicators, df = calculate_technical_indicators(df)
+    return latest_indicators, detect_pin_bar(df)
 
 def analyze_price_action(dfs: dict) -> dict:
     """
@@ -120,10 +158,13 @@ def analyze_price_action(dfs: dict) -> dict:
     analysis = {'price_action': {}, 'confirmation': {}, 'technical_indicators': {}, 'trends': {}}
 
     # --- Daily Analysis: Market Structure & Key Zones ---
+    prepared = {}
     df_daily = dfs.get('daily')
     if df_daily is not None and not df_daily.empty:
-        df_daily = df_daily.sort_index()
-        daily_latest_indicators, df_daily_with_ta = calculate_technical_indicators(df_daily.copy())
+        if not df_daily.index.is_monotonic_increasing:
+            df_daily = df_daily.sort_index()
+        prepared['daily'] = _prepare_frame(df_daily)
+        daily_latest_indicators, df_daily_with_ta = prepared['daily']
         analysis['technical_indicators']['daily'] = daily_latest_indicators
 
         def _get_swing_points(df_period, prefix):
@@ -155,13 +196,13 @@ def analyze_price_action(dfs: dict) -> dict:
             analysis['price_action']['measured_move_1x'] = prev_high + prev_range
             analysis['price_action']['measured_move_2x'] = prev_high + 2 * prev_range
 
-    key_levels = get_key_levels(analysis)
+    key_levels = SortedLevels(get_key_levels(analysis))
 
     # --- Multi-Timeframe Analysis ---
     for timeframe in ['1h', '4h', 'daily']:
         df = dfs.get(timeframe)
         if df is not None and not df.empty:
-            latest_indicators, df_with_ta = calculate_technical_indicators(df.copy())
+            latest_indicators, df_with_ta = prepared.get(timeframe) or _prepare_frame(df)
             analysis['technical_indicators'][timeframe] = latest_indicators
 
             latest_bar = df_with_ta.iloc[-1]
@@ -186,7 +227,6 @@ def analyze_price_action(dfs: dict) -> dict:
 
 
             # Candlestick Pattern Detection
-            df_with_ta = detect_pin_bar(df_with_ta.copy())
             latest_bar_with_pin = df_with_ta.iloc[-1]
             if latest_bar_with_pin['Pin_Bar']:
                 level_type, level_value = check_proximity_to_levels(latest_bar_with_pin['Close'], key_levels)
@@ -232,7 +272,7 @@ def analyze_price_action(dfs: dict) -> dict:
     # --- 5-Minute Analysis: Candlestick & Volume Confirmation ---
     df_5min = dfs.get('5min')
     if df_5min is not None and not df_5min.empty:
-        five_min_latest_indicators, df_5min_with_ta = calculate_technical_indicators(df_5min.copy())
+        five_min_latest_indicators, df_5min_with_ta = _prepare_frame(df_5min)
         analysis['technical_indicators']['5min'] = five_min_latest_indicators
 
         latest_bar = df_5min_with_ta.iloc[-1]
@@ -244,7 +284,6 @@ def analyze_price_action(dfs: dict) -> dict:
         avg_volume = df_5min_with_ta['Volume'].tail(20).mean()
         analysis['confirmation']['is_volume_high'] = latest_bar['Volume'] > (avg_volume * 1.5)
 
-        df_5min_with_ta = detect_pin_bar(df_5min_with_ta.copy())
         latest_bar_with_pin = df_5min_with_ta.iloc[-1]
         if latest_bar_with_pin['Pin_Bar']:
             analysis['price_action']['pin_bar_detected'] = True
@@ -328,50 +367,58 @@ def generate_price_action_signals(df: pd.DataFrame, key_levels: dict, tolerance_
     if 'Lower_Shadow' not in df.columns:
         df['Lower_Shadow'] = df[['Open', 'Close']].min(axis=1) - df['Low']
 
-    for i in range(1, len(df)):
-        current_bar = df.iloc[i]
-        prev_bar = df.iloc[i-1]
-
-        # Trend Filter Condition
-        is_uptrend = current_bar['Close'] > current_bar[ema_col]
-        is_downtrend = current_bar['Close'] < current_bar[ema_col]
-
-        # --- Signal 1: Bullish Pin Bar at Support in an Uptrend ---
-        is_bullish_pin_bar = current_bar['Lower_Shadow'] > 2 * current_bar['Body'] and current_bar['Upper_Shadow'] < current_bar['Body']
-        if is_bullish_pin_bar and is_uptrend:
-            level_type, _ = check_proximity_to_levels(current_bar['Low'], {'support': key_levels.get('support', {})}, tolerance_percent)
-            if level_type == 'support':
-                signals.append((current_bar.name, 'long', 'Bullish Pin Bar'))
-                continue
-
-        # --- Signal 2: Bearish Pin Bar at Resistance in a Downtrend ---
-        is_bearish_pin_bar = current_bar['Upper_Shadow'] > 2 * current_bar['Body'] and current_bar['Lower_Shadow'] < current_bar['Body']
-        if is_bearish_pin_bar and is_downtrend:
-            level_type, _ = check_proximity_to_levels(current_bar['High'], {'resistance': key_levels.get('resistance', {})}, tolerance_percent)
-            if level_type == 'resistance':
-                signals.append((current_bar.name, 'short', 'Bearish Pin Bar'))
-                continue
-
-        # --- Signal 3: Bullish Engulfing at Support in an Uptrend ---
-        is_bullish_engulfing = (current_bar['Close'] > current_bar['Open'] and
-                                prev_bar['Close'] < prev_bar['Open'] and
-                                current_bar['Close'] > prev_bar['Open'] and
-                                current_bar['Open'] < prev_bar['Close'])
-        if is_bullish_engulfing and is_uptrend:
-            level_type, _ = check_proximity_to_levels(current_bar['Close'], {'support': key_levels.get('support', {})}, tolerance_percent)
-            if level_type == 'support':
-                signals.append((current_bar.name, 'long', 'Bullish Engulfing'))
-                continue
-
-        # --- Signal 4: Bearish Engulfing at Resistance in a Downtrend ---
-        is_bearish_engulfing = (current_bar['Close'] < current_bar['Open'] and
-                                prev_bar['Close'] > prev_bar['Open'] and
-                                current_bar['Close'] < prev_bar['Open'] and
-                                current_bar['Open'] > prev_bar['Close'])
-        if is_bearish_engulfing and is_downtrend:
-            level_type, _ = check_proximity_to_levels(current_bar['Close'], {'resistance': key_levels.get('resistance', {})}, tolerance_percent)
-            if level_type == 'resistance':
-                signals.append((current_bar.name, 'short', 'Bearish Engulfing'))
-                continue
+    if len(df) < 2:
+        return signals
+
+    # Every condition is evaluated for all bars at once; bar i is compared with bar i-1,
+    # so the arrays below start at the second bar.
+    open_ = df['Open'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)[1:]
+    low = df['Low'].to_numpy(dtype=float)[1:]
+    close = df['Close'].to_numpy(dtype=float)
+    ema = df[ema_col].to_numpy(dtype=float)[1:]
+    body = df['Body'].to_numpy(dtype=float)[1:]
+    upper_shadow = df['Upper_Shadow'].to_numpy(dtype=float)[1:]
+    lower_shadow = df['Lower_Shadow'].to_numpy(dtype=float)[1:]
+    prev_open, prev_close = open_[:-1], close[:-1]
+    open_, close = open_[1:], close[1:]
+
+    # Trend Filter Condition
+    is_uptrend = close > ema
+    is_downtrend = close < ema
+
+    support = _level_values(key_levels.get('support', {}))
+    resistance = _level_values(key_levels.get('resistance', {}))
+
+    # --- Signal 1: Bullish Pin Bar at Support in an Uptrend ---
+    is_bullish_pin_bar = (lower_shadow > 2 * body) & (upper_shadow < body)
+    bullish_pin_signal = is_bullish_pin_bar & is_uptrend & near_level(low, support, tolerance_percent)
+
+    # --- Signal 2: Bearish Pin Bar at Resistance in a Downtrend ---
+    is_bearish_pin_bar = (upper_shadow > 2 * body) & (lower_shadow < body)
+    bearish_pin_signal = is_bearish_pin_bar & is_downtrend & near_level(high, resistance, tolerance_percent)
+
+    # --- Signal 3: Bullish Engulfing at Support in an Uptrend ---
+    is_bullish_engulfing = ((close > open_) & (prev_close < prev_open) &
+                            (close > prev_open) & (open_ < prev_close))
+    bullish_engulfing_signal = is_bullish_engulfing & is_uptrend & near_level(close, support, tolerance_percent)
+
+    # --- Signal 4: Bearish Engulfing at Resistance in a Downtrend ---
+    is_bearish_engulfing = ((close < open_) & (prev_close > prev_open) &
+                            (close < prev_open) & (open_ > prev_close))
+    bearish_engulfing_signal = is_bearish_engulfing & is_downtrend & near_level(close, resistance, tolerance_percent)
+
+    # At most one signal per bar, checked in the order above.
+    conditions = [bullish_pin_signal, bearish_pin_signal, bullish_engulfing_signal, bearish_engulfing_signal]
+    choices = [0, 1, 2, 3]
+    signal_codes = np.select(conditions, choices, default=-1)
+    signal_types = [('long', 'Bullish Pin Bar'), ('short', 'Bearish Pin Bar'),
+                    ('long', 'Bullish Engulfing'), ('short', 'Bearish Engulfing')]
+
+    bar_positions = np.flatnonzero(signal_codes >= 0)
+    timestamps = df.index[bar_positions + 1]
+    for timestamp, code in zip(timestamps, signal_codes[bar_positions]):
+        direction, strategy_name = signal_types[code]
+        signals.append((timestamp, direction, strategy_name))
 
     return signals
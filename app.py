@@ -1,19 +1,23 @@
-from flask import Flask, jsonify, Response, render_template, redirect, url_for
-from services import data_service, ai_service, backtest_service
+from flask import Flask, jsonify, Response, render_template, redirect, url_for, request
+from utils.metrics import StageTimer, render_metrics
+from utils import serialization
+from services import data_service, ai_service, backtest_service, sweep_service, watchlist_service, portfolio_service, walkforward_service, scanner_service
 from analysis import technical_analysis
 from config import ALPACA_API_KEY, OPENROUTER_API_KEY, current_config # Import current_config
 from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
 from datetime import datetime, timedelta
-import json
+import math
+import time
 
 app = Flask(__name__, static_folder='templates') # Serve static files from templates
 app.debug = current_config.DEBUG # Set debug mode based on config
+app.json = serialization.FastJSONProvider(app)
 
 def format_sse(data: dict, event: str = 'message') -> str:
     """
     Formats data as a Server-Sent Event (SSE) string.
     """
-    json_data = json.dumps(data, ensure_ascii=False)
+    json_data = serialization.dumps(data)
     return f"event: {event}\ndata: {json_data}\n\n"
 
 @app.route('/')
@@ -28,34 +32,195 @@ def analyze_page():
 def backtest_page():
     return render_template('backtest.html')
 
+def _prepare_backtest_inputs(symbol: str, timer: StageTimer):
+    """
+    Fetches the 30-day 5-minute backtest frame with indicators, and the key levels from the daily analysis.
+    Returns (df_backtest, key_levels), or (None, None) if there is no data for the backtest.
+    """
+    end_date = datetime.now()
+    backtest_start_date = end_date - timedelta(days=30)
+    # We need to run a broader analysis to get key levels for the backtest
+    daily_start_date = end_date - timedelta(days=365)
+    dfs = data_service.get_timeframes(symbol, {
+        'backtest': (TimeFrame(5, TimeFrameUnit.Minute), backtest_start_date, end_date),
+        'daily': (TimeFrame.Day, daily_start_date, end_date),
+    }, timer=timer)
+
+    df_backtest_raw = dfs['backtest']
+    if df_backtest_raw is None or df_backtest_raw.empty:
+        return None, None
+
+    with timer.stage('key_levels'):
+        key_levels = data_service.get_current_key_levels(symbol, dfs['daily'])
+
+    _, df_backtest = technical_analysis.calculate_technical_indicators(df_backtest_raw)
+    return df_backtest, key_levels
+
+def _format_trades(results: dict, trade_format: str) -> dict:
+    """With the 'columnar' trade format, the trades are sent as one list per field instead of one record per trade."""
+    if trade_format == 'columnar':
+        results['trades'] = serialization.columnar(results['trades'])
+    return results
+
 @app.route('/backtest/<symbol>', methods=['POST'])
 def run_backtest_endpoint(symbol):
-    try:
-        end_date = datetime.now()
-        backtest_start_date = end_date - timedelta(days=30)
-        df_backtest_raw = data_service.get_bars_from_alpaca(symbol, TimeFrame(5, TimeFrameUnit.Minute), backtest_start_date, end_date)
+    """JSON body (optional): {"engine", "trade_format": "rows" or "columnar"}."""
+    params = request.get_json(silent=True) or {}
+    engine = params.get('engine', current_config.BACKTEST_ENGINE)
+    if engine not in backtest_service.BACKTEST_ENGINES:
+        return jsonify({"status": "error", "message": f"Unknown backtest engine '{engine}'."}), 400
+    trade_format = params.get('trade_format', 'rows')
+    if trade_format not in backtest_service.TRADE_FORMATS:
+        return jsonify({"status": "error", "message": f"Unknown trade format '{trade_format}'."}), 400
 
-        if df_backtest_raw is None or df_backtest_raw.empty:
+    try:
+        timer = StageTimer()
+        df_backtest, key_levels = _prepare_backtest_inputs(symbol, timer)
+        if df_backtest is None:
             return jsonify({"status": "error", "message": "No data for backtest."}), 400
 
-        # We need to run a broader analysis to get key levels for the backtest
-        daily_start_date = end_date - timedelta(days=365)
-        dfs_for_levels = {
-            'daily': data_service.get_bars_from_alpaca(symbol, TimeFrame.Day, daily_start_date, end_date),
-        }
-        analysis_for_levels = technical_analysis.analyze_price_action(dfs_for_levels)
-        key_levels = technical_analysis.get_key_levels(analysis_for_levels)
-
-        _, df_backtest = technical_analysis.calculate_technical_indicators(df_backtest_raw.copy())
-        signals = technical_analysis.generate_price_action_signals(df_backtest, key_levels, trend_filter_ema=20)
+        with timer.stage('signals'):
+            signals = technical_analysis.generate_price_action_signals(df_backtest, key_levels, trend_filter_ema=20)
         
-        backtest_results = backtest_service.get_backtest_results(df_backtest, signals, atr_multiplier=2.0, reward_risk_ratio=2.0)
+        with timer.stage(f'backtest:{engine}'):
+            backtest_results = backtest_service.get_backtest_results(df_backtest, signals, atr_multiplier=2.0, reward_risk_ratio=2.0, engine=engine)
         
-        return jsonify({"status": "success", "results": backtest_results})
+        return jsonify({"status": "success", "results": _format_trades(backtest_results, trade_format), "timings": timer.get_ms()})
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Portfolio sizing parameters: (type, upper bound); each must be positive
+PORTFOLIO_LIMITS = {'max_positions': (int, None), 'position_size': (float, 1.0), 'risk_per_trade': (float, 1.0)}
+
+def _portfolio_limits(params: dict) -> dict:
+    """The sizing parameters of a portfolio request, None where not given. Raises ValueError for invalid values."""
+    limits = {}
+    for name, (kind, upper) in PORTFOLIO_LIMITS.items():
+        value = params.get(name)
+        if value is None or value == '':
+            limits[name] = None
+            continue
+        try:
+            number = float(value) if not isinstance(value, bool) else math.nan
+        except (TypeError, ValueError):
+            number = math.nan
+        if kind is int:
+            if not (math.isfinite(number) and number.is_integer() and number >= 1):
+                raise ValueError(f"'{name}' must be a positive integer.")
+            limits[name] = int(number)
+        else:
+            if not (0 < number <= upper):
+                raise ValueError(f"'{name}' must be greater than 0 and at most {upper}.")
+            limits[name] = number
+    return limits
+
+@app.route('/backtest/portfolio', methods=['POST'])
+def run_portfolio_backtest_endpoint():
+    """
+    Backtests several symbols as one book with a shared cash pool.
+    JSON body: {"symbols": "AAPL,MSFT" or [...], "max_positions", "position_size", "risk_per_trade", "trade_format"}.
+    """
+    params = request.get_json(silent=True) or {}
+    trade_format = params.get('trade_format', 'rows')
+    if trade_format not in backtest_service.TRADE_FORMATS:
+        return jsonify({"status": "error", "message": f"Unknown trade format '{trade_format}'."}), 400
+    symbols = params.get('symbols', '')
+    symbols = watchlist_service.parse_symbols(symbols if isinstance(symbols, str) else ','.join(symbols))
+    if not symbols:
+        return jsonify({"status": "error", "message": "No symbols given."}), 400
+    if len(symbols) > current_config.PORTFOLIO_MAX_SYMBOLS:
+        return jsonify({"status": "error", "message": f"At most {current_config.PORTFOLIO_MAX_SYMBOLS} symbols per portfolio."}), 400
+    try:
+        limits = _portfolio_limits(params)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        timer = StageTimer()
+        results = portfolio_service.get_portfolio_backtest_results(symbols, **limits, timer=timer)
+        return jsonify({"status": "success", "results": _format_trades(results, trade_format), "timings": timer.get_ms()})
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/backtest/<symbol>/walkforward', methods=['POST'])
+def run_walk_forward_endpoint(symbol):
+    """
+    Walk-forward backtest: the key levels are recomputed at the start of every step from the data known then.
+    JSON body: {"evaluation_days", "step_days", "engine", "atr_multiplier", "reward_risk_ratio",
+    "trend_filter_ema", "tolerance_percent", "trade_format"}.
+    """
+    params = request.get_json(silent=True) or {}
+    engine = params.get('engine', 'vectorized')
+    if engine not in backtest_service.BACKTEST_ENGINES:
+        return jsonify({"status": "error", "message": f"Unknown backtest engine '{engine}'."}), 400
+    trade_format = params.get('trade_format', 'rows')
+    if trade_format not in backtest_service.TRADE_FORMATS:
+        return jsonify({"status": "error", "message": f"Unknown trade format '{trade_format}'."}), 400
+
+    try:
+        timer = StageTimer()
+        results = walkforward_service.get_walk_forward_results(
+            symbol.upper(),
+            evaluation_days=int(params.get('evaluation_days', 60)),
+            step_days=int(params.get('step_days', 5)),
+            engine=engine,
+            atr_multiplier=float(params.get('atr_multiplier', 2.0)),
+            reward_risk_ratio=float(params.get('reward_risk_ratio', 2.0)),
+            trend_filter_ema=int(params.get('trend_filter_ema', 20)),
+            tolerance_percent=float(params.get('tolerance_percent', 0.005)),
+            timer=timer)
+        return jsonify({"status": "success", "results": _format_trades(results, trade_format), "timings": timer.get_ms()})
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def generate_sweep_stream(symbol: str, params: dict):
+    """
+    Streams a parameter sweep for a symbol: one event per finished combination, then the final ranking.
+    """
+    try:
+        timer = StageTimer()
+        yield format_sse({"status": "info", "message": f"Fetching data for {symbol}..."}, event="message")
+        df_backtest, key_levels = _prepare_backtest_inputs(symbol, timer)
+        if df_backtest is None:
+            yield format_sse({"status": "error", "message": "No data for backtest."}, event="message")
+            return
+        yield format_sse({"status": "info", "message": "Data fetched successfully.", "timings": timer.get_ms()}, event="message")
+        sweep_start = time.perf_counter()
+
+        param_ranges = {name: params[name] for name in sweep_service.SWEEP_DEFAULTS if name in params}
+        for event in sweep_service.sweep_backtest_results(
+                df_backtest, key_levels, param_ranges,
+                metric=params.get('metric', 'total_pnl'),
+                engine=params.get('engine', 'vectorized'),
+                top=int(params.get('top', 10))):
+            if event['type'] == 'result':
+                yield format_sse({"status": "sweep_result", **{k: v for k, v in event.items() if k != 'type'}}, event="message")
+            else:
+                timer.record('sweep', time.perf_counter() - sweep_start)
+                yield format_sse({"status": "complete", "symbol": symbol, "metric": event['metric'], "results": event['results'],
+                                  "timings": timer.get_ms()}, event="message")
+
+    except Exception as e:
+        yield format_sse({"status": "error", "message": f"An error occurred: {e}"}, event="message")
+
+@app.route('/backtest/<symbol>/sweep', methods=['POST'])
+def run_backtest_sweep_endpoint(symbol):
+    params = request.get_json(silent=True) or {}
+    param_ranges = {name: params[name] for name in sweep_service.SWEEP_DEFAULTS if name in params}
+    try:
+        # Rejects invalid ranges and oversized grids before any data is fetched
+        sweep_service.expand_param_grid(param_ranges, max_combinations=current_config.SWEEP_MAX_COMBINATIONS)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return Response(generate_sweep_stream(symbol.upper(), params), mimetype="text/event-stream")
+
 def generate_analysis_stream(symbol: str):
     """
     Generates a stream of AI analysis updates for a given symbol.
@@ -65,40 +230,90 @@ def generate_analysis_stream(symbol: str):
         return
 
     try:
+        timer = StageTimer()
+        stream_start = time.perf_counter()
         yield format_sse({"status": "info", "message": f"Starting analysis for {symbol}..."}, event="message")
 
-        end_date = datetime.now()
-        daily_start_date = end_date - timedelta(days=365)
-        five_days_ago = end_date - timedelta(days=5)
+        precomputed = scanner_service.load_result(symbol)
+        if precomputed is not None:
+            # The background scanner or the bar stream analyzed this symbol at its last bar close
+            analysis = precomputed['analysis']
+            yield format_sse({"status": "info", "message": f"Using the analysis precomputed at the {precomputed['bar_time']} bar."},
+                             event="message")
+        else:
+            end_date = datetime.now()
+            # One pull of fine-grained bars; the higher timeframes are resampled from it
+            start_dates = data_service.analysis_start_dates(end_date)
 
-        yield format_sse({"status": "info", "message": f"Fetching data for {symbol}..."}, event="message")
-        dfs = {
-            'daily': data_service.get_bars_from_alpaca(symbol, TimeFrame.Day, daily_start_date, end_date),
-            '5min': data_service.get_bars_from_alpaca(symbol, TimeFrame(5, TimeFrameUnit.Minute), five_days_ago, end_date),
-        }
-        yield format_sse({"status": "info", "message": "Data fetched successfully."},
-                         event="message")
+            yield format_sse({"status": "info", "message": f"Fetching data for {symbol}..."}, event="message")
+            dfs = {}
+            for name, df in data_service.resampled_timeframes(symbol, start_dates, end_date, timer=timer):
+                dfs[name] = df
+                yield format_sse({"status": "info", "message": f"Prepared {name} data for {symbol}.",
+                                  "timings": timer.get_ms(f'resample:{name}', f'indicators:{name}')}, event="message")
+            yield format_sse({"status": "info", "message": "Data fetched successfully.", "timings": timer.get_ms()},
+                             event="message")
 
-        yield format_sse({"status": "info", "message": "Analyzing price action..."}, event="message")
-        analysis = technical_analysis.analyze_price_action(dfs)
-        yield format_sse({"status": "info", "message": "Analysis complete."},
-                         event="message")
+            yield format_sse({"status": "info", "message": "Analyzing price action..."}, event="message")
+            with timer.stage('price_action'):
+                analysis = technical_analysis.analyze_price_action(dfs)
+            yield format_sse({"status": "info", "message": "Analysis complete.", "timings": timer.get_ms('price_action')},
+                             event="message")
 
         yield format_sse({"status": "info", "message": "Generating AI Opportunity Report..."}, event="message")
         full_report = ""
         current_time_str = datetime.now().strftime('%Y-%m-%d %H:%M EDT')
         # Note: backtest_results are no longer passed to the AI in this streamlined flow
-        for chunk in ai_service.get_ai_analysis(symbol, analysis, backtest_results=None, current_time=current_time_str):
+        for chunk in ai_service.get_ai_analysis(symbol, analysis, backtest_results=None, current_time=current_time_str, timer=timer):
             full_report += chunk
             yield format_sse({"status": "ai_chunk", "content": chunk}, event="message")
-        yield format_sse({"status": "info", "message": "Report generated."},
+        yield format_sse({"status": "info", "message": "Report generated.",
+                          "timings": timer.get_ms('prompt_build', 'llm_first_token', 'llm_stream')},
                          event="message")
 
-        yield format_sse({"status": "complete", "symbol": symbol, "report": full_report}, event="message")
+        timer.record('analysis_total', time.perf_counter() - stream_start)
+        yield format_sse({"status": "complete", "symbol": symbol, "report": full_report, "timings": timer.get_ms()}, event="message")
 
     except Exception as e:
         yield format_sse({"status": "error", "message": f"An error occurred: {e}"}, event="message")
 
+def generate_watchlist_stream(symbols: list[str]):
+    """
+    Streams the analysis of a watchlist, one event per symbol in the order the symbols finish.
+    """
+    try:
+        yield format_sse({"status": "info", "message": f"Fetching data for {len(symbols)} symbols..."}, event="message")
+        for result in watchlist_service.scan_watchlist(symbols):
+            if 'error' in result:
+                yield format_sse({"status": "symbol_error", "symbol": result['symbol'], "message": result['error']}, event="message")
+            else:
+                yield format_sse({"status": "symbol_result", **result}, event="message")
+        yield format_sse({"status": "complete", "symbols": symbols}, event="message")
+
+    except Exception as e:
+        yield format_sse({"status": "error", "message": f"An error occurred: {e}"}, event="message")
+
+@app.route('/watchlist', methods=['GET'])
+def analyze_watchlist():
+    symbols = watchlist_service.parse_symbols(request.args.get('symbols', ''))
+    if not symbols:
+        return jsonify({"status": "error", "message": "No symbols given."}), 400
+    if len(symbols) > current_config.WATCHLIST_MAX_SYMBOLS:
+        return jsonify({"status": "error", "message": f"At most {current_config.WATCHLIST_MAX_SYMBOLS} symbols per request."}), 400
+    return Response(generate_watchlist_stream(symbols), mimetype="text/event-stream")
+
+@app.route('/scanner', methods=['GET'])
+def scanner_results():
+    """Latest background scanner results of the watchlist (or of ?symbols=...), without the full analysis."""
+    symbols = watchlist_service.parse_symbols(request.args.get('symbols', ''))
+    results = [{k: v for k, v in result.items() if k != 'analysis'} for result in scanner_service.load_results(symbols)]
+    return jsonify({"status": "success", "enabled": current_config.SCANNER_ENABLED, "results": results})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage duration histograms in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/analyze/<symbol>', methods=['GET'])
 def analyze_stock(symbol):
     return Response(generate_analysis_stream(symbol.upper()), mimetype="text/event-stream")
@@ -0,0 +1,133 @@
+import asyncio
+import re
+import time
+from datetime import datetime
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app, format_sse
+from analysis import technical_analysis
+from config import ALPACA_API_KEY, OPENROUTER_API_KEY, current_config
+from services import data_service, ai_service, bar_stream, scanner_service
+from utils.http import close_async_clients
+from utils.metrics import StageTimer
+
+# Every other route is served by the Flask app on a thread pool
+wsgi_app = WSGIMiddleware(flask_app, workers=current_config.ASGI_WSGI_THREADS)
+
+ANALYZE_PATH = re.compile(r'/analyze/([^/]+)')
+
+async def agenerate_analysis_stream(symbol: str):
+    """
+    Async version of app.generate_analysis_stream, emitting the same SSE events.
+    """
+    if not ALPACA_API_KEY or not OPENROUTER_API_KEY:
+        yield format_sse({"status": "error", "message": "Error: API keys for Alpaca or OpenRouter are not set."}, event="message")
+        return
+
+    try:
+        timer = StageTimer()
+        stream_start = time.perf_counter()
+        yield format_sse({"status": "info", "message": f"Starting analysis for {symbol}..."}, event="message")
+
+        precomputed = scanner_service.load_result(symbol)
+        if precomputed is not None:
+            # The background scanner or the bar stream analyzed this symbol at its last bar close
+            analysis = precomputed['analysis']
+            yield format_sse({"status": "info", "message": f"Using the analysis precomputed at the {precomputed['bar_time']} bar."},
+                             event="message")
+        else:
+            end_date = datetime.now()
+            # One pull of fine-grained bars; the higher timeframes are resampled from it
+            start_dates = data_service.analysis_start_dates(end_date)
+
+            yield format_sse({"status": "info", "message": f"Fetching data for {symbol}..."}, event="message")
+            dfs = {}
+            async for name, df in data_service.aresampled_timeframes(symbol, start_dates, end_date, timer=timer):
+                dfs[name] = df
+                yield format_sse({"status": "info", "message": f"Prepared {name} data for {symbol}.",
+                                  "timings": timer.get_ms(f'resample:{name}', f'indicators:{name}')}, event="message")
+            yield format_sse({"status": "info", "message": "Data fetched successfully.", "timings": timer.get_ms()},
+                             event="message")
+
+            yield format_sse({"status": "info", "message": "Analyzing price action..."}, event="message")
+            # CPU-bound; keep it off the event loop
+            analysis_start = time.perf_counter()
+            analysis = await asyncio.get_running_loop().run_in_executor(None, technical_analysis.analyze_price_action, dfs)
+            timer.record('price_action', time.perf_counter() - analysis_start)
+            yield format_sse({"status": "info", "message": "Analysis complete.", "timings": timer.get_ms('price_action')},
+                             event="message")
+
+        yield format_sse({"status": "info", "message": "Generating AI Opportunity Report..."}, event="message")
+        full_report = ""
+        current_time_str = datetime.now().strftime('%Y-%m-%d %H:%M EDT')
+        async for chunk in ai_service.aget_ai_analysis(symbol, analysis, backtest_results=None, current_time=current_time_str, timer=timer):
+            full_report += chunk
+            yield format_sse({"status": "ai_chunk", "content": chunk}, event="message")
+        yield format_sse({"status": "info", "message": "Report generated.",
+                          "timings": timer.get_ms('prompt_build', 'llm_first_token', 'llm_stream')},
+                         event="message")
+
+        timer.record('analysis_total', time.perf_counter() - stream_start)
+        yield format_sse({"status": "complete", "symbol": symbol, "report": full_report, "timings": timer.get_ms()}, event="message")
+
+    except Exception as e:
+        yield format_sse({"status": "error", "message": f"An error occurred: {e}"}, event="message")
+
+async def _send_event_stream(events, receive, send) -> None:
+    """Sends an async generator of SSE strings, and stops it as soon as the client disconnects."""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache')],
+    })
+
+    async def stream():
+        async for event in events:
+            await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    stream_task = asyncio.ensure_future(stream())
+    disconnect_task = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait([stream_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (stream_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(stream_task, disconnect_task, return_exceptions=True)
+        await events.aclose()
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            scanner_service.start_background_scanner()
+            bar_stream.start_background_stream()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, bar_stream.stop_background_stream)
+            await loop.run_in_executor(None, scanner_service.stop_background_scanner)
+            await close_async_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point. /analyze/<symbol> is served natively with async data and AI calls,
+    so open SSE streams cost a coroutine instead of a worker; everything else goes to Flask.
+    Run with e.g. `gunicorn asgi:app -k uvicorn.workers.UvicornWorker`.
+    """
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = ANALYZE_PATH.fullmatch(scope['path'])
+        if match:
+            await _send_event_stream(agenerate_analysis_stream(match.group(1).upper()), receive, send)
+            return
+
+    await wsgi_app(scope, receive, send)
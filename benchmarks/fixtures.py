@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+DAILY_MIN_BARS = 365
+OHLCV_AGG = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+def synthetic_bars(n_bars: int, freq: str = '5min', seed: int = 0, start: str = '2020-01-02 14:30') -> pd.DataFrame:
+    """
+    Random-walk OHLCV bars with a UTC-naive DatetimeIndex, shaped like the Alpaca bars.
+    Deterministic for a given seed, so runs are comparable.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n_bars, freq=freq, name='timestamp')
+    # Log-normal walk keeps prices positive over a million bars
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.002, n_bars)))
+    open_ = close * np.exp(rng.normal(0.0, 0.001, n_bars))
+    high = np.maximum(open_, close) * np.exp(rng.exponential(0.001, n_bars))
+    low = np.minimum(open_, close) * np.exp(-rng.exponential(0.001, n_bars))
+    volume = rng.integers(1_000, 100_000, n_bars).astype(float)
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+def resample_bars(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    return df.resample(rule).agg(OHLCV_AGG).dropna()
+
+def symbol_fixtures(n_symbols: int, n_bars: int, seed: int = 0) -> dict:
+    """
+    Returns {symbol: {'5min', '1h', '4h', 'daily'}} raw OHLCV frames per symbol. The 5-minute frame
+    has n_bars bars and the hourly frames are resampled from it. The daily frame is generated
+    separately with at least a year of bars, since the analysis reads 90-day levels from it.
+    """
+    fixtures = {}
+    for i in range(n_symbols):
+        df_5min = synthetic_bars(n_bars, seed=seed + i)
+        n_days = max(n_bars * 5 // (60 * 24) + 1, DAILY_MIN_BARS)
+        fixtures[f'SYM{i}'] = {
+            '5min': df_5min,
+            '1h': resample_bars(df_5min, '1h'),
+            '4h': resample_bars(df_5min, '4h'),
+            'daily': synthetic_bars(n_days, freq='1D', seed=seed + i, start='2019-01-01 05:00'),
+        }
+    return fixtures
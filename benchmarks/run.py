@@ -0,0 +1,206 @@
+"""
+Benchmarks for the analysis and backtest hot paths, on synthetic OHLCV bars (no network access).
+
+    python -m benchmarks.run --bars 1000 10000 100000 --symbols 2
+    python -m benchmarks.run --save-baseline                   # store this run as the baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+Each benchmark reports latency percentiles per call, throughput in bars per second and the peak
+memory traced during one call. With a baseline, a benchmark regresses when its median latency or
+its peak memory exceeds the baseline by more than the tolerance; the run then exits with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from analysis import technical_analysis
+from services import backtest_service
+from templates.ai_prompts import generate_trading_signal_prompt
+from benchmarks.fixtures import symbol_fixtures
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+class Prepared:
+    """Untimed inputs derived from one symbol's raw frames, shared by the benchmarks of a run."""
+    def __init__(self, symbol: str, frames: dict):
+        self.symbol = symbol
+        self.frames = frames
+        _, enriched = technical_analysis.calculate_technical_indicators(frames['5min'].copy())
+        self.enriched = technical_analysis.detect_pin_bar(enriched)
+        self.analysis = technical_analysis.analyze_price_action(frames)
+        self.key_levels = technical_analysis.get_key_levels(self.analysis)
+        self.signals = technical_analysis.generate_price_action_signals(self.enriched, self.key_levels)
+        self.backtest_results = backtest_service.run_backtest(self.enriched, self.signals, 2.0, 2.0, engine='vectorized')
+
+# Each benchmark: (name, setup(prepared) -> args, run(*args)). Setup runs before every call and is not timed.
+BENCHMARKS = [
+    ('calculate_technical_indicators',
+     lambda p: (p.frames['5min'].copy(),),
+     technical_analysis.calculate_technical_indicators),
+    ('detect_pin_bar',
+     lambda p: (p.frames['5min'].copy(),),
+     technical_analysis.detect_pin_bar),
+    ('analyze_price_action',
+     lambda p: (p.frames,),
+     technical_analysis.analyze_price_action),
+    ('find_two_legged_pullback',
+     lambda p: (p.enriched,),
+     technical_analysis.find_two_legged_pullback),
+    ('generate_price_action_signals',
+     lambda p: (p.enriched, p.key_levels),
+     technical_analysis.generate_price_action_signals),
+    ('run_backtest[vectorized]',
+     lambda p: (p.enriched, p.signals, 2.0, 2.0),
+     lambda df, signals, atr, rr: backtest_service.run_backtest(df, signals, atr, rr, engine='vectorized')),
+    ('run_backtest[backtrader]',
+     lambda p: (p.enriched, p.signals, 2.0, 2.0),
+     lambda df, signals, atr, rr: backtest_service.run_backtest(df, signals, atr, rr, engine='backtrader')),
+    ('generate_trading_signal_prompt',
+     lambda p: (p.symbol, p.analysis, p.backtest_results['summary']),
+     generate_trading_signal_prompt),
+]
+
+def _peak_memory(setup, run, prepared) -> int:
+    """Peak bytes allocated (Python and NumPy) during one call, above what was allocated before it."""
+    args = setup(prepared)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(peak - before, 0)
+
+def run_benchmark(name: str, setup, run, prepared_symbols: list, n_bars: int, repeat: int, warmup: int) -> dict:
+    for prepared in prepared_symbols[:1]:
+        for _ in range(warmup):
+            run(*setup(prepared))
+
+    latencies = []
+    for _ in range(repeat):
+        for prepared in prepared_symbols:
+            args = setup(prepared)
+            start = time.perf_counter()
+            run(*args)
+            latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    return {
+        'name': name,
+        'bars': n_bars,
+        'symbols': len(prepared_symbols),
+        'calls': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p95_ms': float(np.percentile(latencies, 95) * 1e3),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+        'bars_per_s': float(n_bars * len(latencies) / latencies.sum()) if latencies.sum() > 0 else None,
+        'peak_mb': _peak_memory(setup, run, prepared_symbols[0]) / 2 ** 20,
+    }
+
+def result_key(result: dict) -> str:
+    return f"{result['name']}|bars={result['bars']}|symbols={result['symbols']}"
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Returns a list of regression messages against the baseline results."""
+    regressions = []
+    baseline_results = baseline.get('results', {})
+    for result in results:
+        reference = baseline_results.get(result_key(result))
+        if reference is None:
+            continue
+        for metric in ('p50_ms', 'peak_mb'):
+            if reference[metric] > 0 and result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result_key(result)}: {metric} {result[metric]:.2f} vs baseline {reference[metric]:.2f} "
+                    f"(+{100 * (result[metric] / reference[metric] - 1):.0f}%)")
+    return regressions
+
+def _print_table(results: list, baseline: dict = None) -> None:
+    baseline_results = (baseline or {}).get('results', {})
+    header = f"{'benchmark':<34}{'bars':>9}{'sym':>5}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'bars/s':>13}{'peak MB':>10}"
+    if baseline_results:
+        header += f"{'vs base':>9}"
+    print(header)
+    for r in results:
+        line = (f"{r['name']:<34}{r['bars']:>9}{r['symbols']:>5}{r['p50_ms']:>11.2f}{r['p95_ms']:>11.2f}"
+                f"{r['p99_ms']:>11.2f}{(r['bars_per_s'] or 0):>13,.0f}{r['peak_mb']:>10.1f}")
+        reference = baseline_results.get(result_key(r))
+        if reference and reference['p50_ms'] > 0:
+            line += f"{r['p50_ms'] / reference['p50_ms']:>8.2f}x"
+        print(line)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='5-minute bars per symbol; one run per value (1k to 1M)')
+    parser.add_argument('--symbols', type=int, default=1, help='number of synthetic symbols')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per symbol')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed calls before timing')
+    parser.add_argument('--only', nargs='+', help='run only the benchmarks whose name contains one of these')
+    parser.add_argument('--max-backtrader-bars', type=int, default=200_000,
+                        help='skip the backtrader engine above this many bars')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a regression')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    benchmarks = [b for b in BENCHMARKS if not args.only or any(o in b[0] for o in args.only)]
+    results = []
+    for n_bars in args.bars:
+        fixtures = symbol_fixtures(args.symbols, n_bars, seed=args.seed)
+        prepared_symbols = [Prepared(symbol, frames) for symbol, frames in fixtures.items()]
+        for name, setup, run in benchmarks:
+            if name == 'run_backtest[backtrader]' and n_bars > args.max_backtrader_bars:
+                print(f"Skipping {name} at {n_bars} bars (--max-backtrader-bars {args.max_backtrader_bars}).")
+                continue
+            results.append(run_benchmark(name, setup, run, prepared_symbols, n_bars, args.repeat, args.warmup))
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print_table(results, baseline)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': {result_key(r): r for r in results},
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,9 +10,90 @@ class Config:
     ALPACA_SECRET_KEY = os.getenv("ALPACA_SECRET_KEY")
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     OPENROUTER_MODELS = [model.strip() for model in os.getenv("OPENROUTER_MODELS", "microsoft/mai-ds-r1:free").split(',')]
+    OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+    # Rounds of attempts over the models; a model is retried after a backoff doubling from OPENROUTER_BACKOFF_BASE
     OPENROUTER_RETRIES = int(os.getenv("OPENROUTER_RETRIES", 3))
+    OPENROUTER_BACKOFF_BASE = float(os.getenv("OPENROUTER_BACKOFF_BASE", 1))
+    OPENROUTER_BACKOFF_MAX = float(os.getenv("OPENROUTER_BACKOFF_MAX", 8))
+    # Deadlines of one attempt: connecting, the first token, and then the gap between two tokens
+    OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", 5))
+    OPENROUTER_FIRST_TOKEN_TIMEOUT = float(os.getenv("OPENROUTER_FIRST_TOKEN_TIMEOUT", 30))
+    OPENROUTER_READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", 60))
+    # OpenRouter connections per worker for async report streams (0 for no limit; hedged reports use
+    # several), and how long an attempt waits for a free one before it fails over
+    OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", 0))
+    OPENROUTER_POOL_TIMEOUT = float(os.getenv("OPENROUTER_POOL_TIMEOUT", 2))
+    # Hedged requests: up to this many models are raced, each started OPENROUTER_HEDGE_DELAY seconds
+    # after the previous one; the first to produce a token wins. 1 tries the models one at a time
+    OPENROUTER_HEDGE = int(os.getenv("OPENROUTER_HEDGE", 1))
+    OPENROUTER_HEDGE_DELAY = float(os.getenv("OPENROUTER_HEDGE_DELAY", 0))
+    # AI reports are cached per symbol and prompt; identical concurrent requests share one LLM call
+    REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+    REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", 300))
+    REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", 256))
+    # AI report tokens arriving within this window are sent as one SSE event; 0 sends one event per token
+    SSE_CHUNK_WINDOW_MS = float(os.getenv("SSE_CHUNK_WINDOW_MS", 50))
+    # Report prompt: 'compact' (tabular analysis, trimmed to PROMPT_TOKEN_BUDGET estimated tokens; 0 for no limit) or 'verbose'
+    PROMPT_FORMAT = os.getenv("PROMPT_FORMAT", "compact")
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1000))
     POLYGON_API_KEY = os.getenv("POLYGON_API_KEY")
     ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+    # Local bar cache: only the missing tail since the last cached bar is fetched from Alpaca
+    BAR_CACHE_ENABLED = os.getenv("BAR_CACHE_ENABLED", "true").lower() == "true"
+    BAR_CACHE_DIR = os.getenv("BAR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "bars"))
+    # Enriched frames are cached in a memory-mapped columnar format; indicators are stored as float32
+    BAR_CACHE_FLOAT32_INDICATORS = os.getenv("BAR_CACHE_FLOAT32_INDICATORS", "true").lower() == "true"
+    # Pooled keep-alive HTTP sessions, one set per worker process
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+    # Threads per worker for fetching several timeframes of one analysis concurrently
+    FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 8))
+    # Threads used by the ASGI app (asgi.py) to serve the Flask routes
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 10))
+    # Default backtest engine: 'backtrader' or 'vectorized'; can be overridden per request
+    BACKTEST_ENGINE = os.getenv("BACKTEST_ENGINE", "backtrader")
+    # Parameter sweeps run in a process pool
+    SWEEP_MAX_WORKERS = int(os.getenv("SWEEP_MAX_WORKERS", os.cpu_count() or 1))
+    SWEEP_MAX_COMBINATIONS = int(os.getenv("SWEEP_MAX_COMBINATIONS", 1000))
+    # Watchlist scans: bars are fetched in bulk, symbols are analyzed in a process pool
+    WATCHLIST_MAX_SYMBOLS = int(os.getenv("WATCHLIST_MAX_SYMBOLS", 200))
+    WATCHLIST_MAX_WORKERS = int(os.getenv("WATCHLIST_MAX_WORKERS", os.cpu_count() or 1))
+    # Stage timings: set METRICS_DIR to a directory shared by the workers to aggregate /metrics over all of them
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 1.0))
+    # Portfolio backtests: symbols per request, concurrent positions, signal generation pool size
+    PORTFOLIO_MAX_SYMBOLS = int(os.getenv("PORTFOLIO_MAX_SYMBOLS", 50))
+    PORTFOLIO_MAX_POSITIONS = int(os.getenv("PORTFOLIO_MAX_POSITIONS", 5))
+    PORTFOLIO_MAX_WORKERS = int(os.getenv("PORTFOLIO_MAX_WORKERS", os.cpu_count() or 1))
+    # Walk-forward backtests: longest evaluation period, indicator warm-up before it, step scan pool size
+    WALKFORWARD_MAX_DAYS = int(os.getenv("WALKFORWARD_MAX_DAYS", 365))
+    WALKFORWARD_WARMUP_DAYS = int(os.getenv("WALKFORWARD_WARMUP_DAYS", 7))
+    WALKFORWARD_MAX_WORKERS = int(os.getenv("WALKFORWARD_MAX_WORKERS", os.cpu_count() or 1))
+    # Multi-timeframe analysis: 1h/4h/daily bars are resampled from one pull of 1- or 5-minute bars,
+    # using the regular session only or the extended hours too
+    RESAMPLE_BASE_MINUTES = int(os.getenv("RESAMPLE_BASE_MINUTES", 5))
+    RESAMPLE_SESSION = os.getenv("RESAMPLE_SESSION", "regular")
+    # Background market scanner: keeps a watchlist's bars and analysis warm, refreshed at every bar close.
+    # One worker process runs it (it holds the lock file in SCANNER_DIR); all workers read its results.
+    SCANNER_ENABLED = os.getenv("SCANNER_ENABLED", "false").lower() == "true"
+    SCANNER_SYMBOLS = list(dict.fromkeys(s.strip().upper() for s in os.getenv("SCANNER_SYMBOLS", "").split(',') if s.strip()))
+    SCANNER_INTERVAL_MINUTES = int(os.getenv("SCANNER_INTERVAL_MINUTES", 5))
+    SCANNER_DELAY_SECONDS = float(os.getenv("SCANNER_DELAY_SECONDS", 10))
+    SCANNER_MARKET_HOURS_ONLY = os.getenv("SCANNER_MARKET_HOURS_ONLY", "true").lower() == "true"
+    SCANNER_MAX_WORKERS = int(os.getenv("SCANNER_MAX_WORKERS", os.cpu_count() or 1))
+    SCANNER_MAX_AGE = float(os.getenv("SCANNER_MAX_AGE", 600))
+    SCANNER_DIR = os.getenv("SCANNER_DIR", os.path.join(os.path.dirname(BAR_CACHE_DIR), "scanner"))
+    # Live bar streaming: Alpaca data feed and the length of the rolling per-symbol buffers.
+    # When enabled, one worker process streams the symbols (it holds a lock file in SCANNER_DIR) and stores
+    # the analysis at every 5-minute close with the scan results; the others retry every STREAM_RETRY_SECONDS.
+    STREAM_ENABLED = os.getenv("STREAM_ENABLED", "false").lower() == "true"
+    STREAM_SYMBOLS = list(dict.fromkeys(s.strip().upper() for s in os.getenv("STREAM_SYMBOLS", "").split(',') if s.strip()))
+    STREAM_FEED = os.getenv("STREAM_FEED", "iex")
+    STREAM_5MIN_BARS = int(os.getenv("STREAM_5MIN_BARS", 1500))
+    STREAM_DAILY_BARS = int(os.getenv("STREAM_DAILY_BARS", 260))
+    STREAM_RETRY_SECONDS = float(os.getenv("STREAM_RETRY_SECONDS", 60))
 
 class DevelopmentConfig(Config):
     DEBUG = True
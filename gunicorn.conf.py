@@ -0,0 +1,19 @@
+"""
+Gunicorn hooks, loaded by default from the working directory for both entry points.
+The background market scanner and the live bar stream run in every worker (only one of them scans,
+and only one streams, see scanner_service and bar_stream): the ASGI app (asgi:app) starts and stops
+them from its lifespan, the WSGI app (main:app) here.
+"""
+from flask import Flask
+
+def post_worker_init(worker):
+    if isinstance(worker.wsgi, Flask):
+        from services import bar_stream, scanner_service
+        scanner_service.start_background_scanner()
+        bar_stream.start_background_stream()
+
+def worker_exit(server, worker):
+    if isinstance(getattr(worker, 'wsgi', None), Flask):
+        from services import bar_stream, scanner_service
+        bar_stream.stop_background_stream()
+        scanner_service.stop_background_scanner()
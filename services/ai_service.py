@@ -1,63 +1,129 @@
-import requests
-import json
-from config import OPENROUTER_API_KEY, current_config # 导入 current_config
-import time # 用于重试间隔
+import asyncio
+import threading
+from config import current_config # 导入 current_config
+import time
+from typing import Optional
 from utils.formatters import format_indicator, format_indicator_dict
-from templates.ai_prompts import generate_trading_signal_prompt
+from templates.ai_prompts import CURRENT_TIME_PLACEHOLDER, generate_trading_signal_prompt, insert_current_time
+from services import llm_client
+from services.report_cache import ReportEntry, report_cache, make_key
+from utils.metrics import StageTimer, timer_or_new
 
-def get_ai_analysis(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A'):
+REPORT_FAILED_MESSAGE = "An error occurred while generating the report after multiple retries. Please try again later."
+
+def _report_header(symbol: str, analysis_data: dict) -> Optional[str]:
+    # Explicitly yield the latest close price at the beginning of the report
+    latest_close_price = analysis_data['price_action'].get('latest_close')
+    if latest_close_price is not None:
+        return f"**{symbol} 最新收盘价:** {format_indicator(latest_close_price)}\n\n"
+    return None
+
+def _produce_report(entry: ReportEntry, prompt: str) -> None:
+    """Runs in a background thread, so the report completes even if the first subscriber disconnects."""
+    try:
+        for content in llm_client.stream_completion(prompt):
+            entry.append(content)
+    except Exception as e:
+        print(f"Report generation failed: {e}")
+        entry.append(REPORT_FAILED_MESSAGE) # 所有模型和重试都失败
+        entry.finish(failed=True)
+        return
+    entry.finish()
+
+async def _aproduce_report(entry: ReportEntry, prompt: str) -> None:
+    try:
+        async for content in llm_client.astream_completion(prompt):
+            entry.append(content)
+    except Exception as e:
+        print(f"Report generation failed: {e}")
+        entry.append(REPORT_FAILED_MESSAGE) # 所有模型和重试都失败
+        entry.finish(failed=True)
+        return
+    entry.finish()
+
+# Keeps background report tasks referenced until they finish
+_report_tasks = set()
+
+def _timed_chunks(chunks, timer: StageTimer):
+    """Passes report chunks through, timing the first chunk ('llm_first_token') and the whole stream ('llm_stream')."""
+    start = time.perf_counter()
+    first = True
+    try:
+        for chunk in chunks:
+            if first:
+                timer.record('llm_first_token', time.perf_counter() - start)
+                first = False
+            yield chunk
+    finally:
+        timer.record('llm_stream', time.perf_counter() - start)
+
+async def _atimed_chunks(chunks, timer: StageTimer):
+    start = time.perf_counter()
+    first = True
+    try:
+        async for chunk in chunks:
+            if first:
+                timer.record('llm_first_token', time.perf_counter() - start)
+                first = False
+            yield chunk
+    finally:
+        timer.record('llm_stream', time.perf_counter() - start)
+
+def _report_entry(symbol: str, analysis_data: dict, backtest_results: dict, current_time: str) -> tuple[ReportEntry, bool, str]:
+    """
+    Builds the prompt and looks up the report for this analysis; returns (entry, created, prompt).
+    The prompt is built once, without the report time, which is inserted afterwards. The key is
+    the symbol plus a hash of the prompt without the time, so requests for an unchanged analysis
+    share one report.
+    """
+    timeless_prompt = generate_trading_signal_prompt(symbol, analysis_data, backtest_results, CURRENT_TIME_PLACEHOLDER)
+    prompt = insert_current_time(timeless_prompt, current_time)
+    if not current_config.REPORT_CACHE_ENABLED:
+        # An entry of this request only
+        return ReportEntry(), True, prompt
+    entry, created = report_cache.get_or_create(make_key(symbol, timeless_prompt))
+    if not created:
+        print(f"Serving {'cached' if entry.done else 'in-flight'} AI report for {symbol}")
+    return entry, created, prompt
+
+def get_ai_analysis(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A',
+                    timer: StageTimer = None):
     """
     Generates a comprehensive trading opportunity report using Price Action and Technical Indicators.
     This function now streams the AI response with retry mechanism.
+    Reports are cached, and concurrent requests for the same report share one LLM call.
+    The tokens are sent in pieces of at most one per SSE_CHUNK_WINDOW_MS (see ReportEntry.tail).
+    Records the 'prompt_build', 'llm_first_token' and 'llm_stream' stages.
     """
-    daily_indicators = analysis_data.get('technical_indicators', {}).get('daily', {})
-    five_min_indicators = analysis_data.get('technical_indicators', {}).get('5min', {})
+    timer = timer_or_new(timer)
+    header = _report_header(symbol, analysis_data)
+    if header:
+        yield header
 
-    # Explicitly yield the latest close price at the beginning of the report
-    latest_close_price = analysis_data['price_action'].get('latest_close')
-    if latest_close_price is not None:
-        yield f"**{symbol} 最新收盘价:** {format_indicator(latest_close_price)}\n\n"
-
-    prompt = generate_trading_signal_prompt(symbol, analysis_data, backtest_results, current_time)
-
-    for model_name in current_config.OPENROUTER_MODELS:
-        for attempt in range(current_config.OPENROUTER_RETRIES):
-            try:
-                print(f"Attempting to call OpenRouter API with model: {model_name}, attempt: {attempt + 1}")
-                response = requests.post(
-                    url="https://openrouter.ai/api/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model_name, # 使用配置的模型
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "stream": True  # Enable streaming
-                    },
-                    stream=True  # Important: enable streaming for requests library
-                )
-                response.raise_for_status()
-
-                for chunk in response.iter_lines():
-                    if chunk:
-                        decoded_chunk = chunk.decode('utf-8')
-                        if decoded_chunk.startswith('data: '):
-                            try:
-                                json_data = json.loads(decoded_chunk[6:])
-                                if 'choices' in json_data and len(json_data['choices']) > 0:
-                                    delta = json_data['choices'][0].get('delta', {})
-                                    if 'content' in delta and delta['content']:
-                                        yield delta['content']
-                            except json.JSONDecodeError:
-                                # Handle cases where a chunk might not be complete JSON
-                                pass
-                return # If successful, exit the function
-
-            except requests.exceptions.RequestException as e:
-                print(f"Detailed OpenRouter API error for model {model_name}, attempt {attempt + 1}: {e}") # 后端打印详细错误
-                time.sleep(1) # 等待1秒后重试
-
-    yield "An error occurred while generating the report after multiple retries. Please try again later." # 所有模型和重试都失败
+    with timer.stage('prompt_build'):
+        entry, created, prompt = _report_entry(symbol, analysis_data, backtest_results, current_time)
+
+    if created:
+        threading.Thread(target=_produce_report, args=(entry, prompt), daemon=True).start()
+    yield from _timed_chunks(entry.tail(current_config.SSE_CHUNK_WINDOW_MS / 1000), timer)
+
+async def aget_ai_analysis(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A',
+                           timer: StageTimer = None):
+    """
+    Async version of get_ai_analysis for the ASGI app. Streams the report over a shared
+    httpx.AsyncClient, so an open report does not hold a thread.
+    """
+    timer = timer_or_new(timer)
+    header = _report_header(symbol, analysis_data)
+    if header:
+        yield header
+
+    with timer.stage('prompt_build'):
+        entry, created, prompt = _report_entry(symbol, analysis_data, backtest_results, current_time)
+
+    if created:
+        task = asyncio.ensure_future(_aproduce_report(entry, prompt))
+        _report_tasks.add(task)
+        task.add_done_callback(_report_tasks.discard)
+    async for content in _atimed_chunks(entry.atail(current_config.SSE_CHUNK_WINDOW_MS / 1000), timer):
+        yield content
@@ -1,5 +1,12 @@
 import backtrader as bt
 import pandas as pd
+from services.vectorized_backtest import match_signal_bars, run_vectorized_backtest
+
+INITIAL_CASH = 100000.0
+COMMISSION = 0.001
+BACKTEST_ENGINES = ('backtrader', 'vectorized')
+# 'rows' lists the trades as records; 'columnar' as one list per field (see utils.serialization.columnar)
+TRADE_FORMATS = ('rows', 'columnar')
 
 class TradeLogger(bt.Analyzer):
     """Analyzer to log all trades with details."""
@@ -17,6 +24,8 @@ class TradeLogger(bt.Analyzer):
                 'size': trade.size,
                 'strategy': trade.data.strategy_name # Capture strategy on open
             }
+            if trade.data._name:
+                self.trades[trade.ref]['symbol'] = trade.data._name
 
         if trade.isclosed:
             if trade.ref in self.trades:
@@ -25,19 +34,50 @@ class TradeLogger(bt.Analyzer):
 
                 self.closed_trades.append({
                     'ref': trade.ref,
+                    **({'symbol': open_trade['symbol'], 'size': open_trade['size']} if 'symbol' in open_trade else {}),
                     'direction': open_trade['direction'],
                     'strategy': open_trade['strategy'],
                     'entry_date': open_trade['entry_date'],
-                    'entry_price': f"{open_trade['entry_price']:.2f}",
+                    'entry_price': round(open_trade['entry_price'], 2),
                     'exit_date': bt.num2date(trade.dtclose).isoformat(),
-                    'exit_price': f'{exit_price:.2f}',
-                    'pnl': f'{trade.pnl:.2f}',
-                    'pnl_net': f'{trade.pnlcomm:.2f}',
+                    'exit_price': round(exit_price, 2),
+                    'pnl': round(trade.pnl, 2),
+                    'pnl_net': round(trade.pnlcomm, 2),
                 })
 
     def get_analysis(self):
         return self.closed_trades
 
+class SymbolStats(bt.Analyzer):
+    """Analyzer with the closed trade count, wins and net P&L per data feed (symbol)."""
+    def __init__(self):
+        self.stats = {}
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            stats = self.stats.setdefault(trade.data._name, {'trades': 0, 'won': 0, 'total_pnl': 0.0})
+            stats['trades'] += 1
+            stats['won'] += int(trade.pnlcomm >= 0)
+            stats['total_pnl'] += trade.pnlcomm
+
+    def get_analysis(self):
+        return {
+            symbol: {
+                'total_trades': stats['trades'],
+                'win_rate': stats['won'] / stats['trades'],
+                'total_pnl': stats['total_pnl'],
+            }
+            for symbol, stats in self.stats.items()
+        }
+
+def signal_map(signals: list, index: pd.DatetimeIndex) -> dict:
+    """
+    Maps the position of each signal's bar in `index` to its (direction, strategy_name), so that
+    next() looks signals up by bar number. Signals match their exact bar; see match_signal_bars.
+    """
+    positions, signal_types = match_signal_bars(index, signals)
+    return dict(zip(positions.tolist(), signal_types))
+
 class SignalStrategy(bt.Strategy):
     params = (
         ('signals', []),
@@ -47,16 +87,17 @@ class SignalStrategy(bt.Strategy):
 
     def __init__(self):
         self.atr = bt.indicators.AverageTrueRange(self.datas[0])
-        self.signal_map = {pd.to_datetime(s[0]).date(): (s[1], s[2]) for s in self.p.signals}
+        # The feed is the backtest DataFrame, bar i of the feed is row i of the frame
+        self.signal_map = signal_map(self.p.signals, self.datas[0].p.dataname.index)
         self.order = None
 
     def next(self):
         if self.order or self.position:
             return
 
-        current_date = self.datas[0].datetime.date(0)
-        if current_date in self.signal_map:
-            signal_type, strategy_name = self.signal_map[current_date]
+        signal = self.signal_map.get(len(self.datas[0]) - 1)
+        if signal is not None:
+            signal_type, strategy_name = signal
             self.data.strategy_name = strategy_name # Store strategy name for the logger
 
             stop_loss_distance = self.atr[0] * self.p.atr_multiplier
@@ -66,13 +107,13 @@ class SignalStrategy(bt.Strategy):
                 entry_price = self.datas[0].close[0]
                 sl_price = entry_price - stop_loss_distance
                 tp_price = entry_price + take_profit_distance
-                self.order = self.buy_bracket(sl=sl_price, tp=tp_price)
+                self.order = self.buy_bracket(stopprice=sl_price, limitprice=tp_price)
 
             elif signal_type == 'short':
                 entry_price = self.datas[0].close[0]
                 sl_price = entry_price + stop_loss_distance
                 tp_price = entry_price - take_profit_distance
-                self.order = self.sell_bracket(sl=sl_price, tp=tp_price)
+                self.order = self.sell_bracket(stopprice=sl_price, limitprice=tp_price)
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -80,14 +121,100 @@ class SignalStrategy(bt.Strategy):
         if order.status in [order.Completed, order.Canceled, order.Margin, order.Rejected]:
             self.order = None
 
-def run_backtest(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_risk_ratio: float) -> dict:
+class PortfolioSignalStrategy(bt.Strategy):
+    """
+    SignalStrategy for several data feeds sharing one broker. Each feed is a symbol with its own
+    signals; a bracket order is sized as a fraction of the portfolio value, optionally capped so
+    that hitting the stop loses at most risk_per_trade of it. At most max_positions symbols can
+    hold a position or a pending entry at the same time; signals beyond that are skipped.
+    """
+    params = (
+        ('signals', {}),
+        ('atr_multiplier', 2.0),
+        ('reward_risk_ratio', 2.0),
+        ('max_positions', 5),
+        ('position_size', 0.2),
+        ('risk_per_trade', None),
+    )
+
+    def __init__(self):
+        self.atr = {d._name: bt.indicators.AverageTrueRange(d) for d in self.datas}
+        self.signal_maps = {d._name: signal_map(self.p.signals.get(d._name, []), d.p.dataname.index) for d in self.datas}
+        self.orders = {d._name: None for d in self.datas}
+        self.last_len = {d._name: 0 for d in self.datas}
+        self.skipped_signals = 0
+
+    def prenext(self):
+        # Feeds start at different times; trade those that are ready instead of waiting for all
+        self.next()
+
+    def _active_positions(self) -> int:
+        return sum(1 for d in self.datas if self.orders[d._name] or self.getposition(d).size)
+
+    def _size(self, entry_price: float, stop_loss_distance: float) -> int:
+        value = self.broker.getvalue()
+        size = value * self.p.position_size / entry_price
+        if self.p.risk_per_trade:
+            size = min(size, value * self.p.risk_per_trade / stop_loss_distance)
+        return int(size)
+
+    def next(self):
+        for d in self.datas:
+            name = d._name
+            # Only act on feeds that have a new bar at this step, once their ATR has a value
+            if len(d) == self.last_len[name] or len(d) <= self.atr[name].params.period:
+                continue
+            self.last_len[name] = len(d)
+            if self.orders[name] or self.getposition(d).size:
+                continue
+
+            signal = self.signal_maps[name].get(len(d) - 1)
+            if signal is None:
+                continue
+            if self._active_positions() >= self.p.max_positions:
+                self.skipped_signals += 1
+                continue
+
+            signal_type, strategy_name = signal
+            stop_loss_distance = self.atr[name][0] * self.p.atr_multiplier
+            take_profit_distance = stop_loss_distance * self.p.reward_risk_ratio
+            entry_price = d.close[0]
+            size = self._size(entry_price, stop_loss_distance)
+            if size < 1:
+                continue
+            d.strategy_name = strategy_name # Store strategy name for the logger
+
+            if signal_type == 'long':
+                self.orders[name] = self.buy_bracket(data=d, size=size, stopprice=entry_price - stop_loss_distance,
+                                                     limitprice=entry_price + take_profit_distance)
+            elif signal_type == 'short':
+                self.orders[name] = self.sell_bracket(data=d, size=size, stopprice=entry_price + stop_loss_distance,
+                                                      limitprice=entry_price - take_profit_distance)
+
+    def notify_order(self, order):
+        if order.status in [order.Submitted, order.Accepted]:
+            return
+        if order.status in [order.Completed, order.Canceled, order.Margin, order.Rejected]:
+            self.orders[order.data._name] = None
+
+def run_backtest(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_risk_ratio: float, engine: str = 'backtrader') -> dict:
+    """
+    Backtests the signals with ATR-based bracket orders.
+    engine='backtrader' runs Cerebro with SignalStrategy; engine='vectorized' runs the
+    array-based equivalent in services/vectorized_backtest.py, which is much faster.
+    """
+    if engine not in BACKTEST_ENGINES:
+        raise ValueError(f"Unknown backtest engine '{engine}'. Expected one of {BACKTEST_ENGINES}.")
+    if engine == 'vectorized':
+        return run_vectorized_backtest(df, signals, atr_multiplier, reward_risk_ratio, cash=INITIAL_CASH, commission=COMMISSION)
+
     cerebro = bt.Cerebro()
     cerebro.addstrategy(SignalStrategy, signals=signals, atr_multiplier=atr_multiplier, reward_risk_ratio=reward_risk_ratio)
 
     data = bt.feeds.PandasData(dataname=df)
     cerebro.adddata(data)
-    cerebro.broker.setcash(100000.0)
-    cerebro.broker.setcommission(commission=0.001)
+    cerebro.broker.setcash(INITIAL_CASH)
+    cerebro.broker.setcommission(commission=COMMISSION)
 
     cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trade_analyzer')
     cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
@@ -121,8 +248,60 @@ def run_backtest(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_
         'trades': trade_logger
     }
 
-def get_backtest_results(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_risk_ratio: float) -> dict:
+def get_backtest_results(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_risk_ratio: float, engine: str = 'backtrader') -> dict:
     """
     A wrapper for run_backtest to be used in the application.
     """
-    return run_backtest(df, signals, atr_multiplier, reward_risk_ratio)
\ No newline at end of file
+    return run_backtest(df, signals, atr_multiplier, reward_risk_ratio, engine=engine)
+
+def run_portfolio_backtest(frames: dict, signals: dict, atr_multiplier: float, reward_risk_ratio: float,
+                           max_positions: int = 5, position_size: float = None, risk_per_trade: float = None,
+                           cash: float = INITIAL_CASH) -> dict:
+    """
+    Backtests several symbols against one broker and one cash pool with PortfolioSignalStrategy.
+    frames maps each symbol to its bar DataFrame and signals maps it to its signal list; backtrader
+    aligns the feeds on their timestamps. position_size defaults to an equal share per position slot.
+    Returns the run_backtest dict for the whole book, plus a per-symbol breakdown.
+    """
+    if position_size is None:
+        position_size = 1.0 / max_positions
+
+    cerebro = bt.Cerebro()
+    cerebro.addstrategy(PortfolioSignalStrategy, signals=signals, atr_multiplier=atr_multiplier,
+                        reward_risk_ratio=reward_risk_ratio, max_positions=max_positions,
+                        position_size=position_size, risk_per_trade=risk_per_trade)
+    for symbol, df in frames.items():
+        cerebro.adddata(bt.feeds.PandasData(dataname=df), name=symbol)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=COMMISSION)
+
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trade_analyzer')
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(TradeLogger, _name='trade_logger')
+    cerebro.addanalyzer(SymbolStats, _name='symbol_stats')
+
+    strat = cerebro.run()[0]
+
+    trade_analyzer = strat.analyzers.trade_analyzer.get_analysis()
+    sharpe_analyzer = strat.analyzers.sharpe.get_analysis()
+    drawdown_analyzer = strat.analyzers.drawdown.get_analysis()
+
+    total_trades = trade_analyzer.total.total if 'total' in trade_analyzer else 0
+    win_trades = trade_analyzer.won.total if 'won' in trade_analyzer else 0
+    pnl_net_total = trade_analyzer.pnl.net.total if 'pnl' in trade_analyzer and 'net' in trade_analyzer.pnl else 0
+
+    return {
+        'summary': {
+            'win_rate': (win_trades / total_trades) if total_trades > 0 else 0,
+            'total_trades': total_trades,
+            'average_pnl': (pnl_net_total / total_trades) if total_trades > 0 else 0,
+            'total_pnl': pnl_net_total,
+            'sharpe_ratio': sharpe_analyzer.get('sharperatio', 0.0) if sharpe_analyzer else 0.0,
+            'max_drawdown': drawdown_analyzer.max.drawdown if 'max' in drawdown_analyzer else 0.0,
+            'final_value': cerebro.broker.getvalue(),
+            'skipped_signals': strat.skipped_signals,
+        },
+        'symbols': strat.analyzers.symbol_stats.get_analysis(),
+        'trades': strat.analyzers.trade_logger.get_analysis()
+    }
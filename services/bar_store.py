@@ -0,0 +1,111 @@
+import hashlib
+import os
+import pandas as pd
+from typing import Optional
+from config import current_config
+from services import columnar_store
+
+# Derived indicator columns are stored as float32; prices, volumes and cumulative values stay float64
+FLOAT64_COLUMNS = {'Open', 'High', 'Low', 'Close', 'Volume', 'trade_count', 'vwap', 'VWAP', 'OBV',
+                   'Body', 'Upper_Shadow', 'Lower_Shadow'}
+
+def _safe_symbol(symbol: str) -> str:
+    return symbol.upper().replace('/', '_')
+
+def _bar_path(symbol: str, timeframe_key: str) -> str:
+    return os.path.join(current_config.BAR_CACHE_DIR, timeframe_key, _safe_symbol(symbol))
+
+def _enriched_path(symbol: str, frame_key: str) -> str:
+    return os.path.join(current_config.BAR_CACHE_DIR, 'enriched', frame_key, _safe_symbol(symbol))
+
+def load_bars(symbol: str, timeframe_key: str) -> tuple[Optional[pd.Timestamp], Optional[pd.DataFrame]]:
+    """
+    Loads the cached raw OHLCV bars for a symbol/timeframe, memory-mapped.
+    Returns a tuple: (covered_from, bars). Both are None if nothing is cached.
+    """
+    path = _bar_path(symbol, timeframe_key)
+    try:
+        attrs, bars = columnar_store.read_frame(path)
+    except Exception as e:
+        print(f"Error reading bar cache {path}: {e}")
+        return None, None
+    if attrs is None:
+        return None, None
+    return pd.Timestamp(attrs['covered_from']), bars
+
+def save_bars(symbol: str, timeframe_key: str, covered_from: pd.Timestamp, bars: pd.DataFrame) -> None:
+    """
+    Persists raw OHLCV bars (all float64). A new version is written next to the current one and
+    switched in atomically, so concurrent readers in other workers never see a partial write.
+    """
+    path = _bar_path(symbol, timeframe_key)
+    try:
+        columnar_store.write_frame(path, bars, attrs={'covered_from': pd.Timestamp(covered_from).isoformat()})
+    except Exception as e:
+        print(f"Error writing bar cache {path}: {e}")
+
+def bars_fingerprint(bars: pd.DataFrame) -> str:
+    """Hash of a raw bar frame's timestamps and values, identifying the input of an enriched frame."""
+    digest = hashlib.sha1(pd.DatetimeIndex(bars.index).asi8.tobytes())
+    digest.update(bars.to_numpy(dtype=float).tobytes())
+    return digest.hexdigest()
+
+def load_enriched_bars(symbol: str, frame_key: str, fingerprint: str) -> Optional[pd.DataFrame]:
+    """
+    Returns the memory-mapped enriched frame (bars plus indicators) stored for these raw bars,
+    or None if the stored frame was computed from different bars.
+    """
+    path = _enriched_path(symbol, frame_key)
+    try:
+        meta = columnar_store.read_meta(path)
+        if meta is None or meta['attrs'].get('fingerprint') != fingerprint:
+            return None
+        return columnar_store.read_frame(path, meta)[1]
+    except Exception as e:
+        print(f"Error reading enriched bar cache {path}: {e}")
+        return None
+
+def save_enriched_bars(symbol: str, frame_key: str, fingerprint: str, df: pd.DataFrame) -> None:
+    """Persists an enriched frame, with the indicator columns as float32 and Trend/Pin_Bar as codes."""
+    path = _enriched_path(symbol, frame_key)
+    float32_columns = set(df.columns) - FLOAT64_COLUMNS if current_config.BAR_CACHE_FLOAT32_INDICATORS else set()
+    try:
+        columnar_store.write_frame(path, df, float32_columns=float32_columns, attrs={'fingerprint': fingerprint})
+    except Exception as e:
+        print(f"Error writing enriched bar cache {path}: {e}")
+
+def _levels_path(symbol: str) -> str:
+    return os.path.join(current_config.BAR_CACHE_DIR, 'levels', _safe_symbol(symbol))
+
+def load_key_levels(symbol: str, fingerprint: str) -> Optional[pd.DataFrame]:
+    """Returns the memory-mapped key-level index frame (date x level) stored for these daily bars, or None."""
+    path = _levels_path(symbol)
+    try:
+        meta = columnar_store.read_meta(path)
+        if meta is None or meta['attrs'].get('fingerprint') != fingerprint:
+            return None
+        return columnar_store.read_frame(path, meta)[1]
+    except Exception as e:
+        print(f"Error reading key level cache {path}: {e}")
+        return None
+
+def save_key_levels(symbol: str, fingerprint: str, df: pd.DataFrame) -> None:
+    """Persists a key-level index frame; levels are prices, so they stay float64."""
+    path = _levels_path(symbol)
+    try:
+        columnar_store.write_frame(path, df, attrs={'fingerprint': fingerprint})
+    except Exception as e:
+        print(f"Error writing key level cache {path}: {e}")
+
+def merge_bars(cached: Optional[pd.DataFrame], fresh: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Merges freshly fetched bars into the cached ones. Fresh bars win on overlapping timestamps,
+    since the last cached bar may have been fetched before it closed.
+    """
+    if cached is None or cached.empty:
+        return fresh
+    if fresh is None or fresh.empty:
+        return cached
+    merged = pd.concat([cached, fresh])
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
@@ -0,0 +1,390 @@
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+import pandas as pd
+from alpaca.data.enums import DataFeed
+from alpaca.data.live import StockDataStream
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from config import current_config
+from analysis import technical_analysis
+from analysis.incremental_indicators import COLUMNS as INDICATOR_COLUMNS, IncrementalIndicators
+from services import data_service, scanner_service, watchlist_service
+from services.resampler import MARKET_TIMEZONE
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+FIVE_MINUTES = pd.Timedelta(minutes=5)
+LOCK_FILE = 'stream.lock'
+
+_stream = None
+_stream_pid = None
+_stream_lock = threading.Lock()
+
+class Bar(NamedTuple):
+    symbol: str
+    timestamp: pd.Timestamp  # bar start, UTC without timezone
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+def _to_utc_naive(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_convert(None) if timestamp.tzinfo is not None else timestamp
+
+def _trading_day(timestamp: pd.Timestamp) -> pd.Timestamp:
+    # Daily bars are stamped at midnight New York time, like the Alpaca daily bars
+    local = timestamp.tz_localize('UTC').tz_convert(MARKET_TIMEZONE)
+    return local.normalize().tz_convert('UTC').tz_localize(None)
+
+class BarSource(ABC):
+    """
+    A source of live bars. `batches(symbols)` yields lists of Bar, one list per burst of updates
+    (normally all symbols' bars for one minute). `bar_interval` is the length of the bars it emits.
+    """
+    bar_interval = pd.Timedelta(minutes=1)
+
+    @abstractmethod
+    def batches(self, symbols: list[str]):
+        ...
+
+    def close(self) -> None:
+        pass
+
+class ReplayBarSource(BarSource):
+    """
+    Replays historical bars as if they were streamed, for tests and local runs without a live feed.
+    Bars with the same timestamp are emitted as one batch, optionally `delay` seconds apart.
+    """
+    def __init__(self, frames: dict, bar_interval: pd.Timedelta = None, delay: float = 0.0):
+        self.frames = frames
+        self.delay = delay
+        if bar_interval is not None:
+            self.bar_interval = pd.Timedelta(bar_interval)
+        self._closed = threading.Event()
+
+    def batches(self, symbols: list[str]):
+        rows = []
+        for symbol in symbols:
+            df = self.frames.get(symbol)
+            if df is None or df.empty:
+                continue
+            values = df[OHLCV_COLUMNS].to_numpy(dtype=float)
+            rows.extend((_to_utc_naive(ts), symbol, *row) for ts, row in zip(df.index, values))
+        rows.sort(key=lambda row: row[0])
+
+        batch, batch_time = [], None
+        for timestamp, symbol, open_, high, low, close, volume in rows:
+            if batch and timestamp != batch_time:
+                yield batch
+                batch = []
+                if self._closed.wait(self.delay):
+                    return
+            batch_time = timestamp
+            batch.append(Bar(symbol, timestamp, open_, high, low, close, volume))
+        if batch:
+            yield batch
+
+    def close(self) -> None:
+        self._closed.set()
+
+class AlpacaBarSource(BarSource):
+    """
+    Minute bars from the Alpaca market data websocket. The websocket client runs in its own thread;
+    bars that arrive within `batch_window` seconds of each other are emitted as one batch.
+    """
+    def __init__(self, feed: str = None, batch_window: float = 0.5):
+        self.feed = DataFeed(feed or current_config.STREAM_FEED)
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._stream = None
+
+    def batches(self, symbols: list[str]):
+        self._stream = StockDataStream(current_config.ALPACA_API_KEY, current_config.ALPACA_SECRET_KEY, feed=self.feed)
+
+        async def on_bar(bar):
+            self._queue.put(Bar(bar.symbol, _to_utc_naive(bar.timestamp), bar.open, bar.high, bar.low, bar.close, bar.volume))
+
+        self._stream.subscribe_bars(on_bar, *symbols)
+        thread = threading.Thread(target=self._run_stream, daemon=True)
+        thread.start()
+        while True:
+            bar = self._queue.get()
+            if bar is None:
+                return
+            batch = [bar]
+            deadline = time.monotonic() + self.batch_window
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    bar = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if bar is None:
+                    yield batch
+                    return
+                batch.append(bar)
+            yield batch
+
+    def _run_stream(self) -> None:
+        try:
+            self._stream.run()
+        except Exception as e:
+            print(f"Alpaca bar stream stopped: {e}")
+        finally:
+            self._queue.put(None)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            try:
+                self._stream.stop()
+            except Exception as e:
+                print(f"Error stopping Alpaca bar stream: {e}")
+        self._queue.put(None)
+
+class SymbolBuffer:
+    """
+    Rolling in-memory 5-minute and daily bars for one symbol, built from streamed bars.
+    Only closed 5-minute bars are kept in `five_min`; the bar still forming is held aside.
+    The last daily bar is the current, still forming, day, as in the Alpaca daily bars.
+    The indicators of each timeframe are updated bar by bar as its bars close (see
+    IncrementalIndicators), and their values are kept alongside the bars in `indicator_rows`.
+    """
+    def __init__(self, five_min_bars: int, daily_bars: int):
+        self.five_min = deque(maxlen=five_min_bars)
+        self.daily = deque(maxlen=daily_bars)
+        self.forming = None
+        self.indicators = {'5min': IncrementalIndicators(), 'daily': IncrementalIndicators()}
+        # Indicator values of every row of five_min, and of every closed day of daily
+        self.indicator_rows = {'5min': deque(maxlen=five_min_bars), 'daily': deque(maxlen=daily_bars)}
+
+    def _close_bar(self, timeframe: str, row: list) -> None:
+        self.indicators[timeframe].update(*row)
+        self.indicator_rows[timeframe].append(self.indicators[timeframe].row())
+
+    def _append_five_min(self, row: list) -> None:
+        self.five_min.append(row)
+        self._close_bar('5min', row)
+
+    def _append_day(self, row: list) -> None:
+        # The day before is closed from now on
+        if self.daily:
+            self._close_bar('daily', self.daily[-1])
+        self.daily.append(row)
+
+    def seed(self, df_5min: pd.DataFrame = None, df_daily: pd.DataFrame = None) -> None:
+        for df, append, maxlen in ((df_5min, self._append_five_min, self.five_min.maxlen),
+                                   (df_daily, self._append_day, self.daily.maxlen)):
+            if df is None or df.empty:
+                continue
+            df = df[OHLCV_COLUMNS].tail(maxlen)
+            for ts, values in zip(df.index, df.to_numpy(dtype=float).tolist()):
+                append([_to_utc_naive(ts), *values])
+
+    @staticmethod
+    def _merge(row: list, bar: Bar) -> None:
+        row[2] = max(row[2], bar.high)
+        row[3] = min(row[3], bar.low)
+        row[4] = bar.close
+        row[5] += bar.volume
+
+    def add(self, bar: Bar, bar_interval: pd.Timedelta) -> bool:
+        """Folds a bar into the buffers. Returns True when it closed a 5-minute bar."""
+        closed = False
+        bucket = bar.timestamp.floor(FIVE_MINUTES)
+        if self.five_min and bucket <= self.five_min[-1][0]:
+            return False  # Late or duplicate bar for a period that is already closed
+
+        if self.forming is not None and self.forming[0] != bucket:
+            self._append_five_min(self.forming)
+            self.forming = None
+            closed = True
+        if self.forming is None:
+            self.forming = [bucket, bar.open, bar.high, bar.low, bar.close, bar.volume]
+        else:
+            self._merge(self.forming, bar)
+        if bar.timestamp + bar_interval >= bucket + FIVE_MINUTES:
+            self._append_five_min(self.forming)
+            self.forming = None
+            closed = True
+
+        day = _trading_day(bar.timestamp)
+        if self.daily and self.daily[-1][0] == day:
+            self._merge(self.daily[-1], bar)
+        elif not self.daily or day > self.daily[-1][0]:
+            self._append_day([day, bar.open, bar.high, bar.low, bar.close, bar.volume])
+        return closed
+
+    @staticmethod
+    def _frame(rows, indicator_rows) -> pd.DataFrame:
+        """The bars with their indicator columns, as calculate_technical_indicators would add them."""
+        if not rows:
+            return None
+        timestamps, *columns = zip(*rows)
+        index = pd.DatetimeIndex(timestamps, name='timestamp')
+        df = pd.DataFrame(dict(zip(OHLCV_COLUMNS, columns)), index=index)
+        indicators = pd.DataFrame(list(indicator_rows), columns=INDICATOR_COLUMNS, index=index, dtype=float)
+        return pd.concat([df, indicators], axis=1)
+
+    def frames(self) -> dict:
+        """The 5-minute and daily frames with their indicators; those of the forming day are previewed."""
+        daily_rows = []
+        if self.daily:
+            closed_days = len(self.daily) - 1
+            daily_rows = list(self.indicator_rows['daily'])[len(self.indicator_rows['daily']) - closed_days:]
+            daily_rows.append(self.indicators['daily'].preview(*self.daily[-1]).row())
+        return {'5min': self._frame(self.five_min, self.indicator_rows['5min']),
+                'daily': self._frame(self.daily, daily_rows)}
+
+class BarStreamIngestor:
+    """
+    Keeps rolling per-symbol buffers up to date from a BarSource and re-runs the price action
+    analysis and the 5-minute signal scan only for the symbols whose 5-minute bar just closed.
+    The indicators are not recomputed over the buffers: each closed bar is folded into the
+    symbol's incremental state. The latest result per symbol is kept in `results`.
+    """
+    def __init__(self, five_min_bars: int = None, daily_bars: int = None):
+        self.five_min_bars = five_min_bars or current_config.STREAM_5MIN_BARS
+        self.daily_bars = daily_bars or current_config.STREAM_DAILY_BARS
+        self.buffers = {}
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, symbol: str) -> SymbolBuffer:
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers[symbol] = SymbolBuffer(self.five_min_bars, self.daily_bars)
+        return buffer
+
+    def seed(self, symbol: str, df_5min: pd.DataFrame = None, df_daily: pd.DataFrame = None) -> None:
+        """Fills a symbol's buffers with historical bars, so the first analysis has full context."""
+        with self._lock:
+            self._buffer(symbol).seed(df_5min, df_daily)
+
+    def seed_from_history(self, symbols: list[str]) -> None:
+        """Seeds the buffers from Alpaca historical bars, fetched with one bulk request per timeframe."""
+        end_date = datetime.now()
+        daily_bars = data_service.get_bars_for_symbols(symbols, TimeFrame.Day, end_date - timedelta(days=365), end_date)
+        five_min_bars = data_service.get_bars_for_symbols(symbols, TimeFrame(5, TimeFrameUnit.Minute), end_date - timedelta(days=5), end_date)
+        for symbol in symbols:
+            self.seed(symbol, five_min_bars.get(symbol), daily_bars.get(symbol))
+
+    def ingest(self, bars: list[Bar], bar_interval: pd.Timedelta) -> set[str]:
+        """Folds a batch of bars into the buffers. Returns the symbols with a newly closed 5-minute bar."""
+        changed = set()
+        with self._lock:
+            for bar in bars:
+                if self._buffer(bar.symbol).add(bar, bar_interval):
+                    changed.add(bar.symbol)
+        return changed
+
+    def analyze(self, symbol: str) -> dict:
+        with self._lock:
+            dfs = self.buffers[symbol].frames()
+        try:
+            for name, df in dfs.items():
+                if df is not None:
+                    dfs[name] = technical_analysis.detect_pin_bar(df)
+            result = watchlist_service.analyze_symbol(symbol, dfs)
+            result['bar_time'] = dfs['5min'].index[-1].isoformat()
+        except Exception as e:
+            print(f"Error analyzing streamed bars for {symbol}: {e}")
+            result = {'symbol': symbol, 'error': str(e)}
+        self.results[symbol] = result
+        return result
+
+    def run(self, source: BarSource, symbols: list[str]):
+        """
+        Consumes the source and yields a fresh analysis result for each symbol whose 5-minute bar closed.
+        Closing the generator closes the source.
+        """
+        try:
+            for batch in source.batches(symbols):
+                for symbol in sorted(self.ingest(batch, source.bar_interval)):
+                    yield self.analyze(symbol)
+        finally:
+            source.close()
+
+class BackgroundBarStream:
+    """
+    Runs a BarStreamIngestor over a live bar source in a background thread, seeded from the historical
+    bars, and stores each fresh result with scanner_service.save_result, so that requests start from it
+    through scanner_service.load_result like from a scan result. Alpaca allows one stream connection per
+    account: every worker process runs the thread, but only the one holding the lock file streams; the
+    others try to take it every `retry` seconds. A stream that ends is reseeded and reconnected.
+    """
+    def __init__(self, symbols: list[str], source_factory: Callable[[], BarSource] = None, retry: float = None):
+        self.symbols = symbols
+        self.source_factory = source_factory or AlpacaBarSource
+        self.retry = current_config.STREAM_RETRY_SECONDS if retry is None else retry
+        self.ingestor = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._source = None
+        self._source_lock = threading.Lock()
+
+    def stream(self) -> None:
+        """Seeds a new ingestor and stores its results until the source ends or the stream is stopped."""
+        self.ingestor = BarStreamIngestor()
+        self.ingestor.seed_from_history(self.symbols)
+        with self._source_lock:
+            if self._stop.is_set():
+                return
+            self._source = self.source_factory()
+        try:
+            for result in self.ingestor.run(self._source, self.symbols):
+                result['scanned_at'] = time.time()
+                scanner_service.save_result(result)
+        finally:
+            with self._source_lock:
+                self._source = None
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            if self._lock_file is None:
+                self._lock_file = scanner_service.acquire_lock_file(LOCK_FILE)
+            if self._lock_file is not None:
+                try:
+                    self.stream()
+                except Exception as e:
+                    print(f"Error in bar stream: {e}")
+            self._stop.wait(self.retry)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name='bar-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._source_lock:
+            self._stop.set()
+            if self._source is not None:
+                self._source.close()
+        if self._thread is not None:
+            self._thread.join()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+def start_background_stream(source_factory: Callable[[], BarSource] = None) -> Optional[BackgroundBarStream]:
+    """Starts this worker's bar stream thread (from AlpacaBarSource by default) if STREAM_ENABLED and it is not running yet."""
+    global _stream, _stream_pid
+    if not current_config.STREAM_ENABLED or not current_config.STREAM_SYMBOLS:
+        return None
+    with _stream_lock:
+        if _stream is None or _stream_pid != os.getpid():
+            _stream = BackgroundBarStream(current_config.STREAM_SYMBOLS, source_factory)
+            _stream_pid = os.getpid()
+            _stream.start()
+    return _stream
+
+def stop_background_stream() -> None:
+    global _stream
+    with _stream_lock:
+        if _stream is not None and _stream_pid == os.getpid():
+            _stream.stop()
+        _stream = None
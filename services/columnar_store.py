@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+# Layout of one stored frame:
+#   <path>/meta.json                  points at the current version and describes its columns
+#   <path>/<version>/index.npy        int64 nanosecond timestamps
+#   <path>/<version>/float64.npy      (columns, rows) float64, one contiguous row per column
+#   <path>/<version>/float32.npy      (columns, rows) float32
+#   <path>/<version>/codes.npy        (columns, rows) int8 codes of bool and categorical columns
+# A new version is written next to the old one and meta.json is swapped in atomically, so readers
+# never see a partial write; readers that already mapped the old version keep their mapping.
+META_FILE = 'meta.json'
+GROUPS = ('float64', 'float32', 'codes')
+# Version directories that no meta.json points at are removed once they are this old (seconds): they
+# were left by a writer that was overtaken or died. Younger ones may still be written by another process.
+STALE_VERSION_SECONDS = 600
+
+def _column_groups(df: pd.DataFrame, float32_columns: set) -> tuple[dict, dict]:
+    groups = {group: {} for group in GROUPS}
+    categorical = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            groups['codes'][col] = series.to_numpy(dtype=np.int8)
+            categorical[col] = None
+        elif pd.api.types.is_numeric_dtype(series):
+            group = 'float32' if col in float32_columns else 'float64'
+            groups[group][col] = series.to_numpy(dtype=group)
+        else:
+            values = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+            groups['codes'][col] = values.cat.codes.to_numpy(dtype=np.int8)
+            categorical[col] = [str(category) for category in values.cat.categories]
+    return groups, categorical
+
+def write_frame(path: str, df: pd.DataFrame, float32_columns: set = frozenset(), attrs: dict = None) -> None:
+    """
+    Writes a DatetimeIndex frame in the columnar layout. Numeric columns are float64 unless listed in
+    `float32_columns`; bool and string/categorical columns (e.g. Pin_Bar, Trend) are stored as int8 codes.
+    `attrs` is a JSON-serializable dict stored alongside, returned by read_frame.
+    """
+    os.makedirs(path, exist_ok=True)
+    groups, categorical = _column_groups(df, float32_columns)
+    version_dir = tempfile.mkdtemp(dir=path, prefix='v')
+    try:
+        np.save(os.path.join(version_dir, 'index.npy'), pd.DatetimeIndex(df.index).asi8)
+        for group, columns in groups.items():
+            dtype = np.int8 if group == 'codes' else group
+            block = np.stack(list(columns.values())) if columns else np.empty((0, len(df)), dtype=dtype)
+            np.save(os.path.join(version_dir, f'{group}.npy'), np.ascontiguousarray(block, dtype=dtype))
+
+        meta = {
+            'version': os.path.basename(version_dir),
+            'rows': len(df),
+            'columns': list(df.columns),
+            'index_name': df.index.name,
+            'groups': {group: list(columns) for group, columns in groups.items()},
+            'categorical': categorical,
+            'attrs': attrs or {},
+        }
+        fd, tmp_meta = tempfile.mkstemp(dir=path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        previous = _read_meta_or_none(path)
+        os.replace(tmp_meta, os.path.join(path, META_FILE))
+    except Exception:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    # The version this one replaced is no longer referenced; open mappings of it stay valid after
+    # the unlink. Other versions may belong to writers still in progress, see STALE_VERSION_SECONDS.
+    if previous is not None and previous.get('version') not in (None, meta['version']):
+        shutil.rmtree(os.path.join(path, previous['version']), ignore_errors=True)
+    _remove_stale_versions(path, meta['version'])
+
+def _read_meta_or_none(path: str) -> Optional[dict]:
+    try:
+        return read_meta(path)
+    except (OSError, ValueError):
+        return None
+
+def _remove_stale_versions(path: str, current: str) -> None:
+    stale_before = time.time() - STALE_VERSION_SECONDS
+    for name in os.listdir(path):
+        version_dir = os.path.join(path, name)
+        try:
+            if name != current and name.startswith('v') and os.path.isdir(version_dir) \
+                    and os.path.getmtime(version_dir) < stale_before:
+                shutil.rmtree(version_dir, ignore_errors=True)
+        except OSError:
+            continue  # Removed by another writer meanwhile
+
+def read_meta(path: str) -> Optional[dict]:
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def read_frame(path: str, meta: dict = None) -> tuple[Optional[dict], Optional[pd.DataFrame]]:
+    """
+    Maps a stored frame into memory without copying it. Returns (attrs, df), or (None, None) if
+    nothing is stored. The arrays are copy-on-write memory maps: every process reading the same
+    file shares the page cache, and writing to the frame never touches the file.
+    """
+    meta = meta or read_meta(path)
+    if meta is None:
+        return None, None
+    version_dir = os.path.join(path, meta['version'])
+    index = pd.DatetimeIndex(np.load(os.path.join(version_dir, 'index.npy'), mmap_mode='c'), name=meta['index_name'])
+    columns = {}
+    for group in GROUPS:
+        names = meta['groups'][group]
+        if not names:
+            continue
+        block = np.load(os.path.join(version_dir, f'{group}.npy'), mmap_mode='c')
+        for i, col in enumerate(names):
+            if group != 'codes':
+                columns[col] = block[i]
+            elif meta['categorical'][col] is None:
+                columns[col] = block[i].view(np.bool_)
+            else:
+                columns[col] = pd.Categorical.from_codes(block[i], categories=meta['categorical'][col])
+    df = pd.DataFrame({col: columns[col] for col in meta['columns']}, index=index, copy=False)
+    return meta['attrs'], df
@@ -1,67 +1,376 @@
+import asyncio
+import os
+import numpy as np
 import pandas as pd
-from config import ALPACA_API_KEY, ALPACA_SECRET_KEY
+from config import ALPACA_API_KEY, ALPACA_SECRET_KEY, current_config
 from typing import Optional
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
-from datetime import datetime
-import pandas as pd
-from config import ALPACA_API_KEY, ALPACA_SECRET_KEY
-from typing import Optional
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
-from datetime import datetime
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from datetime import datetime, timedelta
 from analysis import technical_analysis
+from analysis.key_levels import KeyLevelIndex
+from services import bar_store, resampler
+from utils.http import get_session
+from utils.metrics import StageTimer, timer_or_new
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+TREND_CATEGORIES = ['Neutral', 'Uptrend', 'Downtrend']
+# Days of bars per timeframe in a symbol analysis; all of them are derived from one pull
+ANALYSIS_WINDOWS = {'daily': 365, '4h': 90, '1h': 30, '5min': 5}
 
-def get_bars_from_alpaca(symbol: str, timeframe: TimeFrame, start_date: datetime, end_date: datetime, resample_to_4h: bool = False) -> Optional[pd.DataFrame]:
+_client = None
+_client_pid = None
+_fetch_executor = None
+_fetch_executor_pid = None
+
+def get_alpaca_client() -> StockHistoricalDataClient:
     """
-    Fetches historical stock bars from Alpaca. It will use the free IEX feed.
-    Can also resample 1-hour data to 4-hour data.
+    Returns this worker's StockHistoricalDataClient, created once per process.
+    Its HTTP session is replaced by the shared keep-alive session, so requests reuse TCP/TLS connections.
     """
-    client = StockHistoricalDataClient(ALPACA_API_KEY, ALPACA_SECRET_KEY)
-    
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        client = StockHistoricalDataClient(ALPACA_API_KEY, ALPACA_SECRET_KEY)
+        # alpaca-py has no public hook for the session it uses
+        client._session = get_session('alpaca')
+        _client, _client_pid = client, os.getpid()
+    return _client
+
+def _to_utc_naive(value: datetime) -> pd.Timestamp:
+    """Bars are indexed by naive UTC timestamps, so request bounds are normalized the same way."""
+    ts = pd.Timestamp(value)
+    if ts.tz is not None:
+        ts = ts.tz_convert(None)
+    return ts
+
+def _fetch_bars(symbols: list[str], timeframe: TimeFrame, start_date: datetime, end_date: datetime) -> dict[str, pd.DataFrame]:
+    """
+    Fetches raw OHLCV bars for several symbols from Alpaca in a single request, using the free IEX feed.
+    Returns a dict of per-symbol DataFrames; symbols without bars are left out.
+    """
+    client = get_alpaca_client()
+
     request_params = StockBarsRequest(
-        symbol_or_symbols=[symbol],
+        symbol_or_symbols=symbols,
         timeframe=timeframe,
         start=start_date,
         end=end_date,
         feed='iex'
     )
+    bars = client.get_stock_bars(request_params)
+    df = bars.df
+    if df.empty:
+        return {}
+    if df.index.get_level_values('timestamp').tz is not None:
+        df.index = df.index.set_levels(df.index.levels[1].tz_convert(None), level='timestamp')
+    df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}, inplace=True)
+    return {symbol: df_symbol.reset_index(level=0, drop=True) for symbol, df_symbol in df.groupby(level=0, sort=False)}
+
+def _get_raw_bars(symbols: list[str], timeframe: TimeFrame, start_date: datetime, end_date: datetime) -> dict[str, Optional[pd.DataFrame]]:
+    """
+    Returns raw OHLCV bars for the window per symbol, served from the local bar cache where possible.
+    Symbols whose cache reaches back far enough only need the tail since their last cached bar;
+    the others need the whole window. The symbols that only need their tail share one Alpaca
+    request, starting at the earliest bar any of them is missing, and those that need the whole
+    window share another, so that one cold symbol does not make the warm ones refetch the window.
+    If a fetch fails, the warm symbols are served from the cache; the cold ones get None, since
+    their cache does not cover the window.
+    """
+    if not current_config.BAR_CACHE_ENABLED:
+        fetched = _fetch_bars(symbols, timeframe, start_date, end_date)
+        return {symbol: fetched.get(symbol) for symbol in symbols}
+
+    start = _to_utc_naive(start_date)
+    end = _to_utc_naive(end_date)
+    timeframe_key = timeframe.value
+
+    cache = {}
+    # First bar to fetch per symbol: the warm ones need their tail, the cold ones the whole window
+    tail_from = {}
+    window_from = {}
+    for symbol in symbols:
+        covered_from, cached = bar_store.load_bars(symbol, timeframe_key)
+        if cached is not None and not cached.empty and covered_from <= start:
+            cache[symbol] = (covered_from, cached)
+            last_cached = cached.index[-1]
+            if end > last_cached:
+                # Re-fetch from the last cached bar: it may have been stored before it closed.
+                tail_from[symbol] = last_cached
+        else:
+            cache[symbol] = (start if covered_from is None else min(covered_from, start), cached)
+            window_from[symbol] = start
+
+    fetched = {}
+    failed = set()
+    for group in (tail_from, window_from):
+        if not group:
+            continue
+        try:
+            fetched.update(_fetch_bars(list(group), timeframe, min(group.values()).to_pydatetime(), end_date))
+        except Exception as e:
+            if group is tail_from:
+                print(f"Error fetching new bars for {list(group)}, serving cached bars: {e}")
+            else:
+                print(f"Error fetching bars for {list(group)}: {e}")
+                failed.update(group)
+
+    results = {}
+    for symbol in symbols:
+        if symbol in failed:
+            results[symbol] = None
+            continue
+        covered_from, cached = cache[symbol]
+        fresh = fetched.get(symbol)
+        bars = bar_store.merge_bars(cached, fresh)
+        if bars is None or bars.empty:
+            results[symbol] = None
+            continue
+        if fresh is not None and not fresh.empty:
+            bar_store.save_bars(symbol, timeframe_key, covered_from, bars)
+        results[symbol] = bars.loc[start:end]
+    return results
+
+def _enrich_bars(df: pd.DataFrame, timeframe: TimeFrame, resample_to_4h: bool) -> pd.DataFrame:
+    """Optionally resamples the bars, then adds technical indicators, pin bars and the EMA trend."""
+    if resample_to_4h and timeframe == TimeFrame.Hour:
+        df = df.resample('4H').agg({
+            'Open': 'first',
+            'High': 'max',
+            'Low': 'min',
+            'Close': 'last',
+            'Volume': 'sum'
+        }).dropna()
+
+    # Calculate technical indicators and detect Pin Bar
+    _, df_with_ta = technical_analysis.calculate_technical_indicators(df.copy())
+    df_with_ta = technical_analysis.detect_pin_bar(df_with_ta)
+
+    # Trend judgment based on EMA (using EMA_20), as a categorical column
+    if 'EMA_20' in df_with_ta.columns:
+        close = df_with_ta['Close'].to_numpy()
+        ema_20 = df_with_ta['EMA_20'].to_numpy()
+        trend_codes = np.select([close > ema_20, close < ema_20], [1, 2], default=0)
+        df_with_ta['Trend'] = pd.Categorical.from_codes(trend_codes, categories=TREND_CATEGORIES)
+    else:
+        print("Warning: EMA_20 not found in DataFrame. Trend analysis skipped.")
+
+    return df_with_ta
+
+def _window_key(start_date: datetime, end_date: datetime) -> str:
+    """Names a request window by its length, e.g. '30d', so that windows of different lengths are cached apart."""
+    return f'{(_to_utc_naive(end_date) - _to_utc_naive(start_date)).days}d'
+
+def _get_enriched_bars(symbol: str, df: pd.DataFrame, timeframe: TimeFrame, resample_to_4h: bool, frame_key: str = None,
+                       window: str = None) -> pd.DataFrame:
+    """
+    Returns the enriched frame for these raw bars. With the bar cache enabled it is computed once
+    and stored in the columnar cache; every worker then maps the same file instead of recomputing it.
+    `frame_key` names the cached frame; by default it is derived from the timeframe. Each `window`
+    (see _window_key) gets its own entry, so that callers reading different windows of the same
+    bars do not keep replacing each other's frame.
+    """
+    if not current_config.BAR_CACHE_ENABLED:
+        return _enrich_bars(df, timeframe, resample_to_4h)
+    frame_key = frame_key or timeframe.value + ('_4H' if resample_to_4h and timeframe == TimeFrame.Hour else '')
+    if window:
+        frame_key = f'{frame_key}_{window}'
+    fingerprint = bar_store.bars_fingerprint(df[['Open', 'High', 'Low', 'Close', 'Volume']])
+    df_with_ta = bar_store.load_enriched_bars(symbol, frame_key, fingerprint)
+    if df_with_ta is None:
+        df_with_ta = _enrich_bars(df, timeframe, resample_to_4h)
+        bar_store.save_enriched_bars(symbol, frame_key, fingerprint, df_with_ta)
+        # Serve the stored copy, so that every caller sees the same values and shares its pages
+        stored = bar_store.load_enriched_bars(symbol, frame_key, fingerprint)
+        if stored is not None:
+            df_with_ta = stored
+    return df_with_ta
+
+def get_bars_for_symbols(symbols: list[str], timeframe: TimeFrame, start_date: datetime, end_date: datetime, resample_to_4h: bool = False,
+                         timer: StageTimer = None) -> dict[str, Optional[pd.DataFrame]]:
+    """
+    Batch version of get_bars_from_alpaca: fetches bars for all symbols with a single Alpaca request
+    and returns a dict of per-symbol DataFrames with indicators (None where there is no data).
+    The fetch and the indicator computation are timed as the 'fetch:<timeframe>' and
+    'indicators:<timeframe>' stages.
+    """
+    timer = timer_or_new(timer)
     try:
-        bars = client.get_stock_bars(request_params)
-        df = bars.df
-        if df.empty:
+        with timer.stage(f'fetch:{timeframe.value}'):
+            raw_bars = _get_raw_bars(symbols, timeframe, start_date, end_date)
+    except Exception as e:
+        print(f"Error fetching data from Alpaca for {symbols}: {e}")
+        return {symbol: None for symbol in symbols}
+
+    with timer.stage(f'indicators:{timeframe.value}'):
+        return _enrich_symbols(symbols, raw_bars, timeframe, resample_to_4h, _window_key(start_date, end_date))
+
+def _enrich_symbols(symbols: list[str], raw_bars: dict, timeframe: TimeFrame, resample_to_4h: bool,
+                    window: str = None) -> dict[str, Optional[pd.DataFrame]]:
+    results = {}
+    for symbol in symbols:
+        df = raw_bars.get(symbol)
+        if df is None or df.empty:
             print(f"No data returned from Alpaca for {symbol} with timeframe {timeframe}.")
-            return None
-        if isinstance(df.index, pd.MultiIndex):
-            df = df.reset_index(level=0, drop=True)
-        if df.index.tz is not None:
-            df.index = df.index.tz_convert(None)
-        df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}, inplace=True)
-
-        if resample_to_4h and timeframe == TimeFrame.Hour:
-            df = df.resample('4H').agg({
-                'Open': 'first',
-                'High': 'max',
-                'Low': 'min',
-                'Close': 'last',
-                'Volume': 'sum'
-            }).dropna()
-
-        # Calculate technical indicators and detect Pin Bar
-        _, df_with_ta = technical_analysis.calculate_technical_indicators(df.copy())
-        df_with_ta = technical_analysis.detect_pin_bar(df_with_ta)
-
-        # Trend judgment based on EMA (using EMA_20 from pandas_ta)
-        if 'EMA_20' in df_with_ta.columns:
-            df_with_ta['Trend'] = 'Neutral'
-            df_with_ta.loc[df_with_ta['Close'] > df_with_ta['EMA_20'], 'Trend'] = 'Uptrend'
-            df_with_ta.loc[df_with_ta['Close'] < df_with_ta['EMA_20'], 'Trend'] = 'Downtrend'
-        else:
-            print("Warning: EMA_20 not found in DataFrame. Trend analysis skipped.")
+            results[symbol] = None
+            continue
+        try:
+            results[symbol] = _get_enriched_bars(symbol, df, timeframe, resample_to_4h, window=window)
+        except Exception as e:
+            print(f"Error preparing bars for {symbol}: {e}")
+            results[symbol] = None
+    return results
+
+def get_bars_from_alpaca(symbol: str, timeframe: TimeFrame, start_date: datetime, end_date: datetime, resample_to_4h: bool = False,
+                         timer: StageTimer = None) -> Optional[pd.DataFrame]:
+    """
+    Fetches historical stock bars from Alpaca. It will use the free IEX feed.
+    Bars are cached locally per symbol and timeframe, so repeated calls only fetch new bars.
+    Can also resample 1-hour data to 4-hour data.
+    """
+    return get_bars_for_symbols([symbol], timeframe, start_date, end_date, resample_to_4h, timer=timer)[symbol]
+
+def get_key_level_index(symbol: str, df_daily: pd.DataFrame) -> KeyLevelIndex:
+    """
+    The key-level index of a symbol for these daily bars, one row per daily bar. With the bar cache
+    enabled it is built once per set of daily bars and persisted next to them. A row only depends on
+    the bars before its date, so the latest bar, which may still be forming, only counts by its date:
+    the stored index stays valid for the whole day.
+    """
+    if not current_config.BAR_CACHE_ENABLED:
+        return KeyLevelIndex.build(df_daily)
+    if not df_daily.index.is_monotonic_increasing:
+        df_daily = df_daily.sort_index()
+    fingerprint = bar_store.bars_fingerprint(df_daily[['Open', 'High', 'Low', 'Close', 'Volume']].iloc[:-1])
+    if not df_daily.empty:
+        fingerprint += f'_{pd.Timestamp(df_daily.index[-1]).value}'
+    stored = bar_store.load_key_levels(symbol, fingerprint)
+    if stored is not None:
+        return KeyLevelIndex.from_frame(stored)
+    index = KeyLevelIndex.build(df_daily)
+    bar_store.save_key_levels(symbol, fingerprint, index.to_frame())
+    return index
 
-        return df_with_ta
+def get_current_key_levels(symbol: str, df_daily: pd.DataFrame) -> dict:
+    """
+    The key levels for the latest daily bar, which may still be forming: the same levels as
+    get_key_levels(analyze_price_action({'daily': df_daily})), from the persisted index.
+    """
+    if df_daily is None or df_daily.empty:
+        return {'support': {}, 'resistance': {}}
+    if not df_daily.index.is_monotonic_increasing:
+        df_daily = df_daily.sort_index()
+    index = get_key_level_index(symbol, df_daily)
+    latest = df_daily.iloc[-1]
+    return index.key_levels(df_daily.index[-1], current_high=float(latest['High']), current_low=float(latest['Low']))
+
+def _resample_base() -> tuple[str, TimeFrame]:
+    minutes = current_config.RESAMPLE_BASE_MINUTES
+    return f'{minutes}min', TimeFrame(minutes, TimeFrameUnit.Minute)
+
+def _pull_base_bars(symbol: str, start_date: datetime, end_date: datetime, timer: StageTimer) -> Optional[pd.DataFrame]:
+    _, base_timeframe = _resample_base()
+    try:
+        with timer.stage(f'fetch:{base_timeframe.value}'):
+            return _get_raw_bars([symbol], base_timeframe, start_date, end_date)[symbol]
     except Exception as e:
         print(f"Error fetching data from Alpaca for {symbol}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def _derive_timeframe(symbol: str, raw: Optional[pd.DataFrame], name: str, start_date: datetime, end_date: datetime,
+                      timer: StageTimer) -> Optional[pd.DataFrame]:
+    """One timeframe of a base pull, resampled unless it is the base timeframe itself, with indicators."""
+    base_name, base_timeframe = _resample_base()
+    if raw is None or raw.empty:
+        print(f"No data returned from Alpaca for {symbol} with timeframe {base_timeframe}.")
+        return None
+    try:
+        if name == base_name:
+            # Not the plain timeframe key: that entry belongs to get_bars_for_symbols
+            df, frame_key = raw, f'{base_timeframe.value}_analysis'
+        else:
+            with timer.stage(f'resample:{name}'):
+                # Resampled over the whole pull and then cut, so the first bar of the window is complete
+                df = resampler.resample_session_bars(raw, name, session=current_config.RESAMPLE_SESSION)
+            frame_key = f'{base_timeframe.value}_{name}_{current_config.RESAMPLE_SESSION}'
+        df = df.loc[_to_utc_naive(start_date):]
+        if df.empty:
+            return None
+        with timer.stage(f'indicators:{name}'):
+            return _get_enriched_bars(symbol, df, base_timeframe, False, frame_key=frame_key,
+                                      window=_window_key(start_date, end_date))
+    except Exception as e:
+        print(f"Error preparing {name} bars for {symbol}: {e}")
+        return None
+
+def analysis_start_dates(end_date: datetime) -> dict:
+    """Start of each timeframe's window in a symbol analysis, for resampled_timeframes."""
+    return {name: end_date - timedelta(days=days) for name, days in ANALYSIS_WINDOWS.items()}
+
+def resampled_timeframes(symbol: str, start_dates: dict, end_date: datetime, timer: StageTimer = None):
+    """
+    Builds several timeframes of one symbol from a single pull of fine-grained bars (RESAMPLE_BASE_MINUTES,
+    served from the bar cache like any other pull) instead of one fetch per timeframe.
+    start_dates maps a timeframe name to the start of its window: the base ('5min' or '1min') is used
+    as fetched, the others ('1h', '4h', 'daily', ... see resampler.RESAMPLE_RULES) are resampled
+    session by session. Yields (name, df) pairs, with indicators, as each timeframe is ready.
+    """
+    timer = timer_or_new(timer)
+    raw = _pull_base_bars(symbol, min(start_dates.values()), end_date, timer)
+    for name, start_date in start_dates.items():
+        yield name, _derive_timeframe(symbol, raw, name, start_date, end_date, timer)
+
+def get_resampled_timeframes(symbol: str, start_dates: dict, end_date: datetime, timer: StageTimer = None) -> dict:
+    """Like resampled_timeframes, but returns a dict of name -> df."""
+    return dict(resampled_timeframes(symbol, start_dates, end_date, timer=timer))
+
+async def aresampled_timeframes(symbol: str, start_dates: dict, end_date: datetime, timer: StageTimer = None):
+    """Async version of resampled_timeframes for the ASGI app; the work runs on the fetch thread pool."""
+    timer = timer_or_new(timer)
+    loop = asyncio.get_running_loop()
+    executor = _get_fetch_executor()
+    raw = await loop.run_in_executor(executor, _pull_base_bars, symbol, min(start_dates.values()), end_date, timer)
+    for name, start_date in start_dates.items():
+        yield name, await loop.run_in_executor(executor, _derive_timeframe, symbol, raw, name, start_date, end_date, timer)
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    """Thread pool for concurrent fetches, created once per worker process (threads do not survive a fork)."""
+    global _fetch_executor, _fetch_executor_pid
+    if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+        _fetch_executor = ThreadPoolExecutor(max_workers=current_config.FETCH_MAX_WORKERS, thread_name_prefix='bars')
+        _fetch_executor_pid = os.getpid()
+    return _fetch_executor
+
+def fetch_timeframes_concurrently(symbol: str, timeframe_requests: dict, timer: StageTimer = None):
+    """
+    Fetches several timeframes for one symbol at the same time.
+    timeframe_requests maps a name (e.g. 'daily') to a (timeframe, start_date, end_date) tuple.
+    Yields (name, df) pairs in the order the fetches complete.
+    """
+    executor = _get_fetch_executor()
+    futures = {
+        executor.submit(get_bars_from_alpaca, symbol, timeframe, start_date, end_date, timer=timer): name
+        for name, (timeframe, start_date, end_date) in timeframe_requests.items()
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+def get_timeframes(symbol: str, timeframe_requests: dict, timer: StageTimer = None) -> dict:
+    """Like fetch_timeframes_concurrently, but waits for all fetches and returns a dict of name -> df."""
+    return dict(fetch_timeframes_concurrently(symbol, timeframe_requests, timer=timer))
+
+async def afetch_timeframes_concurrently(symbol: str, timeframe_requests: dict, timer: StageTimer = None):
+    """
+    Async version of fetch_timeframes_concurrently for the ASGI app. The blocking Alpaca calls
+    run on the fetch thread pool; yields (name, df) pairs in the order the fetches complete.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_fetch_executor()
+
+    async def fetch(name, timeframe, start_date, end_date):
+        df = await loop.run_in_executor(executor, lambda: get_bars_from_alpaca(symbol, timeframe, start_date, end_date, timer=timer))
+        return name, df
+
+    tasks = [fetch(name, *request) for name, request in timeframe_requests.items()]
+    for next_completed in asyncio.as_completed(tasks):
+        yield await next_completed
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from typing import Optional
+import httpx
+from config import OPENROUTER_API_KEY, current_config
+from utils.http import get_session, get_async_client
+
+class ReportGenerationError(Exception):
+    """Raised when every configured model and retry failed to produce a report."""
+
+def request_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def request_body(model_name: str, prompt: str) -> dict:
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "stream": True
+    }
+
+def parse_stream_line(decoded_chunk: str) -> Optional[str]:
+    """Returns the content delta of one OpenRouter SSE line, or None if it carries no content."""
+    if not decoded_chunk.startswith('data: '):
+        return None
+    try:
+        json_data = json.loads(decoded_chunk[6:])
+    except json.JSONDecodeError:
+        # Handle cases where a chunk might not be complete JSON
+        return None
+    if 'choices' in json_data and len(json_data['choices']) > 0:
+        delta = json_data['choices'][0].get('delta', {})
+        if 'content' in delta and delta['content']:
+            return delta['content']
+    return None
+
+def backoff_delay(attempt: int) -> float:
+    """Wait before retrying a model whose `attempt`-th (0-based) attempt failed: doubles each time, capped."""
+    return min(current_config.OPENROUTER_BACKOFF_BASE * 2 ** attempt, current_config.OPENROUTER_BACKOFF_MAX)
+
+def _socket_read_timeout() -> float:
+    # The deadlines are enforced by the consumer; the socket timeout only bounds how long
+    # the reader of an abandoned attempt can stay blocked
+    return max(current_config.OPENROUTER_FIRST_TOKEN_TIMEOUT, current_config.OPENROUTER_READ_TIMEOUT)
+
+class _AttemptPlan:
+    """
+    Order and timing of the attempts of one report. The configured models are tried in turn, then
+    retried in the same order for up to OPENROUTER_RETRIES rounds; a model is retried only after a
+    backoff that doubles with each of its failures. Up to OPENROUTER_HEDGE attempts run at once (on
+    different models), each one started OPENROUTER_HEDGE_DELAY seconds after the previous one.
+    """
+    def __init__(self):
+        self.pending = [(model, attempt) for attempt in range(current_config.OPENROUTER_RETRIES)
+                        for model in current_config.OPENROUTER_MODELS]
+        self.hedge = max(current_config.OPENROUTER_HEDGE, 1)
+        self.retry_at = {}
+        self.last_start = None
+
+    def failed(self, model: str, attempt: int, now: float) -> None:
+        self.retry_at[model] = now + backoff_delay(attempt)
+
+    def next(self, now: float, running: list[str]) -> tuple[Optional[tuple[str, int]], Optional[float]]:
+        """
+        The (model, attempt) to start now, if any, and otherwise the time to wait before one can
+        start (None if no attempt is left to start while these are running).
+        """
+        if len(running) >= self.hedge:
+            return None, None
+        for i, (model, attempt) in enumerate(self.pending):
+            if model in running:
+                continue
+            start_at = self.retry_at.get(model, now)
+            if running and self.last_start is not None:
+                start_at = max(start_at, self.last_start + current_config.OPENROUTER_HEDGE_DELAY)
+            if start_at > now:
+                return None, start_at - now
+            del self.pending[i]
+            self.last_start = now
+            return (model, attempt), None
+        return None, None
+
+class _Attempt:
+    """One streaming request, read in a daemon thread that puts (attempt, kind, payload) events on a queue."""
+    def __init__(self, model: str, attempt: int, prompt: str, events: queue.Queue):
+        self.model = model
+        self.attempt = attempt
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self._prompt = prompt
+        self._events = events
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self) -> None:
+        try:
+            session = get_session('openrouter')
+            with session.post(url=current_config.OPENROUTER_URL, headers=request_headers(),
+                              json=request_body(self.model, self._prompt), stream=True,
+                              timeout=(current_config.OPENROUTER_CONNECT_TIMEOUT, _socket_read_timeout())) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if self.cancelled.is_set():
+                        return
+                    content = parse_stream_line(line.decode('utf-8')) if line else None
+                    if content:
+                        self._events.put((self, 'token', content))
+            self._events.put((self, 'done', None))
+        except Exception as e:
+            # Any failure (HTTP, decoding, ...) must reach the consumer, or it would wait out its deadline
+            self._events.put((self, 'error', e))
+
+def _first_token_deadline(started: float) -> float:
+    return started + current_config.OPENROUTER_FIRST_TOKEN_TIMEOUT
+
+def stream_completion(prompt: str):
+    """
+    Streams the LLM completion of a prompt. Each attempt must connect within
+    OPENROUTER_CONNECT_TIMEOUT and produce its first token within OPENROUTER_FIRST_TOKEN_TIMEOUT,
+    or the next one is started (see _AttemptPlan); the first attempt to produce a token wins and
+    the others are abandoned. After that, a gap of more than OPENROUTER_READ_TIMEOUT between
+    tokens, or an error, ends the report with ReportGenerationError, since the tokens already sent
+    cannot be taken back.
+    """
+    events = queue.Queue()
+    plan = _AttemptPlan()
+    running = []
+    winner = None
+    try:
+        while winner is None:
+            now = time.monotonic()
+            while True:
+                entry, wait = plan.next(now, [attempt.model for attempt in running])
+                if entry is None:
+                    break
+                print(f"Attempting to call OpenRouter API with model: {entry[0]}, attempt: {entry[1] + 1}")
+                running.append(_Attempt(entry[0], entry[1], prompt, events))
+            if not running and wait is None:
+                raise ReportGenerationError("All models and retries failed.")
+
+            deadlines = [_first_token_deadline(attempt.started) for attempt in running]
+            timeout = min(deadlines + ([now + wait] if wait is not None else [])) - now
+            try:
+                attempt, kind, payload = events.get(timeout=max(timeout, 0))
+            except queue.Empty:
+                now = time.monotonic()
+                for attempt in [a for a in running if _first_token_deadline(a.started) <= now]:
+                    print(f"OpenRouter model {attempt.model} produced no token within "
+                          f"{current_config.OPENROUTER_FIRST_TOKEN_TIMEOUT}s, attempt {attempt.attempt + 1}")
+                    attempt.cancelled.set()
+                    running.remove(attempt)
+                    plan.failed(attempt.model, attempt.attempt, now)
+                continue
+            if attempt not in running:
+                continue
+            if kind == 'token':
+                winner = attempt
+                running.remove(attempt)
+                yield payload
+            else:
+                print(f"Detailed OpenRouter API error for model {attempt.model}, attempt {attempt.attempt + 1}: "
+                      f"{payload or 'empty response'}")
+                running.remove(attempt)
+                plan.failed(attempt.model, attempt.attempt, time.monotonic())
+
+        for attempt in running:
+            attempt.cancelled.set()
+        running = []
+        while True:
+            try:
+                attempt, kind, payload = events.get(timeout=current_config.OPENROUTER_READ_TIMEOUT)
+            except queue.Empty:
+                raise ReportGenerationError(f"Model {winner.model} stalled for {current_config.OPENROUTER_READ_TIMEOUT}s.")
+            if attempt is not winner:
+                continue
+            if kind == 'token':
+                yield payload
+            elif kind == 'done':
+                return
+            else:
+                raise ReportGenerationError(f"Model {winner.model} failed mid-report: {payload}")
+    finally:
+        for attempt in running + ([winner] if winner else []):
+            attempt.cancelled.set()
+
+async def _aread(model: str, prompt: str, events: asyncio.Queue) -> None:
+    """Async counterpart of _Attempt._read; cancelling the task closes the stream."""
+    client = get_async_client('openrouter', max_connections=current_config.OPENROUTER_MAX_CONNECTIONS,
+                              pool_timeout=current_config.OPENROUTER_POOL_TIMEOUT)
+    try:
+        async with client.stream('POST', current_config.OPENROUTER_URL, headers=request_headers(),
+                                 json=request_body(model, prompt),
+                                 timeout=httpx.Timeout(_socket_read_timeout(), connect=current_config.OPENROUTER_CONNECT_TIMEOUT,
+                                                       pool=current_config.OPENROUTER_POOL_TIMEOUT)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                content = parse_stream_line(line)
+                if content:
+                    await events.put((asyncio.current_task(), 'token', content))
+        await events.put((asyncio.current_task(), 'done', None))
+    except Exception as e:
+        # CancelledError is not an Exception, so cancelling the task still ends it quietly
+        await events.put((asyncio.current_task(), 'error', e))
+
+async def astream_completion(prompt: str):
+    """Async version of stream_completion; attempts are tasks on the running loop."""
+    events = asyncio.Queue()
+    plan = _AttemptPlan()
+    running = {}
+    winner = None
+    try:
+        while winner is None:
+            now = time.monotonic()
+            while True:
+                entry, wait = plan.next(now, [model for model, _, _ in running.values()])
+                if entry is None:
+                    break
+                print(f"Attempting to call OpenRouter API with model: {entry[0]}, attempt: {entry[1] + 1}")
+                task = asyncio.ensure_future(_aread(entry[0], prompt, events))
+                running[task] = (entry[0], entry[1], now)
+            if not running and wait is None:
+                raise ReportGenerationError("All models and retries failed.")
+
+            deadlines = [_first_token_deadline(started) for _, _, started in running.values()]
+            timeout = min(deadlines + ([now + wait] if wait is not None else [])) - now
+            try:
+                task, kind, payload = await asyncio.wait_for(events.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                now = time.monotonic()
+                for task, (model, attempt, started) in list(running.items()):
+                    if _first_token_deadline(started) <= now:
+                        print(f"OpenRouter model {model} produced no token within "
+                              f"{current_config.OPENROUTER_FIRST_TOKEN_TIMEOUT}s, attempt {attempt + 1}")
+                        task.cancel()
+                        del running[task]
+                        plan.failed(model, attempt, now)
+                continue
+            if task not in running:
+                continue
+            model, attempt, _ = running.pop(task)
+            if kind == 'token':
+                winner = (task, model)
+                yield payload
+            else:
+                print(f"Detailed OpenRouter API error for model {model}, attempt {attempt + 1}: {payload or 'empty response'}")
+                plan.failed(model, attempt, time.monotonic())
+
+        for task in running:
+            task.cancel()
+        running = {}
+        task, model = winner
+        while True:
+            try:
+                source, kind, payload = await asyncio.wait_for(events.get(), current_config.OPENROUTER_READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise ReportGenerationError(f"Model {model} stalled for {current_config.OPENROUTER_READ_TIMEOUT}s.")
+            if source is not task:
+                continue
+            if kind == 'token':
+                yield payload
+            elif kind == 'done':
+                return
+            else:
+                raise ReportGenerationError(f"Model {model} failed mid-report: {payload}")
+    finally:
+        for task in list(running) + ([winner[0]] if winner else []):
+            task.cancel()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from config import current_config
+from analysis import technical_analysis
+from services import backtest_service, data_service
+from utils.metrics import StageTimer, timer_or_new
+from utils.process_pool import get_process_pool
+
+def symbol_signals(symbol: str, df_backtest, df_daily) -> tuple[str, list]:
+    """
+    Key levels from the daily bars, then the signals of the raw 5-minute bars with their indicators,
+    for one symbol (runs in a pool worker).
+    """
+    key_levels = data_service.get_current_key_levels(symbol, df_daily)
+    _, df_backtest = technical_analysis.calculate_technical_indicators(df_backtest.copy())
+    return symbol, technical_analysis.generate_price_action_signals(df_backtest, key_levels, trend_filter_ema=20)
+
+def get_portfolio_backtest_results(symbols: list[str], atr_multiplier: float = 2.0, reward_risk_ratio: float = 2.0,
+                                   max_positions: int = None, position_size: float = None, risk_per_trade: float = None,
+                                   max_workers: int = None, timer: StageTimer = None) -> dict:
+    """
+    Backtests a list of symbols as one book. Bars are fetched with one bulk request per timeframe,
+    the signals of every symbol are generated in parallel in the shared portfolio process pool, then all symbols are
+    simulated together against one broker (backtest_service.run_portfolio_backtest).
+    """
+    timer = timer_or_new(timer)
+    end_date = datetime.now()
+    backtest_bars = data_service.get_bars_for_symbols(symbols, TimeFrame(5, TimeFrameUnit.Minute), end_date - timedelta(days=30), end_date, timer=timer)
+    daily_bars = data_service.get_bars_for_symbols(symbols, TimeFrame.Day, end_date - timedelta(days=365), end_date, timer=timer)
+
+    frames = {symbol: df for symbol, df in backtest_bars.items() if df is not None and not df.empty}
+    missing = [symbol for symbol in symbols if symbol not in frames]
+    if not frames:
+        raise ValueError("No data for any of the symbols.")
+
+    signals = {}
+    with timer.stage('signals'):
+        executor = get_process_pool('portfolio', max_workers or current_config.PORTFOLIO_MAX_WORKERS)
+        futures = [executor.submit(symbol_signals, symbol, df, daily_bars.get(symbol)) for symbol, df in frames.items()]
+        for future in futures:
+            symbol, symbol_signal_list = future.result()
+            signals[symbol] = symbol_signal_list
+
+    with timer.stage('backtest:portfolio'):
+        results = backtest_service.run_portfolio_backtest(
+            frames, signals, atr_multiplier, reward_risk_ratio,
+            max_positions=max_positions or current_config.PORTFOLIO_MAX_POSITIONS,
+            position_size=position_size, risk_per_trade=risk_per_trade)
+    results['summary']['signals'] = {symbol: len(symbol_signal_list) for symbol, symbol_signal_list in signals.items()}
+    results['missing_symbols'] = missing
+    return results
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from config import current_config
+
+class ReportEntry:
+    """
+    One AI report, produced once and streamed to any number of subscribers.
+    Subscribers replay the chunks produced so far and then tail the stream until it is done.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.failed = False
+        self.finished_at = None
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    def _notify(self):
+        # Called with self._cond held
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._async_waiters.clear()
+
+    def append(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, failed: bool = False) -> None:
+        with self._cond:
+            self.done = True
+            self.failed = failed
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def tail(self, window: float = 0.0):
+        """
+        Yields the report, blocking until new chunks arrive. With a `window` (seconds), the first
+        chunk is sent as soon as it arrives and the chunks arriving after it are joined into at most
+        one piece per window, instead of one piece per token.
+        """
+        position = 0
+        sent_at = None
+        while True:
+            with self._cond:
+                while position == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                if window > 0 and sent_at is not None:
+                    deadline = sent_at + window
+                    while not self.done and (remaining := deadline - time.monotonic()) > 0:
+                        self._cond.wait(remaining)
+                chunks = self.chunks[position:]
+                done = self.done
+            position += len(chunks)
+            if window > 0 and chunks:
+                sent_at = time.monotonic()
+                yield ''.join(chunks)
+            else:
+                yield from chunks
+            if done and position == len(self.chunks):
+                return
+
+    async def atail(self, window: float = 0.0):
+        """Async version of tail for the ASGI app."""
+        position = 0
+        sent_at = None
+        while True:
+            if window > 0 and sent_at is not None:
+                remaining = sent_at + window - time.monotonic()
+                if remaining > 0 and not self.done:
+                    await asyncio.sleep(remaining)
+            event = None
+            with self._cond:
+                chunks = self.chunks[position:]
+                done = self.done
+                if not chunks and not done:
+                    event = asyncio.Event()
+                    self._async_waiters.append((asyncio.get_running_loop(), event))
+            if chunks:
+                position += len(chunks)
+                if window > 0:
+                    sent_at = time.monotonic()
+                    yield ''.join(chunks)
+                else:
+                    for chunk in chunks:
+                        yield chunk
+            elif done:
+                return
+            else:
+                await event.wait()
+
+class ReportCache:
+    """
+    LRU cache of AI reports with a TTL on finished reports.
+    A request for a report that is still being generated joins the in-flight entry
+    instead of starting another LLM call; in-flight entries are never evicted.
+    """
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, entry: ReportEntry) -> bool:
+        if not entry.done:
+            return True
+        return not entry.failed and time.monotonic() - entry.finished_at < self.ttl_seconds
+
+    def get_or_create(self, key: str) -> tuple[ReportEntry, bool]:
+        """
+        Returns (entry, created). When created is True the caller must start producing the report.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self._entries.move_to_end(key)
+                return entry, False
+
+            entry = ReportEntry()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+            return entry, True
+
+    def _evict(self) -> None:
+        """
+        Drops the least recently used finished reports beyond max_entries. Reports still being
+        generated are kept, so that identical requests keep joining them; the cache may then hold
+        more than max_entries until they finish. Called with self._lock held.
+        """
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        for key in [key for key, entry in self._entries.items() if entry.done][:excess]:
+            del self._entries[key]
+
+def make_key(symbol: str, prompt: str) -> str:
+    return f"{symbol}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+# Per worker process
+report_cache = ReportCache(current_config.REPORT_CACHE_TTL, current_config.REPORT_CACHE_MAX_ENTRIES)
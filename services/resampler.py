@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+MARKET_TIMEZONE = 'America/New_York'
+# Regular session in minutes after midnight, New York time
+SESSION_OPEN_MINUTES = 9 * 60 + 30
+SESSION_CLOSE_MINUTES = 16 * 60
+SESSIONS = ('regular', 'extended')
+
+# Higher timeframes derived from a fine-grained pull: bar length in minutes, or None for daily bars
+RESAMPLE_RULES = {
+    '5min': 5,
+    '15min': 15,
+    '30min': 30,
+    '1h': 60,
+    '4h': 240,
+    'daily': None,
+}
+
+def _aggregate(df: pd.DataFrame, keys: np.ndarray, stamps: np.ndarray) -> pd.DataFrame:
+    """OHLCV of each run of equal, sorted `keys`, indexed by the stamp of the run's first bar."""
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.concatenate([starts[1:], [len(keys)]]) - 1
+    open_ = df['Open'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    close = df['Close'].to_numpy(dtype=float)
+    volume = df['Volume'].to_numpy(dtype=float)
+    return pd.DataFrame({
+        'Open': open_[starts],
+        'High': np.maximum.reduceat(high, starts),
+        'Low': np.minimum.reduceat(low, starts),
+        'Close': close[ends],
+        'Volume': np.add.reduceat(volume, starts),
+    }, index=pd.DatetimeIndex(stamps[starts], name=df.index.name or 'timestamp'))
+
+def resample_session_bars(df: pd.DataFrame, rule: str, session: str = 'regular') -> pd.DataFrame:
+    """
+    Builds `rule` bars (a key of RESAMPLE_RULES) from 1- or 5-minute bars indexed by naive UTC bar
+    start times. Bars never span a market closure: intraday bars are anchored at the 9:30 New York
+    open of each trading day, so the last bar of a session (or of an early-close day) is short
+    instead of running into the next day. Daily bars are stamped at midnight New York time, like
+    the Alpaca daily bars. With session='regular' only bars starting between 9:30 and 16:00 are
+    used; 'extended' keeps the pre- and post-market bars, which then start and end the trading day.
+    """
+    if rule not in RESAMPLE_RULES:
+        raise ValueError(f"Unknown resample rule '{rule}'. Expected one of {list(RESAMPLE_RULES)}.")
+    if session not in SESSIONS:
+        raise ValueError(f"Unknown session '{session}'. Expected one of {SESSIONS}.")
+    if df is None or df.empty:
+        return df
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+
+    local = pd.DatetimeIndex(df.index).tz_localize('UTC').tz_convert(MARKET_TIMEZONE)
+    days = local.normalize()
+    minutes = (local - days).total_seconds().to_numpy() // 60 - SESSION_OPEN_MINUTES
+    if session == 'regular':
+        in_session = (minutes >= 0) & (minutes < SESSION_CLOSE_MINUTES - SESSION_OPEN_MINUTES)
+        df, days, minutes = df[in_session], days[in_session], minutes[in_session]
+        if df.empty:
+            return df[OHLCV_COLUMNS]
+
+    day_stamps = days.tz_convert('UTC').tz_localize(None).asi8
+    length = RESAMPLE_RULES[rule]
+    if length is None:
+        return _aggregate(df, day_stamps, day_stamps)
+
+    # Pre-market bars get negative bin numbers, so they stay apart from the session's first bar
+    bins = np.floor(minutes / length).astype(np.int64)
+    bin_starts = days + pd.to_timedelta(SESSION_OPEN_MINUTES + bins * length, unit='min')
+    stamps = bin_starts.tz_convert('UTC').tz_localize(None).asi8
+    return _aggregate(df, stamps, stamps)
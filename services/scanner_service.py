@@ -0,0 +1,191 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import as_completed
+from datetime import datetime
+from typing import Optional
+import pandas as pd
+from config import current_config
+from services import data_service, watchlist_service
+from services.resampler import MARKET_TIMEZONE, SESSION_CLOSE_MINUTES, SESSION_OPEN_MINUTES
+from utils.formatters import json_default
+from utils.metrics import StageTimer
+from utils.process_pool import get_process_pool, shutdown_process_pool
+
+LOCK_FILE = 'scanner.lock'
+
+_scanner = None
+_scanner_pid = None
+_scanner_lock = threading.Lock()
+
+def _result_path(symbol: str) -> str:
+    return os.path.join(current_config.SCANNER_DIR, f"{symbol.upper().replace('/', '_')}.json")
+
+def save_result(result: dict) -> None:
+    """Stores a symbol's latest scan result, atomically, where every worker process can read it."""
+    try:
+        os.makedirs(current_config.SCANNER_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=current_config.SCANNER_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, default=json_default)
+        os.replace(tmp_path, _result_path(result['symbol']))
+    except Exception as e:
+        print(f"Error storing scan result for {result.get('symbol')}: {e}")
+
+def load_result(symbol: str, max_age: float = None) -> Optional[dict]:
+    """
+    The latest scan result of a symbol, from the scanner or the bar stream (see bar_stream), or None
+    if both are disabled, the symbol has not been analyzed, or its result is older than `max_age`
+    seconds (SCANNER_MAX_AGE by default).
+    """
+    if not current_config.SCANNER_ENABLED and not current_config.STREAM_ENABLED:
+        return None
+    max_age = current_config.SCANNER_MAX_AGE if max_age is None else max_age
+    try:
+        with open(_result_path(symbol)) as f:
+            result = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading scan result for {symbol}: {e}")
+        return None
+    if 'error' in result or time.time() - result.get('scanned_at', 0) > max_age:
+        return None
+    return result
+
+def load_results(symbols: list[str] = None) -> list[dict]:
+    """The stored results of the given symbols (by default the configured watchlist), fresh or not."""
+    results = []
+    for symbol in symbols or current_config.SCANNER_SYMBOLS:
+        try:
+            with open(_result_path(symbol)) as f:
+                results.append(json.load(f))
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"Error reading scan result for {symbol}: {e}")
+    return results
+
+def acquire_lock_file(name: str):
+    """
+    Takes the exclusive lock file `name` in SCANNER_DIR without waiting. Returns the open file, which
+    holds the lock until it is closed or the process exits, or None if another process holds it.
+    """
+    os.makedirs(current_config.SCANNER_DIR, exist_ok=True)
+    lock_file = open(os.path.join(current_config.SCANNER_DIR, name), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def scan_symbol(symbol: str, end_date: datetime) -> dict:
+    """
+    Fetches the analysis timeframes of a symbol (through the bar cache, which this also keeps warm),
+    then runs the price action analysis and the signal scan. Runs in a pool worker.
+    """
+    dfs = data_service.get_resampled_timeframes(symbol, data_service.analysis_start_dates(end_date), end_date)
+    if dfs.get('5min') is None:
+        return {'symbol': symbol, 'error': 'No data returned.', 'scanned_at': time.time()}
+    result = watchlist_service.analyze_symbol(symbol, dfs)
+    result['bar_time'] = dfs['5min'].index[-1].isoformat()
+    result['scanned_at'] = time.time()
+    return result
+
+def _in_session(timestamp: float, interval: float) -> bool:
+    """True on weekdays from the open to one interval after the close, New York time."""
+    local = pd.Timestamp(timestamp, unit='s', tz='UTC').tz_convert(MARKET_TIMEZONE)
+    minutes = local.hour * 60 + local.minute
+    return local.weekday() < 5 and SESSION_OPEN_MINUTES <= minutes <= SESSION_CLOSE_MINUTES + interval / 60
+
+class MarketScanner:
+    """
+    Keeps a watchlist warm in the background. Shortly after every bar close it refreshes the
+    bars of each symbol and recomputes its analysis and signals in the scanner process pool, and stores
+    the results (see load_result) so that requests start from them instead of from a fetch.
+    Every worker process runs a scanner thread, but only the one holding the lock file scans;
+    if that process exits, another one takes the lock at its next bar close.
+    """
+    def __init__(self, symbols: list[str], interval_minutes: int = None, delay: float = None, max_workers: int = None):
+        self.symbols = symbols
+        self.interval = 60 * (interval_minutes or current_config.SCANNER_INTERVAL_MINUTES)
+        self.delay = current_config.SCANNER_DELAY_SECONDS if delay is None else delay
+        self.max_workers = max_workers or current_config.SCANNER_MAX_WORKERS
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def _acquire_lock(self) -> bool:
+        if self._lock_file is None:
+            self._lock_file = acquire_lock_file(LOCK_FILE)
+        return self._lock_file is not None
+
+    def next_run(self, now: float) -> float:
+        """The next bar close after `now`, plus the delay for the bar to be published."""
+        return (now // self.interval + 1) * self.interval + self.delay
+
+    def scan(self) -> list[dict]:
+        """Scans every symbol once and stores the results."""
+        timer = StageTimer()
+        end_date = datetime.now()
+        executor = get_process_pool('scanner', self.max_workers)
+        results = []
+        with timer.stage('scanner_cycle'):
+            futures = {executor.submit(scan_symbol, symbol, end_date): symbol for symbol in self.symbols}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'symbol': futures[future], 'error': str(e), 'scanned_at': time.time()}
+                save_result(result)
+                results.append(result)
+        return results
+
+    def run(self) -> None:
+        # The first scan runs right away, so the cache is warm before the next bar closes
+        run_at = time.time()
+        while not self._stop.wait(max(run_at - time.time(), 0)):
+            first = self._lock_file is None
+            if self._acquire_lock() and (first or not current_config.SCANNER_MARKET_HOURS_ONLY
+                                         or _in_session(run_at - self.delay, self.interval)):
+                try:
+                    self.scan()
+                except Exception as e:
+                    print(f"Error in market scan: {e}")
+            run_at = self.next_run(time.time())
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name='market-scanner', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        shutdown_process_pool('scanner')
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+def start_background_scanner() -> Optional[MarketScanner]:
+    """Starts this worker's scanner thread if SCANNER_ENABLED and it is not running yet."""
+    global _scanner, _scanner_pid
+    if not current_config.SCANNER_ENABLED or not current_config.SCANNER_SYMBOLS:
+        return None
+    with _scanner_lock:
+        if _scanner is None or _scanner_pid != os.getpid():
+            _scanner = MarketScanner(current_config.SCANNER_SYMBOLS)
+            _scanner_pid = os.getpid()
+            _scanner.start()
+    return _scanner
+
+def stop_background_scanner() -> None:
+    global _scanner
+    with _scanner_lock:
+        if _scanner is not None and _scanner_pid == os.getpid():
+            _scanner.stop()
+        _scanner = None
@@ -0,0 +1,187 @@
+import itertools
+import math
+import numpy as np
+import pandas as pd
+from concurrent.futures import as_completed, wait
+from multiprocessing import shared_memory
+from config import current_config
+from analysis import indicator_kernels, technical_analysis
+from services import backtest_service
+from utils.process_pool import cancel_pending, get_process_pool
+
+SWEEP_DEFAULTS = {
+    'atr_multiplier': 2.0,
+    'reward_risk_ratio': 2.0,
+    'trend_filter_ema': 20,
+    'tolerance_percent': 0.005,
+}
+SWEEP_METRICS = ('total_pnl', 'win_rate', 'average_pnl', 'sharpe_ratio', 'max_drawdown')
+_SHARED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Body', 'Upper_Shadow', 'Lower_Shadow']
+
+# The shared frame a pool worker last attached (see attach_shared_frame)
+_worker_frame = None
+_worker_shm = None
+
+def _range_bounds(name: str, spec: dict) -> tuple[float, float, float]:
+    try:
+        start, stop, step = float(spec['start']), float(spec['stop']), float(spec['step'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Range for '{name}' needs numeric 'start', 'stop' and 'step'.")
+    if not all(math.isfinite(value) for value in (start, stop, step)):
+        raise ValueError(f"Range for '{name}' must be finite.")
+    if step <= 0:
+        raise ValueError(f"Step for '{name}' must be positive.")
+    return start, stop, step
+
+def _range_size(name: str, spec) -> int:
+    """The number of values in a parameter range (see _expand_range), without expanding it."""
+    if isinstance(spec, dict):
+        start, stop, step = _range_bounds(name, spec)
+        steps = (stop - start) / step
+        if not math.isfinite(steps):
+            raise ValueError(f"Range for '{name}' has too many values.")
+        return max(int(math.floor(steps + 1e-9)) + 1, 0)
+    if isinstance(spec, (list, tuple)):
+        return len(spec)
+    return 1
+
+def _expand_range(name: str, spec) -> list:
+    """
+    A parameter range is either a list of values, a single value,
+    or a dict {"start", "stop", "step"} with an inclusive stop.
+    """
+    if isinstance(spec, dict):
+        start, _, step = _range_bounds(name, spec)
+        values = [round(start + i * step, 10) for i in range(_range_size(name, spec))]
+    elif isinstance(spec, (list, tuple)):
+        values = list(spec)
+    else:
+        values = [spec]
+    if not values:
+        raise ValueError(f"Range for '{name}' is empty.")
+    try:
+        values = [int(v) if name == 'trend_filter_ema' else float(v) for v in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"Range for '{name}' has non-numeric values.")
+    return values
+
+def expand_param_grid(param_ranges: dict, max_combinations: int = None) -> list[dict]:
+    """
+    Expands parameter ranges into the list of parameter combinations to backtest. With
+    `max_combinations`, a larger grid is rejected before any range is expanded.
+    """
+    unknown = set(param_ranges) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    names = list(SWEEP_DEFAULTS)
+    specs = [param_ranges.get(name, SWEEP_DEFAULTS[name]) for name in names]
+    if max_combinations is not None:
+        combinations = math.prod(_range_size(name, spec) for name, spec in zip(names, specs))
+        if combinations > max_combinations:
+            raise ValueError(f"Sweep has {combinations} combinations, the limit is {max_combinations}.")
+    value_lists = [_expand_range(name, spec) for name, spec in zip(names, specs)]
+    return [dict(zip(names, values)) for values in itertools.product(*value_lists)]
+
+def share_frame(df: pd.DataFrame, ema_periods: set) -> tuple[shared_memory.SharedMemory, dict]:
+    """
+    Copies the columns the signal scan and backtests need into one shared memory block: the int64 index followed
+    by one contiguous float64 row per column. Workers map it instead of unpickling the frame per task.
+    """
+    columns = {col: df[col] for col in _SHARED_COLUMNS if col in df.columns}
+    if 'Body' not in columns:
+        columns['Body'] = (df['Close'] - df['Open']).abs()
+        columns['Upper_Shadow'] = df['High'] - df[['Open', 'Close']].max(axis=1)
+        columns['Lower_Shadow'] = df[['Open', 'Close']].min(axis=1) - df['Low']
+    for period in sorted(ema_periods):
+        ema_col = f'EMA_{period}'
+        columns[ema_col] = df[ema_col] if ema_col in df.columns else pd.Series(
+            indicator_kernels.ema(df['Close'].to_numpy(dtype=np.float64), period), index=df.index)
+
+    n_rows = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(8 * n_rows * (len(columns) + 1), 1))
+    index_values = np.ndarray((n_rows,), dtype=np.int64, buffer=shm.buf)
+    index_values[:] = pd.DatetimeIndex(df.index).asi8
+    block = np.ndarray((len(columns), n_rows), dtype=np.float64, buffer=shm.buf, offset=8 * n_rows)
+    for i, values in enumerate(columns.values()):
+        block[i] = values.to_numpy(dtype=np.float64)
+    spec = {'name': shm.name, 'n_rows': n_rows, 'columns': list(columns)}
+    return shm, spec
+
+def attach_shared_frame(spec: dict) -> pd.DataFrame:
+    """
+    The shared block of `spec` as a DataFrame, without copying it (runs in a pool worker). The pools
+    outlive a sweep, so each task carries the spec; a worker maps a block on its first task of that
+    sweep, reuses it for the following ones, and releases it when a task of another sweep arrives.
+    """
+    global _worker_frame, _worker_shm
+    if _worker_shm is not None and _worker_shm.name == spec['name']:
+        return _worker_frame
+    if _worker_shm is not None:
+        _worker_frame = None
+        _worker_shm.close()
+        _worker_shm = None
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    n_rows, columns = spec['n_rows'], spec['columns']
+    index_values = np.ndarray((n_rows,), dtype=np.int64, buffer=shm.buf)
+    block = np.ndarray((len(columns), n_rows), dtype=np.float64, buffer=shm.buf, offset=8 * n_rows)
+    _worker_frame = pd.DataFrame(block.T, index=pd.DatetimeIndex(index_values), columns=columns, copy=False)
+    _worker_shm = shm
+    return _worker_frame
+
+def _run_combination(spec: dict, params: dict, key_levels: dict, engine: str) -> dict:
+    df = attach_shared_frame(spec)
+    signals = technical_analysis.generate_price_action_signals(
+        df, key_levels,
+        tolerance_percent=params['tolerance_percent'],
+        trend_filter_ema=params['trend_filter_ema'])
+    results = backtest_service.get_backtest_results(
+        df, signals,
+        atr_multiplier=params['atr_multiplier'],
+        reward_risk_ratio=params['reward_risk_ratio'],
+        engine=engine)
+    return {'params': params, 'signals': len(signals), 'summary': results['summary']}
+
+def _sort_key(result: dict, metric: str) -> float:
+    value = result['summary'].get(metric)
+    if value is None:
+        return -math.inf
+    # Lower drawdown ranks higher
+    return -value if metric == 'max_drawdown' else value
+
+def sweep_backtest_results(df: pd.DataFrame, key_levels: dict, param_ranges: dict, metric: str = 'total_pnl',
+                           engine: str = 'vectorized', top: int = 10, max_workers: int = None):
+    """
+    Backtests every combination of the parameter ranges across the shared sweep process pool.
+    The enriched frame is placed in shared memory once and reused by every task.
+    Yields a 'result' event per finished combination (with its rank so far) and a final
+    'ranking' event with the `top` best combinations by `metric`.
+    """
+    if metric not in SWEEP_METRICS:
+        raise ValueError(f"Unknown sweep metric '{metric}'. Expected one of {SWEEP_METRICS}.")
+    grid = expand_param_grid(param_ranges, max_combinations=current_config.SWEEP_MAX_COMBINATIONS)
+
+    shm, spec = share_frame(df, {params['trend_filter_ema'] for params in grid})
+    executor = get_process_pool('sweep', max_workers or current_config.SWEEP_MAX_WORKERS)
+    futures = []
+    try:
+        futures = [executor.submit(_run_combination, spec, params, key_levels, engine) for params in grid]
+        ranked = []
+        for completed, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            ranked.append(result)
+            ranked.sort(key=lambda r: _sort_key(r, metric), reverse=True)
+            yield {
+                'type': 'result',
+                'completed': completed,
+                'total': len(grid),
+                'rank': ranked.index(result) + 1,
+                **result
+            }
+        yield {'type': 'ranking', 'metric': metric, 'results': ranked[:top]}
+    finally:
+        # Also reached when the consumer stops early: drop the combinations not yet started,
+        # and let the running ones finish before their frame is unlinked
+        cancel_pending(futures)
+        wait(futures)
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+ATR_PERIOD = 14
+RISK_FREE_RATE = 0.01
+
+def _average_true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """
+    ATR as computed by backtrader's AverageTrueRange: a Wilder smoothed true range,
+    seeded with the simple average of the first `period` true ranges.
+    """
+    atr = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return atr
+    prev_close = close[:-1]
+    true_range = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    seeded = np.concatenate([[true_range[:period].mean()], true_range[period:]])
+    atr[period:] = pd.Series(seeded).ewm(alpha=1.0 / period, adjust=False).mean().to_numpy()
+    return atr
+
+def match_signal_bars(index: pd.DatetimeIndex, signals: list) -> tuple[np.ndarray, list]:
+    """
+    Locates each signal at its exact bar in `index`. Returns the sorted bar positions that have a
+    signal and their (direction, strategy_name), aligned. A bar can hold one signal, the first one
+    given for it; signals whose timestamp is not a bar are dropped.
+    """
+    if not signals:
+        return np.empty(0, dtype=np.intp), []
+    positions = pd.DatetimeIndex(index).get_indexer(pd.DatetimeIndex([s[0] for s in signals]))
+    # np.unique keeps the first occurrence of each bar
+    positions, first = np.unique(positions, return_index=True)
+    if positions.size and positions[0] < 0:
+        positions, first = positions[1:], first[1:]
+    return positions, [(signals[i][1], signals[i][2]) for i in first]
+
+def _signal_codes(index: pd.DatetimeIndex, signals: list) -> tuple[np.ndarray, list]:
+    """
+    Maps each bar to the position of its signal in `signal_types`, or -1 for no signal.
+    Signals are matched to their exact bar like SignalStrategy.
+    """
+    positions, signal_types = match_signal_bars(index, signals)
+    signal_codes = np.full(len(index), -1, dtype=np.intp)
+    signal_codes[positions] = np.arange(len(positions))
+    return signal_codes, signal_types
+
+def _first_true(condition, start: int, n: int) -> int:
+    """
+    Returns the first bar >= start where condition(slice) is True, or -1.
+    The window grows geometrically so that short trades only evaluate a few bars.
+    """
+    window = 64
+    while start < n:
+        stop = min(start + window, n)
+        hits = np.flatnonzero(condition(slice(start, stop)))
+        if hits.size:
+            return start + int(hits[0])
+        start = stop
+        window *= 4
+    return -1
+
+def _sharpe_ratio(values: np.ndarray, index: pd.DatetimeIndex, cash: float):
+    """Annual-returns Sharpe ratio, matching backtrader's SharpeRatio defaults."""
+    year_end_values = pd.Series(values, index=index).groupby(index.year).last().to_numpy()
+    returns = year_end_values / np.concatenate([[cash], year_end_values[:-1]]) - 1.0
+    excess = returns - RISK_FREE_RATE
+    deviation = excess.std()
+    if len(excess) == 0 or deviation == 0:
+        return None
+    return float(excess.mean() / deviation)
+
+def run_vectorized_backtest(df: pd.DataFrame, signals: list, atr_multiplier: float, reward_risk_ratio: float,
+                            cash: float, commission: float) -> dict:
+    """
+    Array-based equivalent of the backtrader SignalStrategy run.
+    A signal bar places a bracket: a limit entry at the signal bar's close, with an ATR-based
+    stop-loss and a take-profit at reward_risk_ratio times the stop distance. Entries, stops and
+    targets are located with array searches over the bars, so the Python work scales with the
+    number of trades rather than the number of bars.
+    Returns the same {'summary', 'trades'} dict as run_backtest.
+    """
+    index = pd.DatetimeIndex(df.index)
+    open_ = df['Open'].to_numpy(dtype=float)
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    close = df['Close'].to_numpy(dtype=float)
+    n = len(close)
+
+    atr = _average_true_range(high, low, close)
+    signal_codes, signal_types = _signal_codes(index, signals)
+    # SignalStrategy.next only runs once the ATR has a value
+    signal_codes[:min(ATR_PERIOD, n)] = -1
+    signal_bars = np.flatnonzero(signal_codes >= 0)
+
+    cash_delta = np.zeros(n)
+    size_delta = np.zeros(n)
+    closed_trades = []
+    open_trades = 0
+    won_trades = 0
+    pnl_net_total = 0.0
+
+    bar = 0
+    while True:
+        # The strategy is flat and has no pending order: wait for the next signal bar
+        candidates = signal_bars[np.searchsorted(signal_bars, bar):]
+        if candidates.size == 0:
+            break
+        signal_bar = int(candidates[0])
+        signal_type, strategy_name = signal_types[signal_codes[signal_bar]]
+        size = 1 if signal_type == 'long' else -1
+
+        limit_price = close[signal_bar]
+        stop_loss_distance = atr[signal_bar] * atr_multiplier
+        take_profit_distance = stop_loss_distance * reward_risk_ratio
+        sl_price = limit_price - size * stop_loss_distance
+        tp_price = limit_price + size * take_profit_distance
+
+        # Entry: the parent limit order stays pending until price trades through it
+        if size > 0:
+            entry_bar = _first_true(lambda s: low[s] <= limit_price, signal_bar + 1, n)
+        else:
+            entry_bar = _first_true(lambda s: high[s] >= limit_price, signal_bar + 1, n)
+        if entry_bar < 0:
+            break
+        entry_price = min(open_[entry_bar], limit_price) if size > 0 else max(open_[entry_bar], limit_price)
+        entry_commission = abs(size) * entry_price * commission
+        cash_delta[entry_bar] -= size * entry_price + entry_commission
+        size_delta[entry_bar] += size
+
+        # Exit: stop and target become active on the bar after the entry fill.
+        # Both are checked against each bar, and the stop wins when both are hit.
+        if size > 0:
+            exit_bar = _first_true(lambda s: (low[s] <= sl_price) | (high[s] >= tp_price), entry_bar + 1, n)
+        else:
+            exit_bar = _first_true(lambda s: (high[s] >= sl_price) | (low[s] <= tp_price), entry_bar + 1, n)
+        if exit_bar < 0:
+            open_trades += 1
+            break
+
+        if size > 0:
+            if low[exit_bar] <= sl_price:
+                exit_price = min(open_[exit_bar], sl_price)
+            else:
+                exit_price = max(open_[exit_bar], tp_price)
+        else:
+            if high[exit_bar] >= sl_price:
+                exit_price = max(open_[exit_bar], sl_price)
+            else:
+                exit_price = min(open_[exit_bar], tp_price)
+        exit_commission = abs(size) * exit_price * commission
+        cash_delta[exit_bar] += size * exit_price - exit_commission
+        size_delta[exit_bar] -= size
+
+        pnl = size * (exit_price - entry_price)
+        pnl_net = pnl - entry_commission - exit_commission
+        pnl_net_total += pnl_net
+        won_trades += int(pnl_net >= 0.0)
+        closed_trades.append({
+            'ref': len(closed_trades) + 1,
+            'direction': signal_type,
+            'strategy': strategy_name,
+            'entry_date': index[entry_bar].isoformat(),
+            'entry_price': round(float(entry_price), 2),
+            'exit_date': index[exit_bar].isoformat(),
+            'exit_price': round(float(exit_price), 2),
+            'pnl': round(float(pnl), 2),
+            'pnl_net': round(float(pnl_net), 2),
+        })
+        # A new signal may fire on the bar the position was closed
+        bar = exit_bar
+
+    # Broker value at each bar close, for drawdown and Sharpe ratio
+    values = cash + np.cumsum(cash_delta) + np.cumsum(size_delta) * close
+    peaks = np.maximum.accumulate(values)
+    max_drawdown = float(np.max(100.0 * (peaks - values) / peaks)) if n else 0.0
+
+    total_trades = len(closed_trades) + open_trades
+    win_rate = (won_trades / total_trades) if total_trades > 0 else 0
+    average_pnl = (pnl_net_total / total_trades) if total_trades > 0 else 0
+
+    return {
+        'summary': {
+            'win_rate': win_rate,
+            'total_trades': total_trades,
+            'average_pnl': average_pnl,
+            'total_pnl': pnl_net_total,
+            'sharpe_ratio': _sharpe_ratio(values, index, cash) if n else None,
+            'max_drawdown': max_drawdown,
+        },
+        'trades': closed_trades
+    }
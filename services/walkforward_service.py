@@ -0,0 +1,127 @@
+import math
+from concurrent.futures import wait
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from config import current_config
+from analysis import technical_analysis
+from analysis.key_levels import LEVELS_LOOKBACK, KeyLevelIndex
+from services import backtest_service, data_service, sweep_service
+from services.resampler import MARKET_TIMEZONE
+from utils.metrics import StageTimer, timer_or_new
+from utils.process_pool import cancel_pending, get_process_pool
+
+# Steps per pool task; small steps are batched so each task is worth the round trip
+MIN_STEPS_PER_TASK = 4
+
+def trading_days(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """New York trading day of each UTC timestamp, stamped at midnight New York time like the daily bars."""
+    local = pd.DatetimeIndex(index).tz_localize('UTC').tz_convert(MARKET_TIMEZONE)
+    return local.normalize().tz_convert('UTC').tz_localize(None)
+
+def _step_signals(spec: dict, windows: list, tolerance_percent: float, trend_filter_ema: int) -> list[list]:
+    """
+    Signals of a batch of steps, on the shared frame of `spec` (runs in a pool worker). Each window is
+    (start, end, key_levels) in bar positions; the bar before the window is included so the
+    first bar of the window can be compared with it, but only signals inside the window are kept.
+    """
+    df = sweep_service.attach_shared_frame(spec)
+    results = []
+    for start, end, key_levels in windows:
+        window = df.iloc[max(start - 1, 0):end]
+        signals = technical_analysis.generate_price_action_signals(
+            window, key_levels, tolerance_percent=tolerance_percent, trend_filter_ema=trend_filter_ema)
+        first = df.index[start]
+        results.append([signal for signal in signals if signal[0] >= first])
+    return results
+
+def walk_forward_results(df: pd.DataFrame, df_daily: pd.DataFrame, evaluation_start: datetime, step_days: int = 5,
+                         atr_multiplier: float = 2.0, reward_risk_ratio: float = 2.0, trend_filter_ema: int = 20,
+                         tolerance_percent: float = 0.005, engine: str = 'vectorized', max_workers: int = None,
+                         timer: StageTimer = None) -> dict:
+    """
+    Walk-forward backtest of an enriched 5-minute frame. The trading days from `evaluation_start` are
+    split into steps of `step_days`; each step trades the signals found in its bars against the key
+    levels known at its start. The indicators are computed once over the whole frame (they only look
+    back), the frame is placed in shared memory once, and the steps are scanned in the shared
+    walk-forward process pool.
+    All signals are then backtested in one run, so positions carry over from one step to the next.
+    Returns {'summary', 'trades', 'steps'}, with the signal count, trade count and net P&L of each step.
+    """
+    timer = timer_or_new(timer)
+    if step_days < 1:
+        raise ValueError("step_days must be at least 1.")
+    days = trading_days(df.index)
+    unique_days = days.unique()
+    unique_days = unique_days[unique_days >= trading_days(pd.DatetimeIndex([evaluation_start]))[0]]
+    if unique_days.empty:
+        raise ValueError("No bars in the evaluation period.")
+
+    step_days_index = unique_days[::step_days]
+    with timer.stage('key_levels'):
+        # Levels as known at the open of each step's first day, from the daily bars before it
+        level_index = KeyLevelIndex.build(df_daily, dates=step_days_index)
+        step_levels = [level_index.key_levels(day) for day in step_days_index]
+    bounds = np.searchsorted(days.asi8, step_days_index.asi8, side='left').tolist() + [len(df)]
+    windows = [(start, end, levels) for start, end, levels in zip(bounds[:-1], bounds[1:], step_levels)]
+
+    with timer.stage('signals'):
+        max_workers = max_workers or current_config.WALKFORWARD_MAX_WORKERS
+        per_task = max(MIN_STEPS_PER_TASK, math.ceil(len(windows) / (4 * max_workers)))
+        batches = [windows[i:i + per_task] for i in range(0, len(windows), per_task)]
+        shm, spec = sweep_service.share_frame(df, {trend_filter_ema})
+        executor = get_process_pool('walkforward', max_workers)
+        futures = []
+        try:
+            futures = [executor.submit(_step_signals, spec, batch, tolerance_percent, trend_filter_ema) for batch in batches]
+            step_signals = [signals for future in futures for signals in future.result()]
+        finally:
+            # After a failed step, the others are dropped or finished before the frame is unlinked
+            cancel_pending(futures)
+            wait(futures)
+            shm.close()
+            shm.unlink()
+
+    signals = [signal for signals in step_signals for signal in signals]
+    with timer.stage(f'backtest:{engine}'):
+        results = backtest_service.get_backtest_results(df, signals, atr_multiplier, reward_risk_ratio, engine=engine)
+
+    # Trades are attributed to the step in which they were entered
+    step_starts = df.index[bounds[:-1]]
+    steps = [{'start': start.isoformat(), 'end': df.index[end - 1].isoformat(), 'key_levels': levels,
+              'signals': len(signals), 'trades': 0, 'pnl': 0.0}
+             for start, (_, end, levels), signals in zip(step_starts, windows, step_signals)]
+    for trade in results['trades']:
+        step = int(step_starts.searchsorted(pd.Timestamp(trade['entry_date']), side='right')) - 1
+        if step >= 0:
+            steps[step]['trades'] += 1
+            steps[step]['pnl'] += trade['pnl_net']
+
+    results['summary']['steps'] = len(steps)
+    results['summary']['signals'] = len(signals)
+    results['steps'] = steps
+    return results
+
+def get_walk_forward_results(symbol: str, evaluation_days: int = 60, step_days: int = 5, warmup_days: int = None,
+                             timer: StageTimer = None, **params) -> dict:
+    """
+    Fetches the bars for a walk-forward backtest of `symbol` once (the 5-minute bars of the evaluation
+    period plus a warm-up for the indicators, and the daily bars the key levels need) and runs it.
+    `params` are passed on to walk_forward_results.
+    """
+    timer = timer_or_new(timer)
+    if not 1 <= evaluation_days <= current_config.WALKFORWARD_MAX_DAYS:
+        raise ValueError(f"evaluation_days must be between 1 and {current_config.WALKFORWARD_MAX_DAYS}.")
+    warmup_days = current_config.WALKFORWARD_WARMUP_DAYS if warmup_days is None else warmup_days
+    end_date = datetime.now()
+    evaluation_start = end_date - timedelta(days=evaluation_days)
+    dfs = data_service.get_timeframes(symbol, {
+        'backtest': (TimeFrame(5, TimeFrameUnit.Minute), evaluation_start - timedelta(days=warmup_days), end_date),
+        'daily': (TimeFrame.Day, evaluation_start - LEVELS_LOOKBACK - timedelta(days=10), end_date),
+    }, timer=timer)
+    if dfs['backtest'] is None or dfs['backtest'].empty:
+        raise ValueError("No data for backtest.")
+
+    _, df = technical_analysis.calculate_technical_indicators(dfs['backtest'])
+    return walk_forward_results(df, dfs['daily'], evaluation_start, step_days=step_days, timer=timer, **params)
@@ -0,0 +1,54 @@
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from config import current_config
+from analysis import technical_analysis
+from services import data_service
+from utils.process_pool import cancel_pending, get_process_pool
+
+def parse_symbols(symbols_param: str) -> list[str]:
+    """Parses a comma separated symbol list, keeping the first occurrence of each symbol."""
+    symbols = [s.strip().upper() for s in symbols_param.split(',') if s.strip()]
+    return list(dict.fromkeys(symbols))
+
+def analyze_symbol(symbol: str, dfs: dict) -> dict:
+    """Runs the price action analysis and the 5-minute signal scan for one symbol."""
+    analysis = technical_analysis.analyze_price_action(dfs)
+    signals = []
+    df_5min = dfs.get('5min')
+    if df_5min is not None and not df_5min.empty:
+        key_levels = technical_analysis.get_key_levels(analysis)
+        signals = technical_analysis.generate_price_action_signals(df_5min, key_levels, trend_filter_ema=20)
+    return {
+        'symbol': symbol,
+        'analysis': analysis,
+        'signals': [(timestamp.isoformat(), direction, strategy_name) for timestamp, direction, strategy_name in signals],
+    }
+
+def scan_watchlist(symbols: list[str], max_workers: int = None):
+    """
+    Analyzes a watchlist. Bars are fetched with one bulk request per timeframe, then each symbol
+    is analyzed in the shared watchlist process pool. Yields one result dict per symbol as soon as it is ready.
+    """
+    end_date = datetime.now()
+    daily_bars = data_service.get_bars_for_symbols(symbols, TimeFrame.Day, end_date - timedelta(days=365), end_date)
+    five_min_bars = data_service.get_bars_for_symbols(symbols, TimeFrame(5, TimeFrameUnit.Minute), end_date - timedelta(days=5), end_date)
+
+    executor = get_process_pool('watchlist', max_workers or current_config.WATCHLIST_MAX_WORKERS)
+    futures = {}
+    try:
+        for symbol in symbols:
+            dfs = {'daily': daily_bars.get(symbol), '5min': five_min_bars.get(symbol)}
+            if all(df is None for df in dfs.values()):
+                yield {'symbol': symbol, 'error': 'No data returned.'}
+                continue
+            futures[executor.submit(analyze_symbol, symbol, dfs)] = symbol
+
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {'symbol': futures[future], 'error': str(e)}
+    finally:
+        # Also reached when the client disconnects: drop the symbols not yet started
+        cancel_pending(futures)
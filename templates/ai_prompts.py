@@ -1,6 +1,47 @@
+import math
+import re
+from config import current_config
 from utils.formatters import format_indicator, format_indicator_dict
 
-def generate_trading_signal_prompt(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A') -> str:
+PROMPT_FORMATS = ('verbose', 'compact')
+
+# CJK characters and full-width punctuation take about one token each; other text about four characters per token
+_WIDE_CHARS = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+# Stands for the report time in a prompt built once for several report times (see insert_current_time)
+CURRENT_TIME_PLACEHOLDER = '<current_time>'
+
+def estimate_tokens(text: str) -> int:
+    """A local estimate of the LLM token count of `text`, close enough for budgeting without a tokenizer."""
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+def _task_section(symbol: str, current_time: str) -> str:
+    return f"""**--- 你的任务：生成交易信号报告 ---**
+
+请严格按照以下格式输出报告，不要添加任何额外的解释或评论。
+
+**交易信号报告: {symbol}**
+
+**当前价格**: [在此处插入当前价格]
+**信号**: [Call 或 Put]
+**目标价**: [在此处插入计算出的目标价，优先考虑衡量波动目标]
+**止损价**: [在此处插入计算出的止损价，考虑ATR或信号K线]
+**胜率估算**: [在此处插入你的胜率估算，例如: 60%]
+
+**核心依据**:
+- **市场结构**: [描述当前市场是趋势还是震荡，以及你的主要判断依据]
+- **价格行为**: [描述最关键的K线信号及其位置，例如: 1小时看涨Pin Bar，测试了90天波段的50%回调位]
+- **入场与目标**: [简述你的入场逻辑和选择目标价的依据，例如: 在信号K线上方入场，目标为1倍衡量波动]
+- **回测参考**: [如果适用，简要说明回测结果如何支持你的决策]
+
+**风险提示**:
+- 每笔交易风险控制在账户的 1%-2%。
+- 考虑交易成本（佣金、滑点）。
+- 当前时间: {current_time}。
+"""
+
+def _verbose_prompt(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A') -> str:
     daily_indicators = analysis_data.get('technical_indicators', {}).get('daily', {})
     h4_indicators = analysis_data.get('technical_indicators', {}).get('4h', {})
     h1_indicators = analysis_data.get('technical_indicators', {}).get('1h', {})
@@ -72,28 +113,119 @@ def generate_trading_signal_prompt(symbol: str, analysis_data: dict, backtest_re
    - **1小时:** RSI: {format_indicator(h1_indicators.get('rsi'))}
    - **日线:** RSI: {format_indicator(daily_indicators.get('rsi'))}
 {backtest_section}
-**--- 你的任务：生成交易信号报告 ---**
-
-请严格按照以下格式输出报告，不要添加任何额外的解释或评论。
+{_task_section(symbol, current_time)}"""
+    return prompt
 
-**交易信号报告: {symbol}**
 
-**当前价格**: [在此处插入当前价格]
-**信号**: [Call 或 Put]
-**目标价**: [在此处插入计算出的目标价，优先考虑衡量波动目标]
-**止损价**: [在此处插入计算出的止损价，考虑ATR或信号K线]
-**胜率估算**: [在此处插入你的胜率估算，例如: 60%]
-
-**核心依据**:
-- **市场结构**: [描述当前市场是趋势还是震荡，以及你的主要判断依据]
-- **价格行为**: [描述最关键的K线信号及其位置，例如: 1小时看涨Pin Bar，测试了90天波段的50%回调位]
-- **入场与目标**: [简述你的入场逻辑和选择目标价的依据，例如: 在信号K线上方入场，目标为1倍衡量波动]
-- **回测参考**: [如果适用，简要说明回测结果如何支持你的决策]
-
-**风险提示**:
-- 每笔交易风险控制在账户的 1%-2%。
-- 考虑交易成本（佣金、滑点）。
-- 当前时间: {current_time}。
-"""
-    return prompt
-    return prompt
\ No newline at end of file
+# Rows of the compact indicator table
+TIMEFRAME_LABELS = {'daily': '日线', '4h': '4小时', '1h': '1小时', '5min': '5分钟'}
+# Columns of the compact indicator table; the optional ones are dropped in this order when the prompt is over budget
+TABLE_COLUMNS = {
+    'trend': '趋势', 'rsi': 'RSI', 'macd_hist': 'MACD柱', 'atr': 'ATR', 'ema_20': 'EMA20', 'sma_50': 'SMA50',
+    'vwap': 'VWAP', 'ema_5': 'EMA5', 'ema_10': 'EMA10', 'adx': 'ADX', 'bb_upper': 'BB上轨', 'bb_lower': 'BB下轨',
+    'stoch_k': '%K',
+}
+OPTIONAL_COLUMNS = ['stoch_k', 'bb_lower', 'bb_upper', 'adx', 'ema_10', 'ema_5', 'sma_50', 'ema_20']
+LEVEL_LABELS = {
+    'previous_day_high': '前日高', 'previous_day_low': '前日低', 'daily_90d_high': '90天高', 'daily_90d_low': '90天低',
+    'swing_50_retracement': '50%回调', 'measured_move_1x': '衡量波动1x', 'measured_move_2x': '衡量波动2x',
+}
+PATTERN_LABELS = {'pin_bar': 'Pin Bar', 'bullish_engulfing': '看涨吞没', 'bearish_engulfing': '看跌吞没'}
+
+def indicator_table(analysis_data: dict) -> tuple[list[str], dict[str, dict]]:
+    """
+    The trends and latest indicators of the analysis as (columns, {timeframe: {column: value}}), without
+    the values that are None, the columns and timeframes left empty, and the timeframes whose values
+    repeat those of a timeframe above them.
+    """
+    indicators = analysis_data.get('technical_indicators', {})
+    trends = analysis_data.get('trends', {})
+    rows = {}
+    for timeframe in TIMEFRAME_LABELS:
+        values = {**indicators.get(timeframe, {}), 'trend': trends.get(timeframe)}
+        if timeframe == 'daily':
+            # VWAP is anchored to the day, so on a daily bar it is only that bar's typical price
+            values.pop('vwap', None)
+        row = {column: values[column] for column in TABLE_COLUMNS if values.get(column) is not None}
+        if any(column != 'trend' for column in row) and row not in rows.values():
+            rows[timeframe] = row
+    columns = [column for column in TABLE_COLUMNS if any(column in row for row in rows.values())]
+    return columns, rows
+
+def _format_table(columns: list[str], rows: dict[str, dict]) -> str:
+    lines = ['周期|' + '|'.join(TABLE_COLUMNS[column] for column in columns)]
+    for timeframe, row in rows.items():
+        cells = [(row[column] if isinstance(row[column], str) else format_indicator(row[column])) if column in row else '-'
+                 for column in columns]
+        lines.append(f"{TIMEFRAME_LABELS[timeframe]}|" + '|'.join(cells))
+    return '\n'.join(lines)
+
+def _format_levels(price_action: dict) -> str:
+    levels = [f"{label} {format_indicator(price_action[key])}" for key, label in LEVEL_LABELS.items()
+              if price_action.get(key) is not None]
+    return ', '.join(levels) or 'N/A'
+
+def _format_patterns(price_action: dict) -> str:
+    """Only the detected patterns, each with its volume spike and nearby level."""
+    patterns = []
+    for timeframe in ('4h', '1h', '5min'):
+        for pattern, label in PATTERN_LABELS.items():
+            data = price_action.get(f'{timeframe}_{pattern}') or {}
+            if not data.get('detected'):
+                continue
+            details = []
+            if data.get('shadow_to_body_ratio') is not None:
+                details.append(f"影线/实体 {data['shadow_to_body_ratio']:.2f}")
+            if data.get('volume_spike'):
+                details.append('放量')
+            for side, side_label in (('support', '近支撑'), ('resistance', '近阻力')):
+                if data.get(f'near_{side}'):
+                    details.append(f"{side_label} {format_indicator(data[f'near_{side}'])}")
+            patterns.append(f"{TIMEFRAME_LABELS[timeframe]} {label}" + (f" ({', '.join(details)})" if details else ''))
+    return '; '.join(patterns) or '无'
+
+def _compact_prompt(symbol: str, analysis_data: dict, backtest_results: dict, current_time: str, columns: list[str],
+                    rows: dict[str, dict]) -> str:
+    price_action = analysis_data.get('price_action', {})
+    current_price = analysis_data.get('current_price', price_action.get('latest_close'))
+    backtest_line = ""
+    if backtest_results and backtest_results.get('total_trades', 0) > 0:
+        backtest_line = (f"回测: 胜率 {backtest_results.get('win_rate', 0):.2%}, {backtest_results.get('total_trades', 0)} 笔"
+                         f" ({backtest_results.get('strategy_description', 'N/A')})\n")
+    return f"""你是遵循 Al Brooks 价格行为理论的专业交易员。判断市场是趋势还是区间及其强弱；在关键价位附近寻找高概率K线信号（Pin Bar、吞没）；以信号K线高低点入场，用ATR或信号K线另一端止损；目标至少1倍风险，优先前高低点或1倍/2倍衡量波动。必须在 Call 与 Put 之间明确选择，并估算胜率。
+
+**数据** (缺失项已省略)
+当前价格: {format_indicator(current_price)}
+关键价位: {_format_levels(price_action)}
+K线形态: {_format_patterns(price_action)}
+{backtest_line}{_format_table(columns, rows)}
+
+{_task_section(symbol, current_time)}"""
+
+def insert_current_time(prompt: str, current_time: str) -> str:
+    """A prompt built with current_time=CURRENT_TIME_PLACEHOLDER, for this report time."""
+    head, placeholder, tail = prompt.rpartition(CURRENT_TIME_PLACEHOLDER)
+    return head + current_time + tail if placeholder else prompt
+
+def generate_trading_signal_prompt(symbol: str, analysis_data: dict, backtest_results: dict = None, current_time: str = 'N/A',
+                                   prompt_format: str = None, token_budget: int = None) -> str:
+    """
+    Builds the report prompt in PROMPT_FORMAT (by default): 'verbose' lists every section in full;
+    'compact' sends the analysis as one indicator table plus single-line levels and patterns. A compact
+    prompt estimated (see estimate_tokens) above `token_budget` (PROMPT_TOKEN_BUDGET, 0 for none)
+    loses its optional indicator columns, least useful first, until it fits or none are left.
+    """
+    prompt_format = prompt_format or current_config.PROMPT_FORMAT
+    if prompt_format not in PROMPT_FORMATS:
+        raise ValueError(f"Unknown prompt format '{prompt_format}'. Expected one of {PROMPT_FORMATS}.")
+    if prompt_format == 'verbose':
+        return _verbose_prompt(symbol, analysis_data, backtest_results, current_time)
+
+    token_budget = current_config.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    columns, rows = indicator_table(analysis_data)
+    droppable = [column for column in OPTIONAL_COLUMNS if column in columns]
+    while True:
+        prompt = _compact_prompt(symbol, analysis_data, backtest_results, current_time, columns, rows)
+        if not token_budget or not droppable or estimate_tokens(prompt) <= token_budget:
+            return prompt
+        columns.remove(droppable.pop(0))
@@ -0,0 +1,73 @@
+"""
+Writes tests/fixtures/pandas_ta_indicators.npz: the default indicator set and VWAP as computed by
+pandas_ta 0.3.14b, on the frames test_indicator_kernels checks the built-in kernels against.
+
+    python -m tests.generate_indicator_fixture
+
+pandas_ta is no longer a dependency; install pandas_ta 0.3.14b (or its republication
+pandas-ta-classic 0.3.14b1, whose indicators are the same code) in a separate environment.
+"""
+import os
+import numpy as np
+import pandas as pd
+from analysis.technical_analysis import INDICATOR_SPECS
+from benchmarks.fixtures import synthetic_bars
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pandas_ta_indicators.npz')
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def _flat_stretch(df: pd.DataFrame, start: int, stop: int) -> pd.DataFrame:
+    """Bars start..stop-1 all at the close of bar start - 1, with no range: zero changes, ranges and deviations."""
+    df = df.copy()
+    df.iloc[start:stop, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = df['Close'].iloc[start - 1]
+    return df
+
+def fixture_frames() -> dict:
+    tz_aware = synthetic_bars(300, seed=4)
+    tz_aware.index = tz_aware.index.tz_localize('UTC').tz_convert('America/New_York')
+    return {
+        'normal': synthetic_bars(400, seed=1),
+        # Shorter than most indicator lengths, which then return no columns
+        'short': synthetic_bars(12, seed=2),
+        'tiny': synthetic_bars(3, seed=2),
+        'flat': _flat_stretch(synthetic_bars(250, seed=3), 100, 160),
+        # VWAP is anchored to the calendar day in the index's own timezone
+        'tz_aware': tz_aware,
+    }
+
+def _pandas_ta():
+    # Imported here, so that the tests can import this module without pandas_ta
+    try:
+        import pandas_ta
+    except ImportError:
+        import pandas_ta_classic as pandas_ta
+    return pandas_ta
+
+def pandas_ta_indicators(ta, df: pd.DataFrame) -> pd.DataFrame:
+    """The indicator columns the baseline calculate_technical_indicators added with pandas_ta."""
+    df = df.copy()
+    df.ta.cores = 0
+    df.ta.strategy(ta.Strategy(name="Comprehensive Indicators", ta=[spec for spec, _ in INDICATOR_SPECS]))
+    df['VWAP'] = ta.vwap(df['High'], df['Low'], df['Close'], df['Volume'])
+    return df.drop(columns=OHLCV)
+
+def main() -> None:
+    ta = _pandas_ta()
+    arrays = {'pandas_ta_version': np.array(ta.version)}
+    for name, df in fixture_frames().items():
+        indicators = pandas_ta_indicators(ta, df)
+        index = pd.DatetimeIndex(df.index)
+        # Nanoseconds since the epoch, UTC for a tz-aware index
+        arrays[f'{name}/index'] = index.asi8
+        arrays[f'{name}/tz'] = np.array(str(index.tz or ''))
+        arrays[f'{name}/columns'] = np.array(indicators.columns.tolist())
+        for column in OHLCV:
+            arrays[f'{name}/{column}'] = df[column].to_numpy(dtype=np.float64)
+        for column in indicators.columns:
+            arrays[f'{name}/{column}'] = indicators[column].to_numpy(dtype=np.float64)
+    os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+    np.savez_compressed(FIXTURE_PATH, **arrays)
+    print(f"Wrote {len(arrays)} arrays to {FIXTURE_PATH} (pandas_ta {ta.version})")
+
+if __name__ == '__main__':
+    main()
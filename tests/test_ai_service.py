@@ -0,0 +1,64 @@
+"""
+Report prompts and the report cache in get_ai_analysis, with the LLM replaced by a fixed stream.
+"""
+import pytest
+from analysis import technical_analysis
+from benchmarks.fixtures import symbol_fixtures
+from config import current_config
+from services import ai_service, llm_client
+from services.report_cache import ReportCache
+from templates import ai_prompts
+
+@pytest.fixture(scope='module')
+def analysis_data() -> dict:
+    return technical_analysis.analyze_price_action(symbol_fixtures(1, 1500)['SYM0'])
+
+@pytest.fixture
+def llm(monkeypatch) -> list:
+    """The prompts sent to the LLM."""
+    prompts = []
+
+    def stream_completion(prompt):
+        prompts.append(prompt)
+        yield from ['Report', ' text']
+    monkeypatch.setattr(llm_client, 'stream_completion', stream_completion)
+    monkeypatch.setattr(ai_service, 'report_cache', ReportCache(ttl_seconds=300, max_entries=16))
+    return prompts
+
+@pytest.fixture
+def prompt_builds(monkeypatch) -> list:
+    builds = []
+    generate = ai_prompts.generate_trading_signal_prompt
+
+    def counting(*args, **kwargs):
+        builds.append(args)
+        return generate(*args, **kwargs)
+    monkeypatch.setattr(ai_service, 'generate_trading_signal_prompt', counting)
+    return builds
+
+def _report(symbol: str, analysis_data: dict, current_time: str) -> str:
+    return ''.join(ai_service.get_ai_analysis(symbol, analysis_data, {'total_trades': 0}, current_time))
+
+@pytest.mark.parametrize('prompt_format, token_budget', [('compact', 0), ('compact', 1000), ('compact', 300), ('verbose', 0)])
+@pytest.mark.parametrize('cache_enabled', [True, False])
+def test_prompt_is_built_once_with_the_report_time(analysis_data, llm, prompt_builds, monkeypatch, prompt_format,
+                                                  token_budget, cache_enabled):
+    monkeypatch.setattr(current_config, 'PROMPT_FORMAT', prompt_format)
+    monkeypatch.setattr(current_config, 'PROMPT_TOKEN_BUDGET', token_budget)
+    monkeypatch.setattr(current_config, 'REPORT_CACHE_ENABLED', cache_enabled)
+    report = _report('SYM0', analysis_data, '2024-03-04 10:30:00')
+    assert report.endswith('Report text')
+    assert len(prompt_builds) == 1
+    assert llm == [ai_prompts.generate_trading_signal_prompt('SYM0', analysis_data, {'total_trades': 0}, '2024-03-04 10:30:00')]
+    assert ai_prompts.CURRENT_TIME_PLACEHOLDER not in llm[0]
+
+def test_report_times_share_one_report(analysis_data, llm, monkeypatch):
+    monkeypatch.setattr(current_config, 'REPORT_CACHE_ENABLED', True)
+    first = _report('SYM0', analysis_data, '2024-03-04 10:30:00')
+    second = _report('SYM0', analysis_data, '2024-03-04 10:31:00')
+    assert first == second
+    assert len(llm) == 1
+    # Another analysis gets its own report
+    changed = dict(analysis_data, price_action=dict(analysis_data['price_action'], latest_close=1.0))
+    _report('SYM0', changed, '2024-03-04 10:31:00')
+    assert len(llm) == 2
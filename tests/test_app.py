@@ -0,0 +1,54 @@
+"""
+Request validation of the Flask endpoints; the services behind them are replaced by fakes.
+"""
+import pytest
+from app import app
+from services import portfolio_service
+
+@pytest.fixture
+def portfolio_calls(monkeypatch) -> list:
+    calls = []
+
+    def get_portfolio_backtest_results(symbols, **kwargs):
+        kwargs.pop('timer')
+        calls.append((symbols, kwargs))
+        return {'summary': {}, 'trades': []}
+    monkeypatch.setattr(portfolio_service, 'get_portfolio_backtest_results', get_portfolio_backtest_results)
+    return calls
+
+def _post_portfolio(**params):
+    return app.test_client().post('/backtest/portfolio', json={'symbols': 'AAPL,MSFT', **params})
+
+@pytest.mark.parametrize('params, expected', [
+    ({}, {'max_positions': None, 'position_size': None, 'risk_per_trade': None}),
+    ({'max_positions': 3, 'position_size': 0.25, 'risk_per_trade': 0.01},
+     {'max_positions': 3, 'position_size': 0.25, 'risk_per_trade': 0.01}),
+    ({'max_positions': '2', 'position_size': '1', 'risk_per_trade': ''},
+     {'max_positions': 2, 'position_size': 1.0, 'risk_per_trade': None}),
+    ({'max_positions': 4.0, 'position_size': None}, {'max_positions': 4, 'position_size': None, 'risk_per_trade': None}),
+])
+def test_portfolio_accepts_valid_sizing(portfolio_calls, params, expected):
+    response = _post_portfolio(**params)
+    assert response.status_code == 200, response.get_json()
+    assert portfolio_calls == [(['AAPL', 'MSFT'], expected)]
+
+@pytest.mark.parametrize('params, message', [
+    ({'max_positions': 0}, "'max_positions' must be a positive integer"),
+    ({'max_positions': -2}, "'max_positions' must be a positive integer"),
+    ({'max_positions': 2.5}, "'max_positions' must be a positive integer"),
+    ({'max_positions': 'many'}, "'max_positions' must be a positive integer"),
+    ({'max_positions': True}, "'max_positions' must be a positive integer"),
+    ({'position_size': 0}, "'position_size' must be greater than 0 and at most 1.0"),
+    ({'position_size': -0.1}, "'position_size' must be greater than 0 and at most 1.0"),
+    ({'position_size': 1.5}, "'position_size' must be greater than 0 and at most 1.0"),
+    ({'position_size': 'half'}, "'position_size' must be greater than 0 and at most 1.0"),
+    ({'position_size': [0.5]}, "'position_size' must be greater than 0 and at most 1.0"),
+    ({'risk_per_trade': 0}, "'risk_per_trade' must be greater than 0 and at most 1.0"),
+    ({'risk_per_trade': 2}, "'risk_per_trade' must be greater than 0 and at most 1.0"),
+    ({'risk_per_trade': 'NaN'}, "'risk_per_trade' must be greater than 0 and at most 1.0"),
+])
+def test_portfolio_rejects_invalid_sizing(portfolio_calls, params, message):
+    response = _post_portfolio(**params)
+    assert response.status_code == 400
+    assert response.get_json() == {'status': 'error', 'message': message + '.'}
+    assert portfolio_calls == []
@@ -0,0 +1,192 @@
+"""
+Streaming ingestion: a fixture replayed minute by minute through BarStreamIngestor gives, at every
+5-minute close, the same analysis as a full recomputation over the bars seen so far. The background
+stream started by the server hooks serves those results through scanner_service.load_result.
+"""
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+import asgi
+from analysis import technical_analysis
+from benchmarks.fixtures import OHLCV_AGG, synthetic_bars
+from config import current_config
+from services import bar_stream, data_service, scanner_service, watchlist_service
+from services.bar_stream import BackgroundBarStream, BarSource, BarStreamIngestor, ReplayBarSource
+from services.resampler import MARKET_TIMEZONE
+from utils.formatters import json_default
+
+SYMBOLS = ['AAA', 'BBB']
+STREAM_START = pd.Timestamp('2024-03-04 14:30')
+
+def _seed_daily(seed: int) -> pd.DataFrame:
+    """Daily bars up to the day before the stream, stamped at midnight New York time like the Alpaca bars."""
+    days = pd.date_range(end=STREAM_START.tz_localize('UTC').tz_convert(MARKET_TIMEZONE).normalize() - pd.Timedelta(days=1),
+                         periods=120, freq='D').tz_convert('UTC').tz_localize(None)
+    df = synthetic_bars(len(days), freq='1D', seed=seed)
+    df.index = days.rename('timestamp')
+    return df
+
+def _seed_5min(seed: int) -> pd.DataFrame:
+    return synthetic_bars(200, seed=seed, start=str(STREAM_START - pd.Timedelta(minutes=5 * 200)))
+
+def _trading_days(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    local = index.tz_localize('UTC').tz_convert(MARKET_TIMEZONE)
+    return local.normalize().tz_convert('UTC').tz_localize(None)
+
+def _reference(symbol: str, seed_5min: pd.DataFrame, seed_daily: pd.DataFrame, minutes: pd.DataFrame) -> dict:
+    """The analysis recomputed from scratch over the seeded bars and the minute bars streamed so far."""
+    df_5min = pd.concat([seed_5min, minutes.resample('5min').agg(OHLCV_AGG).dropna()])
+    df_daily = pd.concat([seed_daily, minutes.groupby(_trading_days(minutes.index)).agg(OHLCV_AGG)])
+    dfs = {}
+    for name, df in (('5min', df_5min), ('daily', df_daily)):
+        _, df = technical_analysis.calculate_technical_indicators(df.copy())
+        dfs[name] = technical_analysis.detect_pin_bar(df)
+    result = watchlist_service.analyze_symbol(symbol, dfs)
+    result['bar_time'] = dfs['5min'].index[-1].isoformat()
+    return result
+
+def _assert_close(actual, expected, path='result'):
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys(), path
+        for key in expected:
+            _assert_close(actual[key], expected[key], f'{path}.{key}')
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            _assert_close(a, e, f'{path}[{i}]')
+    elif isinstance(expected, (float, np.floating)) and not isinstance(expected, bool):
+        if math.isnan(expected):
+            assert math.isnan(actual), path
+        else:
+            assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), path
+    else:
+        assert actual == expected, path
+
+def test_bar_source_is_abstract():
+    with pytest.raises(TypeError):
+        BarSource()
+
+def test_replay_matches_full_recomputation_at_each_close():
+    minutes = {symbol: synthetic_bars(1000, freq='1min', seed=10 + i, start=str(STREAM_START))
+               for i, symbol in enumerate(SYMBOLS)}
+    seeds = {symbol: (_seed_5min(20 + i), _seed_daily(30 + i)) for i, symbol in enumerate(SYMBOLS)}
+
+    ingestor = BarStreamIngestor(five_min_bars=1000, daily_bars=300)
+    for symbol, (seed_5min, seed_daily) in seeds.items():
+        ingestor.seed(symbol, seed_5min, seed_daily)
+
+    closes = 0
+    for result in ingestor.run(ReplayBarSource(minutes), SYMBOLS):
+        symbol = result['symbol']
+        assert 'error' not in result, result
+        bar_time = pd.Timestamp(result['bar_time'])
+        # The 5-minute bar closes with its last minute
+        streamed = minutes[symbol].loc[:bar_time + pd.Timedelta(minutes=4)]
+        _assert_close(result, _reference(symbol, *seeds[symbol], streamed))
+        closes += 1
+    assert closes == len(SYMBOLS) * 1000 // 5
+    assert ingestor.results.keys() == set(SYMBOLS)
+
+@pytest.fixture
+def stream_config(tmp_path, monkeypatch) -> dict:
+    """Streaming enabled for SYMBOLS, from replayed minute bars, seeded with fixture bars instead of Alpaca's."""
+    monkeypatch.setattr(current_config, 'SCANNER_ENABLED', False)
+    monkeypatch.setattr(current_config, 'SCANNER_DIR', str(tmp_path / 'scanner'))
+    monkeypatch.setattr(current_config, 'STREAM_ENABLED', True)
+    monkeypatch.setattr(current_config, 'STREAM_SYMBOLS', SYMBOLS)
+    minutes = {symbol: synthetic_bars(100, freq='1min', seed=10 + i, start=str(STREAM_START))
+               for i, symbol in enumerate(SYMBOLS)}
+    seeds = {symbol: (_seed_5min(20 + i), _seed_daily(30 + i)) for i, symbol in enumerate(SYMBOLS)}
+
+    def get_bars_for_symbols(symbols, timeframe, start_date, end_date, **kwargs):
+        return {symbol: seeds[symbol][0 if str(timeframe) == '5Min' else 1] for symbol in symbols}
+    monkeypatch.setattr(data_service, 'get_bars_for_symbols', get_bars_for_symbols)
+    monkeypatch.setattr(bar_stream, 'AlpacaBarSource', lambda: ReplayBarSource(minutes))
+    yield {'minutes': minutes, 'seeds': seeds}
+    bar_stream.stop_background_stream()
+
+def _expected_results(stream_config: dict) -> dict:
+    """The last result per symbol of an ingestor over the same bars, as stored in JSON."""
+    ingestor = BarStreamIngestor()
+    for symbol, (seed_5min, seed_daily) in stream_config['seeds'].items():
+        ingestor.seed(symbol, seed_5min, seed_daily)
+    results = {result['symbol']: result for result in ingestor.run(ReplayBarSource(stream_config['minutes']), SYMBOLS)}
+    return json.loads(json.dumps(results, default=json_default))
+
+def _wait_for_results(expected: dict, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        loaded = {symbol: scanner_service.load_result(symbol) for symbol in SYMBOLS}
+        if all(loaded[symbol] and loaded[symbol]['bar_time'] == expected[symbol]['bar_time'] for symbol in SYMBOLS):
+            return loaded
+        assert time.monotonic() < deadline, f'stream results not stored: {loaded}'
+        time.sleep(0.05)
+
+def _gunicorn_hooks():
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', os.path.join(os.path.dirname(asgi.__file__), 'gunicorn.conf.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _run_gunicorn_worker(check) -> None:
+    hooks = _gunicorn_hooks()
+    worker = type('Worker', (), {'wsgi': Flask(__name__)})()
+    hooks.post_worker_init(worker)
+    try:
+        check()
+    finally:
+        hooks.worker_exit(None, worker)
+
+def _run_asgi_lifespan(check) -> None:
+    async def lifespan():
+        received, sent = asyncio.Queue(), asyncio.Queue()
+        task = asyncio.ensure_future(asgi.app({'type': 'lifespan'}, received.get, sent.put))
+        await received.put({'type': 'lifespan.startup'})
+        assert (await sent.get())['type'] == 'lifespan.startup.complete'
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, check)
+        finally:
+            await received.put({'type': 'lifespan.shutdown'})
+            assert (await sent.get())['type'] == 'lifespan.shutdown.complete'
+            await task
+    asyncio.run(lifespan())
+
+@pytest.mark.parametrize('server', [_run_gunicorn_worker, _run_asgi_lifespan])
+def test_server_hooks_serve_streamed_results(stream_config, server):
+    expected = _expected_results(stream_config)
+    streams = []
+
+    def check():
+        streams.append(bar_stream._stream)
+        loaded = _wait_for_results(expected)
+        for symbol in SYMBOLS:
+            assert 'scanned_at' in loaded[symbol]
+            _assert_close({key: loaded[symbol][key] for key in expected[symbol]}, expected[symbol])
+    server(check)
+
+    assert isinstance(streams[0], BackgroundBarStream)
+    # Stopped with the worker, releasing the lock for the next one
+    assert bar_stream._stream is None and not streams[0]._thread.is_alive() and streams[0]._lock_file is None
+
+def test_stream_is_not_started_when_disabled(stream_config, monkeypatch):
+    monkeypatch.setattr(current_config, 'STREAM_ENABLED', False)
+    assert bar_stream.start_background_stream() is None
+    assert scanner_service.load_result(SYMBOLS[0]) is None
+
+def test_only_the_lock_holder_streams(stream_config):
+    holder = scanner_service.acquire_lock_file(bar_stream.LOCK_FILE)
+    try:
+        stream = bar_stream.start_background_stream()
+        time.sleep(0.5)
+        assert stream.ingestor is None
+        assert all(scanner_service.load_result(symbol) is None for symbol in SYMBOLS)
+    finally:
+        bar_stream.stop_background_stream()
+        holder.close()
@@ -0,0 +1,82 @@
+"""
+The bar cache in front of the Alpaca fetches, with _fetch_bars replaced by a fake feed over fixture bars.
+"""
+import pandas as pd
+import pytest
+from alpaca.data.timeframe import TimeFrame
+from analysis import technical_analysis
+from benchmarks.fixtures import synthetic_bars
+from config import current_config
+from services import bar_store, data_service
+
+@pytest.fixture
+def bar_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(current_config, 'BAR_CACHE_ENABLED', True)
+    monkeypatch.setattr(current_config, 'BAR_CACHE_DIR', str(tmp_path / 'bars'))
+    return tmp_path
+
+class FakeFeed:
+    """Serves slices of fixture bars like _fetch_bars, and fails while `failing` is set."""
+    def __init__(self, bars: dict):
+        self.bars = bars
+        self.failing = False
+        self.calls = []
+
+    def __call__(self, symbols, timeframe, start_date, end_date):
+        self.calls.append((sorted(symbols), pd.Timestamp(start_date)))
+        if self.failing:
+            raise ConnectionError('feed down')
+        return {symbol: self.bars[symbol].loc[pd.Timestamp(start_date):pd.Timestamp(end_date)] for symbol in symbols}
+
+@pytest.fixture
+def feed(monkeypatch) -> FakeFeed:
+    feed = FakeFeed({symbol: synthetic_bars(2000, seed=i) for i, symbol in enumerate(['WARM', 'COLD'])})
+    monkeypatch.setattr(data_service, '_fetch_bars', feed)
+    return feed
+
+def _window(feed: FakeFeed, start_bar: int, end_bar: int) -> tuple:
+    index = feed.bars['WARM'].index
+    return index[start_bar].to_pydatetime(), index[end_bar].to_pydatetime()
+
+def test_warm_symbols_only_fetch_their_tail(bar_cache, feed):
+    start, end = _window(feed, 100, 1500)
+    data_service._get_raw_bars(['WARM'], TimeFrame.Hour, start, end)
+    later_end = _window(feed, 100, 1800)[1]
+    bars = data_service._get_raw_bars(['WARM', 'COLD'], TimeFrame.Hour, start, later_end)
+    assert feed.calls[1:] == [(['WARM'], pd.Timestamp(end)), (['COLD'], pd.Timestamp(start))]
+    for symbol in ('WARM', 'COLD'):
+        pd.testing.assert_frame_equal(bars[symbol], feed.bars[symbol].loc[start:later_end], check_freq=False)
+
+def test_failed_window_fetch_does_not_serve_a_partial_cache(bar_cache, feed):
+    # COLD's cache only reaches back to bar 1000, WARM's to bar 100
+    data_service._get_raw_bars(['WARM'], TimeFrame.Hour, *_window(feed, 100, 1500))
+    data_service._get_raw_bars(['COLD'], TimeFrame.Hour, *_window(feed, 1000, 1500))
+    feed.failing = True
+    start, end = _window(feed, 100, 1800)
+    bars = data_service._get_raw_bars(['WARM', 'COLD'], TimeFrame.Hour, start, end)
+    assert bars['COLD'] is None
+    # WARM's cache covers the start of the window; it is served without its missing tail
+    pd.testing.assert_frame_equal(bars['WARM'], feed.bars['WARM'].loc[start:_window(feed, 100, 1500)[1]], check_freq=False)
+
+def test_key_level_index_is_reused_while_the_daily_bar_forms(bar_cache, monkeypatch):
+    saves = []
+    save_key_levels = bar_store.save_key_levels
+    monkeypatch.setattr(bar_store, 'save_key_levels', lambda *args: saves.append(args[0]) or save_key_levels(*args))
+
+    df_daily = synthetic_bars(200, freq='1D', seed=5, start='2023-01-02 05:00')
+    for high, low in ((1.001, 0.999), (1.3, 0.99), (1.05, 0.6)):
+        # The forming bar moves through the day, possibly past the 90-day range
+        forming = df_daily.copy()
+        forming.iloc[-1, forming.columns.get_indexer(['High', 'Low'])] = [forming['Open'].iloc[-1] * high,
+                                                                          forming['Open'].iloc[-1] * low]
+        levels = data_service.get_current_key_levels('SYM', forming)
+        expected = technical_analysis.get_key_levels(technical_analysis.analyze_price_action({'daily': forming}))
+        assert levels.keys() == expected.keys()
+        for side in expected:
+            assert levels[side] == pytest.approx(expected[side], rel=1e-12)
+    assert saves == ['SYM']
+
+    # The next day's bar starts a new index
+    next_day = synthetic_bars(201, freq='1D', seed=5, start='2023-01-02 05:00')
+    data_service.get_current_key_levels('SYM', next_day)
+    assert saves == ['SYM', 'SYM']
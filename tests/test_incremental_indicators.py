@@ -0,0 +1,93 @@
+"""
+IncrementalIndicators fed one bar at a time, against calculate_technical_indicators on the growing frame.
+"""
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from analysis import technical_analysis
+from analysis.incremental_indicators import COLUMNS, IncrementalIndicators
+from benchmarks.fixtures import synthetic_bars
+
+def _with_flat_stretch(df: pd.DataFrame, start: int, stop: int) -> pd.DataFrame:
+    df = df.copy()
+    df.iloc[start:stop, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = df['Close'].iloc[start - 1]
+    return df
+
+def _tz_aware(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.index = df.index.tz_localize('UTC').tz_convert('America/New_York')
+    return df
+
+# 5-minute bars from 14:30 UTC: 330 bars run past midnight in UTC and in New York, at different bars
+FRAMES = {
+    'utc_naive': synthetic_bars(330, seed=1),
+    'flat': _with_flat_stretch(synthetic_bars(200, seed=2), 60, 110),
+    'tz_aware': _tz_aware(synthetic_bars(330, seed=3)),
+}
+
+def _assert_row_matches(row: list, expected: pd.DataFrame, path: str) -> None:
+    for column, value in zip(COLUMNS, row):
+        # Indicators longer than the frame are not in the batch frame at all
+        reference = expected[column].iloc[-1] if column in expected.columns else math.nan
+        if math.isnan(reference):
+            assert math.isnan(value), f'{path} {column}'
+        else:
+            assert value == pytest.approx(reference, rel=1e-9, abs=1e-9), f'{path} {column}'
+
+@pytest.mark.parametrize('name', list(FRAMES))
+def test_each_bar_matches_batch_computation(name):
+    df = FRAMES[name]
+    state = IncrementalIndicators()
+    columns = [df[col].to_numpy(dtype=float) for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    for i, (timestamp, *bar) in enumerate(zip(df.index, *columns)):
+        latest = state.update(timestamp, *bar)
+        expected_latest, expected = technical_analysis.calculate_technical_indicators(df.iloc[:i + 1].copy())
+        _assert_row_matches(state.row(), expected, f'{name} bar {i}')
+        assert latest.keys() == expected_latest.keys()
+        for key, value in expected_latest.items():
+            if value is None:
+                assert latest[key] is None, f'{name} bar {i} {key}'
+            else:
+                assert latest[key] == pytest.approx(value, rel=1e-9, abs=1e-9), f'{name} bar {i} {key}'
+
+def test_vwap_resets_at_local_midnight():
+    df = FRAMES['tz_aware']
+    state = IncrementalIndicators.from_frame(df)
+    local_days = df.index.normalize()
+    first_of_day = np.flatnonzero(local_days[1:] != local_days[:-1]) + 1
+    assert first_of_day.size == 1
+    # The New York day changes at 04:00 or 05:00 UTC, not at UTC midnight
+    assert df.index[first_of_day[0]].tz_convert('UTC').hour in (4, 5)
+
+    replay = IncrementalIndicators()
+    for i, (timestamp, row) in enumerate(df.iterrows()):
+        replay.update(timestamp, row['Open'], row['High'], row['Low'], row['Close'], row['Volume'])
+        if i == first_of_day[0]:
+            # Only this bar is in the new day's VWAP
+            assert replay.row()[COLUMNS.index('VWAP')] == pytest.approx((row['High'] + row['Low'] + row['Close']) / 3.0)
+    np.testing.assert_array_equal(replay.row(), state.row())
+
+def test_preview_leaves_the_state_unchanged():
+    df = FRAMES['utc_naive']
+    state = IncrementalIndicators.from_frame(df.iloc[:-1])
+    before = state.row()
+    last = df.iloc[-1]
+    forming = state.preview(df.index[-1], last['Open'], last['High'], last['Low'], last['Close'], last['Volume'])
+    np.testing.assert_array_equal(state.row(), before)
+    assert state.bars == len(df) - 1
+    np.testing.assert_array_equal(forming.row(), IncrementalIndicators.from_frame(df).row())
+
+def test_sync_only_adds_new_bars():
+    df = FRAMES['utc_naive']
+    state = IncrementalIndicators.from_frame(df.iloc[:200])
+    assert state.sync(df) == len(df) - 200
+    assert state.sync(df) == 0
+    np.testing.assert_array_equal(state.row(), IncrementalIndicators.from_frame(df).row())
+
+def test_rejects_bars_out_of_order():
+    df = FRAMES['utc_naive']
+    state = IncrementalIndicators.from_frame(df.iloc[:10])
+    row = df.iloc[5]
+    with pytest.raises(ValueError, match='is not newer than the last bar'):
+        state.update(df.index[5], row['Open'], row['High'], row['Low'], row['Close'], row['Volume'])
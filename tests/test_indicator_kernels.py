@@ -0,0 +1,115 @@
+"""
+The built-in indicator kernels against the pandas_ta 0.3.14b outputs they replaced, stored in
+fixtures/pandas_ta_indicators.npz (see generate_indicator_fixture), with and without numba; and
+their loops, as plain Python and compiled, against the pandas routines they stand in for.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from analysis import indicator_kernels, technical_analysis
+from tests.generate_indicator_fixture import FIXTURE_PATH, OHLCV
+
+FRAMES = ['normal', 'short', 'tiny', 'flat', 'tz_aware']
+
+@pytest.fixture(scope='module')
+def fixture() -> dict:
+    with np.load(FIXTURE_PATH) as arrays:
+        return {key: arrays[key] for key in arrays.files}
+
+def _frame(fixture: dict, name: str) -> pd.DataFrame:
+    index = pd.DatetimeIndex(fixture[f'{name}/index'], name='timestamp')
+    tz = str(fixture[f'{name}/tz'])
+    if tz:
+        index = index.tz_localize('UTC').tz_convert(tz)
+    return pd.DataFrame({column: fixture[f'{name}/{column}'] for column in OHLCV}, index=index)
+
+@pytest.fixture(params=['numba', 'pandas'])
+def kernels(request, monkeypatch):
+    """Runs a test once with the numba kernels, when numba is installed, and once with the pandas fallback."""
+    if request.param == 'numba':
+        if indicator_kernels.numba is None:
+            pytest.skip('numba is not installed')
+    else:
+        for name in ('_ewm_kernel', '_rolling_mean_std_kernel', '_rolling_extreme_kernel'):
+            monkeypatch.setattr(indicator_kernels, name, None)
+    return request.param
+
+def test_fixture_covers_every_indicator_column(fixture):
+    expected = [column for _, columns in technical_analysis.INDICATOR_SPECS for column in columns] + ['VWAP']
+    assert fixture['normal/columns'].tolist() == expected
+
+@pytest.mark.parametrize('name', FRAMES)
+def test_matches_pandas_ta(fixture, kernels, name):
+    df = _frame(fixture, name)
+    _, enriched = technical_analysis.calculate_technical_indicators(df.copy())
+    expected_columns = fixture[f'{name}/columns'].tolist()
+    assert [column for column in enriched.columns if column not in OHLCV] == expected_columns
+    for column in expected_columns:
+        actual, expected = enriched[column].to_numpy(dtype=np.float64), fixture[f'{name}/{column}']
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected), err_msg=f'{name} {column} NaN mask')
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, err_msg=f'{name} {column}')
+
+def _series_with_gaps_and_flats(seed: int = 7, size: int = 300) -> np.ndarray:
+    """A random walk with leading NaNs, isolated and consecutive NaN gaps, and flat stretches."""
+    values = 100.0 + np.cumsum(np.random.default_rng(seed).normal(0.0, 0.5, size))
+    values[:5] = np.nan
+    values[40] = np.nan
+    values[90:97] = np.nan
+    values[120:160] = values[119]
+    values[200:205] = 0.0
+    values[250:] = values[249]
+    return values
+
+LOOPS = {
+    'python': (indicator_kernels._ewm_loop, indicator_kernels._rolling_mean_std_loop,
+               indicator_kernels._rolling_extreme_loop),
+    'numba': (indicator_kernels._ewm_kernel, indicator_kernels._rolling_mean_std_kernel,
+              indicator_kernels._rolling_extreme_kernel),
+}
+
+@pytest.fixture(params=list(LOOPS))
+def loops(request) -> tuple:
+    """The loops as plain Python, and as compiled by numba."""
+    if request.param == 'numba' and indicator_kernels.numba is None:
+        pytest.skip('numba is not installed')
+    return LOOPS[request.param]
+
+@pytest.mark.parametrize('alpha', [2.0 / 6, 1.0 / 14, 0.9])
+@pytest.mark.parametrize('adjust', [True, False])
+@pytest.mark.parametrize('min_periods', [1, 14])
+def test_ewm_loop_matches_pandas(loops, alpha, adjust, min_periods):
+    values = _series_with_gaps_and_flats()
+    expected = pd.Series(values).ewm(alpha=alpha, adjust=adjust, min_periods=min_periods).mean().to_numpy()
+    actual = loops[0](values, alpha, adjust, min_periods)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('length', [1, 5, 20])
+def test_rolling_mean_std_loop_matches_pandas(loops, length):
+    values = _series_with_gaps_and_flats()
+    rolling = pd.Series(values).rolling(length)
+    mean, std = loops[1](values, length)
+    for actual, expected in ((mean, rolling.mean().to_numpy()), (std, rolling.std(ddof=0).to_numpy())):
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+    # Windows of one repeated value get it exactly, with no deviation, as in pandas
+    flat = np.flatnonzero(pd.Series(values).rolling(length).apply(lambda window: np.ptp(window) == 0, raw=True) == 1)
+    assert flat.size
+    np.testing.assert_array_equal(mean[flat], values[flat])
+    np.testing.assert_array_equal(std[flat], 0.0)
+
+@pytest.mark.parametrize('length', [1, 3, 14])
+@pytest.mark.parametrize('maximum', [True, False])
+def test_rolling_extreme_loop_matches_pandas(loops, length, maximum):
+    values = _series_with_gaps_and_flats()
+    rolling = pd.Series(values).rolling(length)
+    expected = (rolling.max() if maximum else rolling.min()).to_numpy()
+    np.testing.assert_array_equal(loops[2](values, length, maximum), expected)
+
+@pytest.mark.parametrize('size', [0, 1, 4])
+def test_loops_on_frames_shorter_than_the_window(loops, size):
+    values = np.arange(size, dtype=np.float64)
+    mean, std = loops[1](values, 5)
+    assert np.isnan(mean).all() and np.isnan(std).all() and mean.size == size
+    assert np.isnan(loops[2](values, 5, True)).all()
+    np.testing.assert_allclose(loops[0](values, 0.5, True, 1), pd.Series(values).ewm(alpha=0.5).mean().to_numpy())
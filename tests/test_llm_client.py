@@ -0,0 +1,216 @@
+"""
+The streaming LLM client, sync and async, against a local fake OpenRouter SSE server.
+Each model name selects a behaviour of the server.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from config import current_config
+from services import llm_client
+from utils.http import close_async_clients
+
+def _send_headers(handler, status: int = 200) -> None:
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'text/event-stream')
+    # Chunked like the real API: the client must not wait for more bytes than one event
+    handler.send_header('Transfer-Encoding', 'chunked')
+    handler.end_headers()
+    handler.wfile.flush()
+
+def _send_line(handler, line: bytes) -> None:
+    event = line + b'\n\n'
+    handler.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+    handler.wfile.flush()
+
+def _end(handler) -> None:
+    handler.wfile.write(b'0\r\n\r\n')
+    handler.wfile.flush()
+
+def _send_token(handler, content: str) -> None:
+    _send_line(handler, b'data: ' + json.dumps({'choices': [{'delta': {'content': content}}]}).encode())
+
+def _stream(tokens: list[str], first_delay: float = 0.0, gap: float = 0.0, then_stall: float = 0.0):
+    def behaviour(handler):
+        _send_headers(handler)
+        time.sleep(first_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(gap)
+            _send_token(handler, token)
+        time.sleep(then_stall)
+        _send_line(handler, b'data: [DONE]')
+        _end(handler)
+    return behaviour
+
+def _server_error(handler):
+    _send_headers(handler, 500)
+    _end(handler)
+
+def _malformed(handler):
+    # Valid JSON that parse_stream_line cannot handle: the reader fails with a non-HTTP error
+    _send_headers(handler)
+    _send_line(handler, b'data: {"choices": [1]}')
+    time.sleep(2.0)
+    _end(handler)
+
+BEHAVIOURS = {
+    'ok': _stream(['Hello', ', ', 'world']),
+    'other': _stream(['Other']),
+    'broken': _server_error,
+    'stall': _stream(['Late'], first_delay=1.5),
+    'malformed': _malformed,
+    'slow': _stream(['S1', 'S2', 'S3'], first_delay=0.4, gap=0.2),
+    'fast': _stream(['F1', 'F2', 'F3'], gap=0.3),
+    'stops': _stream(['Start'], then_stall=1.5),
+}
+
+class FakeOpenRouter(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.requests = []  # (model, monotonic time)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((body['model'], time.monotonic()))
+        try:
+            BEHAVIOURS[body['model']](self)
+        except ConnectionError:
+            pass  # The client abandoned the attempt
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeOpenRouter()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = {
+        'OPENROUTER_URL': f'http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions',
+        'OPENROUTER_RETRIES': 1,
+        'OPENROUTER_BACKOFF_BASE': 0.2,
+        'OPENROUTER_BACKOFF_MAX': 1.0,
+        'OPENROUTER_CONNECT_TIMEOUT': 1.0,
+        'OPENROUTER_FIRST_TOKEN_TIMEOUT': 0.5,
+        'OPENROUTER_READ_TIMEOUT': 0.8,
+        'OPENROUTER_HEDGE': 1,
+        'OPENROUTER_HEDGE_DELAY': 0.0,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(current_config, name, value)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _configure(monkeypatch, models: list[str], **settings) -> None:
+    monkeypatch.setattr(current_config, 'OPENROUTER_MODELS', models)
+    for name, value in settings.items():
+        monkeypatch.setattr(current_config, f'OPENROUTER_{name}', value)
+
+def _collect(mode: str) -> tuple[list[str], float]:
+    """Tokens of one completion, and the seconds it took. Failures are raised after the stream is consumed."""
+    start = time.monotonic()
+    if mode == 'sync':
+        tokens = list(llm_client.stream_completion('prompt'))
+    else:
+        async def collect():
+            try:
+                return [token async for token in llm_client.astream_completion('prompt')]
+            finally:
+                await close_async_clients()
+        tokens = asyncio.run(collect())
+    return tokens, time.monotonic() - start
+
+def _models(server) -> list[str]:
+    return [model for model, _ in server.requests]
+
+MODES = ['sync', 'async']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_streams_tokens(server, monkeypatch, mode):
+    _configure(monkeypatch, ['ok'])
+    tokens, _ = _collect(mode)
+    assert tokens == ['Hello', ', ', 'world']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_fails_over_on_server_error(server, monkeypatch, mode):
+    _configure(monkeypatch, ['broken', 'ok'])
+    tokens, _ = _collect(mode)
+    assert tokens == ['Hello', ', ', 'world']
+    assert _models(server) == ['broken', 'ok']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_fails_over_on_first_token_stall(server, monkeypatch, mode):
+    _configure(monkeypatch, ['stall', 'ok'])
+    tokens, elapsed = _collect(mode)
+    assert tokens == ['Hello', ', ', 'world']
+    assert _models(server) == ['stall', 'ok']
+    assert 0.5 <= elapsed < 1.4
+
+@pytest.mark.parametrize('mode', MODES)
+def test_fails_over_on_reader_error_without_waiting(server, monkeypatch, mode):
+    _configure(monkeypatch, ['malformed', 'ok'], FIRST_TOKEN_TIMEOUT=5.0)
+    tokens, elapsed = _collect(mode)
+    assert tokens == ['Hello', ', ', 'world']
+    assert elapsed < 1.0
+
+@pytest.mark.parametrize('mode', MODES)
+def test_backs_off_between_retries_of_a_model(server, monkeypatch, mode):
+    _configure(monkeypatch, ['broken'], RETRIES=3)
+    with pytest.raises(llm_client.ReportGenerationError):
+        _collect(mode)
+    times = [at for _, at in server.requests]
+    assert _models(server) == ['broken'] * 3
+    # BACKOFF_BASE doubling: 0.2s, then 0.4s
+    assert 0.2 <= times[1] - times[0] < 0.5
+    assert 0.4 <= times[2] - times[1] < 0.7
+
+@pytest.mark.parametrize('mode', MODES)
+def test_retries_models_in_rounds(server, monkeypatch, mode):
+    _configure(monkeypatch, ['broken', 'stall'], RETRIES=2)
+    with pytest.raises(llm_client.ReportGenerationError):
+        _collect(mode)
+    assert _models(server) == ['broken', 'stall', 'broken', 'stall']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_hedged_attempts_do_not_mix_text(server, monkeypatch, mode):
+    # 'slow' starts first, 'fast' 0.1s later and wins; 'slow' would produce tokens while 'fast' is still streaming
+    _configure(monkeypatch, ['slow', 'fast'], HEDGE=2, HEDGE_DELAY=0.1)
+    tokens, elapsed = _collect(mode)
+    assert tokens == ['F1', 'F2', 'F3']
+    assert _models(server) == ['slow', 'fast']
+    assert elapsed < 1.2
+
+@pytest.mark.parametrize('mode', MODES)
+def test_hedge_waits_for_first_token_of_winner_only(server, monkeypatch, mode):
+    _configure(monkeypatch, ['broken', 'other'], HEDGE=2)
+    tokens, _ = _collect(mode)
+    assert tokens == ['Other']
+
+@pytest.mark.parametrize('mode', MODES)
+def test_stall_after_first_token_ends_report(server, monkeypatch, mode):
+    _configure(monkeypatch, ['stops', 'ok'])
+    tokens = []
+    with pytest.raises(llm_client.ReportGenerationError):
+        if mode == 'sync':
+            for token in llm_client.stream_completion('prompt'):
+                tokens.append(token)
+        else:
+            async def collect():
+                try:
+                    async for token in llm_client.astream_completion('prompt'):
+                        tokens.append(token)
+                finally:
+                    await close_async_clients()
+            asyncio.run(collect())
+    # Tokens already sent cannot be taken back, so the next model is not tried
+    assert tokens == ['Start']
+    assert _models(server) == ['stops']
@@ -0,0 +1,28 @@
+"""
+Per-symbol signal generation of the portfolio backtest, against the single-symbol backtest inputs.
+"""
+import pytest
+from analysis import technical_analysis
+from benchmarks.fixtures import symbol_fixtures
+from config import current_config
+from services import data_service, portfolio_service
+
+@pytest.fixture
+def bar_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(current_config, 'BAR_CACHE_ENABLED', True)
+    monkeypatch.setattr(current_config, 'BAR_CACHE_DIR', str(tmp_path / 'bars'))
+    return tmp_path
+
+def test_symbol_signals_match_the_single_symbol_backtest(bar_cache):
+    fixture = symbol_fixtures(1, 1500)['SYM0']
+    raw = fixture['5min']
+    symbol, signals = portfolio_service.symbol_signals('SYM0', raw, fixture['daily'])
+
+    # As in the single-symbol endpoint: indicators on the backtest bars, key levels from the daily bars
+    _, df_backtest = technical_analysis.calculate_technical_indicators(raw.copy())
+    key_levels = data_service.get_current_key_levels('SYM0', fixture['daily'])
+    expected = technical_analysis.generate_price_action_signals(df_backtest, key_levels, trend_filter_ema=20)
+    assert symbol == 'SYM0'
+    assert signals and signals == expected
+    # The raw frame is left as fetched; the backtest adds its own ATR
+    assert list(raw.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
@@ -0,0 +1,137 @@
+"""
+generate_price_action_signals against the bar-by-bar loop it replaced, kept below as the reference.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from analysis import technical_analysis
+from benchmarks.fixtures import symbol_fixtures
+
+def _reference_proximity(price: float, levels: dict, tolerance_percent: float) -> tuple:
+    for level_type, level_values in levels.items():
+        for name, value in level_values.items():
+            if abs(price - value) / value <= tolerance_percent:
+                return level_type, value
+    return None, None
+
+def reference_price_action_signals(df: pd.DataFrame, key_levels: dict, tolerance_percent: float = 0.005,
+                                   trend_filter_ema: int = 20) -> list:
+    """The loop generate_price_action_signals used before it was vectorized."""
+    signals = []
+    ema_col = f'EMA_{trend_filter_ema}'
+    if ema_col not in df.columns:
+        return signals
+
+    pullback_signal = technical_analysis.find_two_legged_pullback(df, ema_period=trend_filter_ema)
+    if pullback_signal:
+        signals.append((df.index[pullback_signal[1]], pullback_signal[0], 'Two-Legged Pullback'))
+
+    if 'Body' not in df.columns:
+        df['Body'] = abs(df['Close'] - df['Open'])
+    if 'Upper_Shadow' not in df.columns:
+        df['Upper_Shadow'] = df['High'] - df[['Open', 'Close']].max(axis=1)
+    if 'Lower_Shadow' not in df.columns:
+        df['Lower_Shadow'] = df[['Open', 'Close']].min(axis=1) - df['Low']
+
+    for i in range(1, len(df)):
+        current_bar = df.iloc[i]
+        prev_bar = df.iloc[i-1]
+
+        is_uptrend = current_bar['Close'] > current_bar[ema_col]
+        is_downtrend = current_bar['Close'] < current_bar[ema_col]
+
+        is_bullish_pin_bar = current_bar['Lower_Shadow'] > 2 * current_bar['Body'] and current_bar['Upper_Shadow'] < current_bar['Body']
+        if is_bullish_pin_bar and is_uptrend:
+            level_type, _ = _reference_proximity(current_bar['Low'], {'support': key_levels.get('support', {})}, tolerance_percent)
+            if level_type == 'support':
+                signals.append((current_bar.name, 'long', 'Bullish Pin Bar'))
+                continue
+
+        is_bearish_pin_bar = current_bar['Upper_Shadow'] > 2 * current_bar['Body'] and current_bar['Lower_Shadow'] < current_bar['Body']
+        if is_bearish_pin_bar and is_downtrend:
+            level_type, _ = _reference_proximity(current_bar['High'], {'resistance': key_levels.get('resistance', {})}, tolerance_percent)
+            if level_type == 'resistance':
+                signals.append((current_bar.name, 'short', 'Bearish Pin Bar'))
+                continue
+
+        is_bullish_engulfing = (current_bar['Close'] > current_bar['Open'] and
+                                prev_bar['Close'] < prev_bar['Open'] and
+                                current_bar['Close'] > prev_bar['Open'] and
+                                current_bar['Open'] < prev_bar['Close'])
+        if is_bullish_engulfing and is_uptrend:
+            level_type, _ = _reference_proximity(current_bar['Close'], {'support': key_levels.get('support', {})}, tolerance_percent)
+            if level_type == 'support':
+                signals.append((current_bar.name, 'long', 'Bullish Engulfing'))
+                continue
+
+        is_bearish_engulfing = (current_bar['Close'] < current_bar['Open'] and
+                                prev_bar['Close'] > prev_bar['Open'] and
+                                current_bar['Close'] < prev_bar['Open'] and
+                                current_bar['Open'] > prev_bar['Close'])
+        if is_bearish_engulfing and is_downtrend:
+            level_type, _ = _reference_proximity(current_bar['Close'], {'resistance': key_levels.get('resistance', {})}, tolerance_percent)
+            if level_type == 'resistance':
+                signals.append((current_bar.name, 'short', 'Bearish Engulfing'))
+                continue
+
+    return signals
+
+@pytest.fixture(scope='module')
+def enriched_frames() -> dict:
+    """Enriched 5-minute fixture frames; the first rows of their EMAs are NaN (warm-up)."""
+    frames = {}
+    for symbol, fixture in symbol_fixtures(3, 2000).items():
+        _, df = technical_analysis.calculate_technical_indicators(fixture['5min'].copy())
+        frames[symbol] = df
+    return frames
+
+def _dense_levels(df: pd.DataFrame) -> dict:
+    """Levels spread over the frame's price range, so that most bars are near one of them."""
+    quantiles = df['Close'].quantile(np.linspace(0.05, 0.95, 10)).to_numpy()
+    return {'support': {f's{i}': value for i, value in enumerate(quantiles)},
+            'resistance': {f'r{i}': value for i, value in enumerate(quantiles)}}
+
+def _assert_same_signals(df: pd.DataFrame, key_levels: dict, **params) -> list:
+    expected = reference_price_action_signals(df.copy(), key_levels, **params)
+    actual = technical_analysis.generate_price_action_signals(df.copy(), key_levels, **params)
+    assert actual == expected
+    return actual
+
+@pytest.mark.parametrize('tolerance_percent', [0.001, 0.005, 0.02])
+def test_matches_reference_on_fixture_levels(enriched_frames, tolerance_percent):
+    for symbol, fixture in symbol_fixtures(3, 2000).items():
+        key_levels = technical_analysis.get_key_levels(technical_analysis.analyze_price_action(fixture))
+        _assert_same_signals(enriched_frames[symbol], key_levels, tolerance_percent=tolerance_percent)
+
+@pytest.mark.parametrize('trend_filter_ema', [5, 20, 50])
+def test_matches_reference_on_dense_levels(enriched_frames, trend_filter_ema):
+    for df in enriched_frames.values():
+        signals = _assert_same_signals(df, _dense_levels(df), tolerance_percent=0.01, trend_filter_ema=trend_filter_ema)
+        assert {name for _, _, name in signals} >= {'Bullish Pin Bar', 'Bearish Pin Bar',
+                                                    'Bullish Engulfing', 'Bearish Engulfing'}
+
+@pytest.mark.parametrize('key_levels', [{}, {'support': {}, 'resistance': {}}, {'support': {'s': 100.0}}])
+def test_matches_reference_on_empty_level_sets(enriched_frames, key_levels):
+    for df in enriched_frames.values():
+        _assert_same_signals(df, key_levels, tolerance_percent=0.05)
+
+def test_matches_reference_in_ema_warmup(enriched_frames):
+    df = enriched_frames['SYM0']
+    assert df['EMA_50'].iloc[:49].isna().all()
+    for n_bars in (0, 1, 2, 30, 60):
+        window = df.iloc[:n_bars]
+        _assert_same_signals(window, _dense_levels(df), tolerance_percent=0.05, trend_filter_ema=50)
+
+def test_first_matching_pattern_wins(enriched_frames):
+    """On bars that are both a pin bar and an engulfing bar, only the pin bar is reported, as in the loop."""
+    df = enriched_frames['SYM0'].copy()
+    # A bearish bar followed by a bullish bar that engulfs it with a long lower shadow and no upper one
+    i = 100
+    prev_open, prev_close = 101.0, 100.0
+    open_, close = 99.9, 101.1
+    df.iloc[i - 1, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = [prev_open, 101.2, 99.8, prev_close]
+    df.iloc[i, df.columns.get_indexer(['Open', 'High', 'Low', 'Close', 'EMA_20'])] = [open_, close, 96.0, close, 95.0]
+    levels = {'support': {'pin': 96.0, 'engulfing': close}, 'resistance': {}}
+    signals = _assert_same_signals(df, levels, tolerance_percent=0.0001)
+    assert (df.index[i], 'long', 'Bullish Pin Bar') in signals
+    assert (df.index[i], 'long', 'Bullish Engulfing') not in signals
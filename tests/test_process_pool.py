@@ -0,0 +1,58 @@
+"""
+The shared process pools, and the watchlist scan run through them.
+"""
+import multiprocessing
+import os
+import pytest
+from benchmarks.fixtures import symbol_fixtures
+from services import data_service, watchlist_service
+from utils import process_pool
+
+def _start_method() -> str:
+    return multiprocessing.get_start_method()
+
+@pytest.fixture
+def pools():
+    yield process_pool
+    for name in list(process_pool._pools):
+        process_pool.shutdown_process_pool(name)
+
+def test_pool_is_created_once_per_process(pools):
+    pool = pools.get_process_pool('test', 2)
+    assert pools.get_process_pool('test', 4) is pool
+    assert pool._max_workers == 2
+    assert pools.get_process_pool('other', 2) is not pool
+
+def test_workers_are_not_forked_from_the_caller(pools):
+    pool = pools.get_process_pool('test', 1)
+    assert pool._mp_context.get_start_method() == process_pool.START_METHOD
+    assert pool.submit(_start_method).result(timeout=60) == process_pool.START_METHOD
+    assert pool.submit(os.getppid).result(timeout=60) != os.getpid()
+
+def test_pool_inherited_through_a_fork_is_replaced(pools, monkeypatch):
+    pool = pools.get_process_pool('test', 1)
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert pools.get_process_pool('test', 1) is not pool
+
+def test_shutdown_drops_the_pool(pools):
+    pool = pools.get_process_pool('test', 1)
+    pools.shutdown_process_pool('test')
+    assert 'test' not in pools._pools
+    assert pools.get_process_pool('test', 1) is not pool
+
+def test_watchlist_scan_reuses_the_pool(pools, monkeypatch):
+    fixtures = symbol_fixtures(2, 600)
+    timeframes = {'1Day': 'daily', '5Min': '5min'}
+
+    def get_bars_for_symbols(symbols, timeframe, start_date, end_date, **kwargs):
+        return {symbol: fixtures[symbol][timeframes[str(timeframe)]] if symbol in fixtures else None for symbol in symbols}
+    monkeypatch.setattr(data_service, 'get_bars_for_symbols', get_bars_for_symbols)
+
+    results = {result['symbol']: result for result in watchlist_service.scan_watchlist(['SYM0', 'SYM1', 'NONE'], max_workers=2)}
+    pool = pools._pools['watchlist'][0]
+    assert results['NONE'] == {'symbol': 'NONE', 'error': 'No data returned.'}
+    for symbol in ('SYM0', 'SYM1'):
+        assert results[symbol] == watchlist_service.analyze_symbol(symbol, {'daily': fixtures[symbol]['daily'],
+                                                                            '5min': fixtures[symbol]['5min']})
+    list(watchlist_service.scan_watchlist(['SYM0'], max_workers=2))
+    assert pools._pools['watchlist'][0] is pool
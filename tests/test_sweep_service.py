@@ -0,0 +1,142 @@
+"""
+Parameter sweeps: the grid expansion and its limit, and the pooled sweep against direct backtests.
+"""
+import time
+from multiprocessing import shared_memory
+import pytest
+from analysis import indicator_kernels, technical_analysis
+from app import app
+from benchmarks.fixtures import symbol_fixtures
+from services import backtest_service, sweep_service
+from utils import process_pool
+
+def test_grid_defaults_to_one_combination():
+    assert sweep_service.expand_param_grid({}) == [sweep_service.SWEEP_DEFAULTS]
+
+def test_grid_expands_ranges_lists_and_values():
+    grid = sweep_service.expand_param_grid({
+        'atr_multiplier': {'start': 1.0, 'stop': 2.0, 'step': 0.5},
+        'reward_risk_ratio': [1.5, 3],
+        'tolerance_percent': 0.01,
+    })
+    assert len(grid) == 6
+    assert sorted({params['atr_multiplier'] for params in grid}) == [1.0, 1.5, 2.0]
+    assert sorted({params['reward_risk_ratio'] for params in grid}) == [1.5, 3.0]
+    assert {params['tolerance_percent'] for params in grid} == {0.01}
+    assert {params['trend_filter_ema'] for params in grid} == {20}
+
+def test_range_stop_is_inclusive_despite_float_steps():
+    grid = sweep_service.expand_param_grid({'tolerance_percent': {'start': 0.001, 'stop': 0.003, 'step': 0.001}})
+    assert [params['tolerance_percent'] for params in grid] == [0.001, 0.002, 0.003]
+
+@pytest.mark.parametrize('spec', [{'start': 10, 'stop': 30, 'step': 10}, [10.0, 20.0, 30.0], ['10', '20', '30']])
+def test_trend_filter_ema_is_coerced_to_int(spec):
+    values = [params['trend_filter_ema'] for params in sweep_service.expand_param_grid({'trend_filter_ema': spec})]
+    assert values == [10, 20, 30]
+    assert all(type(value) is int for value in values)
+
+@pytest.mark.parametrize('param_ranges', [
+    {'atr_multiplier': {'start': 0, 'stop': 1e12, 'step': 1}},
+    {'atr_multiplier': {'start': 0, 'stop': 1e300, 'step': 1e-300}},
+    # Each range is within the limit, their product is not
+    {'atr_multiplier': {'start': 1, 'stop': 20, 'step': 1}, 'reward_risk_ratio': {'start': 1, 'stop': 20, 'step': 1},
+     'tolerance_percent': {'start': 0.001, 'stop': 0.02, 'step': 0.001}},
+])
+def test_oversized_grid_is_rejected_before_expansion(param_ranges):
+    start = time.perf_counter()
+    with pytest.raises(ValueError, match='the limit is 1000|too many values'):
+        sweep_service.expand_param_grid(param_ranges, max_combinations=1000)
+    assert time.perf_counter() - start < 0.1
+
+def test_grid_at_the_limit_is_accepted():
+    grid = sweep_service.expand_param_grid({'atr_multiplier': {'start': 1, 'stop': 10, 'step': 1},
+                                            'reward_risk_ratio': list(range(1, 101))}, max_combinations=1000)
+    assert len(grid) == 1000
+
+@pytest.mark.parametrize('param_ranges, message', [
+    ({'atr': [1.0]}, 'Unknown sweep parameters'),
+    ({'atr_multiplier': {'start': 1, 'stop': 2, 'step': 0}}, 'must be positive'),
+    ({'atr_multiplier': {'start': 1, 'stop': 2}}, "needs numeric 'start', 'stop' and 'step'"),
+    ({'atr_multiplier': {'start': 'a', 'stop': 2, 'step': 1}}, "needs numeric 'start', 'stop' and 'step'"),
+    ({'atr_multiplier': {'start': 1, 'stop': float('inf'), 'step': 1}}, 'must be finite'),
+    ({'atr_multiplier': {'start': 2, 'stop': 1, 'step': 1}}, 'is empty'),
+    ({'atr_multiplier': []}, 'is empty'),
+    ({'trend_filter_ema': ['fast']}, 'non-numeric'),
+])
+def test_invalid_ranges_are_rejected(param_ranges, message):
+    with pytest.raises(ValueError, match=message):
+        sweep_service.expand_param_grid(param_ranges, max_combinations=1000)
+
+def test_endpoint_rejects_oversized_grid_before_fetching(monkeypatch):
+    monkeypatch.setattr('app._prepare_backtest_inputs', lambda *args: pytest.fail('fetched data for a rejected sweep'))
+    response = app.test_client().post('/backtest/AAPL/sweep', json={'atr_multiplier': {'start': 0, 'stop': 1e12, 'step': 1}})
+    assert response.status_code == 400
+    assert 'the limit is' in response.get_json()['message']
+
+def _sweep_inputs(seed: int) -> tuple:
+    fixture = symbol_fixtures(1, 1500, seed=seed)['SYM0']
+    _, df = technical_analysis.calculate_technical_indicators(fixture['5min'].copy())
+    return df, technical_analysis.get_key_levels(technical_analysis.analyze_price_action(fixture))
+
+def _assert_matches_direct_backtests(df, key_levels, events) -> None:
+    # The sweep adds the EMAs its trend filters need
+    reference = df.copy()
+    reference['EMA_30'] = indicator_kernels.ema(df['Close'].to_numpy(dtype=float), 30)
+    for event in events[:-1]:
+        params = event['params']
+        signals = technical_analysis.generate_price_action_signals(
+            reference.copy(), key_levels, tolerance_percent=params['tolerance_percent'], trend_filter_ema=params['trend_filter_ema'])
+        expected = backtest_service.get_backtest_results(reference, signals, atr_multiplier=params['atr_multiplier'],
+                                                         reward_risk_ratio=params['reward_risk_ratio'], engine='vectorized')
+        assert event['signals'] == len(signals)
+        assert event['summary'] == pytest.approx(expected['summary'])
+
+@pytest.fixture
+def shared_blocks(monkeypatch) -> list:
+    """The names of the shared memory blocks created by the sweeps."""
+    names = []
+    share_frame = sweep_service.share_frame
+
+    def recording(*args):
+        shm, spec = share_frame(*args)
+        names.append(spec['name'])
+        return shm, spec
+    monkeypatch.setattr(sweep_service, 'share_frame', recording)
+    return names
+
+def _assert_unlinked(name: str) -> None:
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+PARAM_RANGES = {'atr_multiplier': [1.0, 2.0], 'trend_filter_ema': [20, 30], 'tolerance_percent': 0.01}
+
+def test_sweep_matches_direct_backtests(shared_blocks):
+    df, key_levels = _sweep_inputs(seed=0)
+    events = list(sweep_service.sweep_backtest_results(df, key_levels, PARAM_RANGES, max_workers=2))
+
+    assert [event['type'] for event in events] == ['result'] * 4 + ['ranking']
+    assert all(event['signals'] for event in events[:-1])
+    _assert_matches_direct_backtests(df, key_levels, events)
+    ranking = events[-1]['results']
+    assert [result['summary']['total_pnl'] for result in ranking] == sorted(
+        (event['summary']['total_pnl'] for event in events[:-1]), reverse=True)
+    _assert_unlinked(shared_blocks[0])
+
+def test_later_sweeps_reuse_the_pool_with_their_own_frame(shared_blocks):
+    first, second = _sweep_inputs(seed=0), _sweep_inputs(seed=1)
+    list(sweep_service.sweep_backtest_results(*first, PARAM_RANGES, max_workers=2))
+    pool = process_pool._pools['sweep'][0]
+    events = list(sweep_service.sweep_backtest_results(*second, PARAM_RANGES, max_workers=2))
+    assert process_pool._pools['sweep'][0] is pool
+    _assert_matches_direct_backtests(*second, events)
+
+def test_stopping_early_cancels_the_rest_and_frees_the_frame(shared_blocks):
+    df, key_levels = _sweep_inputs(seed=0)
+    param_ranges = {'atr_multiplier': {'start': 1.0, 'stop': 3.0, 'step': 0.1}, 'reward_risk_ratio': [1.5, 2.0, 3.0]}
+    sweep = sweep_service.sweep_backtest_results(df, key_levels, param_ranges, max_workers=2)
+    assert next(sweep)['type'] == 'result'
+    sweep.close()
+    _assert_unlinked(shared_blocks[0])
+    # The pool is still usable
+    events = list(sweep_service.sweep_backtest_results(df, key_levels, PARAM_RANGES, max_workers=2))
+    assert len(events) == 5
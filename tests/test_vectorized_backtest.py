@@ -0,0 +1,52 @@
+"""
+The vectorized backtest engine against the backtrader run it mirrors.
+"""
+import pytest
+from analysis import technical_analysis
+from benchmarks.fixtures import symbol_fixtures
+from services import backtest_service
+
+@pytest.fixture(scope='module')
+def enriched_frames() -> list:
+    frames = []
+    for fixture in symbol_fixtures(2, 1500).values():
+        _, df = technical_analysis.calculate_technical_indicators(fixture['5min'].copy())
+        frames.append(df)
+    return frames
+
+def _periodic_signals(df, directions: list, every: int = 7) -> list:
+    """A signal every `every` bars, cycling through `directions`."""
+    return [(timestamp, directions[i % len(directions)], 'Fixture')
+            for i, timestamp in enumerate(df.index[::every])]
+
+def _without_ref(trades: list) -> list:
+    # backtrader numbers trades with a counter shared by every run in the process
+    return [{key: value for key, value in trade.items() if key != 'ref'} for trade in trades]
+
+def _assert_same_results(df, signals: list, atr_multiplier: float, reward_risk_ratio: float) -> dict:
+    expected = backtest_service.run_backtest(df, signals, atr_multiplier, reward_risk_ratio, engine='backtrader')
+    actual = backtest_service.run_backtest(df, signals, atr_multiplier, reward_risk_ratio, engine='vectorized')
+    assert _without_ref(actual['trades']) == _without_ref(expected['trades'])
+    assert actual['summary'].keys() == expected['summary'].keys()
+    for key, value in expected['summary'].items():
+        assert actual['summary'][key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+    return actual
+
+@pytest.mark.parametrize('directions', [['long'], ['short'], ['long', 'short']])
+@pytest.mark.parametrize('atr_multiplier, reward_risk_ratio', [(2.0, 2.0), (1.0, 3.0), (0.5, 1.0)])
+def test_matches_backtrader_on_periodic_signals(enriched_frames, directions, atr_multiplier, reward_risk_ratio):
+    for df in enriched_frames:
+        results = _assert_same_results(df, _periodic_signals(df, directions), atr_multiplier, reward_risk_ratio)
+        assert {trade['direction'] for trade in results['trades']} == set(directions)
+
+def test_matches_backtrader_on_price_action_signals(enriched_frames):
+    for df in enriched_frames:
+        quantiles = df['Close'].quantile([0.2, 0.4, 0.6, 0.8]).to_numpy()
+        key_levels = {'support': {f's{i}': value for i, value in enumerate(quantiles)},
+                      'resistance': {f'r{i}': value for i, value in enumerate(quantiles)}}
+        signals = technical_analysis.generate_price_action_signals(df.copy(), key_levels, tolerance_percent=0.01)
+        assert {direction for _, direction, _ in signals} == {'long', 'short'}
+        _assert_same_results(df, signals, 2.0, 2.0)
+
+def test_matches_backtrader_without_signals(enriched_frames):
+    _assert_same_results(enriched_frames[0], [], 2.0, 2.0)
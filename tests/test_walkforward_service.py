@@ -0,0 +1,45 @@
+"""
+The walk-forward backtest, with its steps scanned in the shared pool, against each step scanned directly.
+"""
+from datetime import datetime
+import pandas as pd
+import pytest
+from analysis import technical_analysis
+from benchmarks.fixtures import symbol_fixtures
+from services import walkforward_service
+from utils import process_pool
+
+@pytest.fixture(scope='module')
+def frames() -> tuple:
+    fixture = symbol_fixtures(1, 3000)['SYM0']
+    _, df = technical_analysis.calculate_technical_indicators(fixture['5min'].copy())
+    return df, fixture['daily']
+
+def test_steps_match_direct_scans(frames):
+    df, df_daily = frames
+    results = walkforward_service.walk_forward_results(df, df_daily, datetime(2020, 1, 4), step_days=2, max_workers=2)
+    steps = results['steps']
+    assert len(steps) > walkforward_service.MIN_STEPS_PER_TASK
+    assert results['summary']['steps'] == len(steps)
+
+    total = 0
+    for step in steps:
+        start, end = df.index.get_loc(pd.Timestamp(step['start'])), df.index.get_loc(pd.Timestamp(step['end'])) + 1
+        signals = technical_analysis.generate_price_action_signals(
+            df.iloc[max(start - 1, 0):end].copy(), step['key_levels'], tolerance_percent=0.005, trend_filter_ema=20)
+        signals = [signal for signal in signals if signal[0] >= df.index[start]]
+        assert step['signals'] == len(signals), step['start']
+        total += len(signals)
+    assert total and results['summary']['signals'] == total
+
+def test_later_runs_reuse_the_pool(frames):
+    df, df_daily = frames
+    first = walkforward_service.walk_forward_results(df, df_daily, datetime(2020, 1, 4), step_days=2, max_workers=2)
+    pool = process_pool._pools['walkforward'][0]
+    # A shorter frame in a new shared block
+    second = walkforward_service.walk_forward_results(df.iloc[:2000], df_daily, datetime(2020, 1, 4), step_days=2,
+                                                      max_workers=2)
+    assert process_pool._pools['walkforward'][0] is pool
+    assert [second['steps'][0][key] for key in ('start', 'key_levels', 'signals')] == \
+        [first['steps'][0][key] for key in ('start', 'key_levels', 'signals')]
+    assert len(second['steps']) < len(first['steps'])
@@ -1,3 +1,15 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+def json_default(obj):
+    """Converts NumPy scalars and timestamps found in analysis results to JSON types."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Timestamp, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 def format_indicator(value, precision=2):
     if isinstance(value, (int, float)):
         return f"{value:.{precision}f}"
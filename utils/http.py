@@ -0,0 +1,68 @@
+import os
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import current_config
+
+class TimeoutSession(requests.Session):
+    """A requests.Session that applies a default (connect, read) timeout to every request."""
+    def __init__(self, timeout: tuple[float, float]):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+def _new_session(read_timeout: float) -> TimeoutSession:
+    session = TimeoutSession(timeout=(current_config.HTTP_CONNECT_TIMEOUT, read_timeout))
+    adapter = HTTPAdapter(pool_connections=current_config.HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=current_config.HTTP_POOL_MAXSIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session(name: str, read_timeout: float = None) -> requests.Session:
+    """
+    Returns the keep-alive session for `name`, shared by all threads of this worker process.
+    Sessions are created lazily and recreated after a fork, so gunicorn workers and pool
+    processes never share sockets with their parent.
+    """
+    global _sessions_pid
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        if name not in _sessions:
+            _sessions[name] = _new_session(read_timeout or current_config.HTTP_READ_TIMEOUT)
+        return _sessions[name]
+
+_async_clients = {}
+
+def get_async_client(name: str, read_timeout: float = None, max_connections: int = None,
+                     pool_timeout: float = None) -> httpx.AsyncClient:
+    """
+    Returns the keep-alive httpx.AsyncClient for `name`, shared by all requests on this worker's event loop.
+    The pool holds up to `max_connections` connections (HTTP_POOL_MAXSIZE by default, 0 for no limit);
+    a request waits up to `pool_timeout` seconds for one (the read timeout by default).
+    """
+    if name not in _async_clients:
+        read_timeout = read_timeout or current_config.HTTP_READ_TIMEOUT
+        if max_connections is None:
+            max_connections = current_config.HTTP_POOL_MAXSIZE
+        _async_clients[name] = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=current_config.HTTP_CONNECT_TIMEOUT,
+                                  pool=read_timeout if pool_timeout is None else pool_timeout),
+            limits=httpx.Limits(max_connections=max_connections or None,
+                                max_keepalive_connections=current_config.HTTP_POOL_CONNECTIONS))
+    return _async_clients[name]
+
+async def close_async_clients() -> None:
+    while _async_clients:
+        _, client = _async_clients.popitem()
+        await client.aclose()
@@ -0,0 +1,180 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from config import current_config
+
+# Upper bounds in seconds; +Inf is implied
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    """
+    A Prometheus-style histogram with one label. Observations are kept per process; when
+    METRICS_DIR is set, each process also publishes its state there so that /metrics can
+    report the totals of all gunicorn workers. The files are named after the pid and start
+    time of the process; those of processes that are gone are removed when collected.
+    """
+    def __init__(self, name: str, documentation: str, label: str, buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> {'buckets': [...], 'sum': float, 'count': int}
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self) -> None:
+        self._pid = os.getpid()
+        self._started = time.time_ns()
+        self._last_publish = 0.0
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: start from empty series, the parent's observations are not ours
+                self._series = {}
+                self._start()
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += seconds
+            series['count'] += 1
+            publish = time.monotonic() - self._last_publish >= current_config.METRICS_PUBLISH_INTERVAL
+            if publish:
+                self._last_publish = time.monotonic()
+        if publish:
+            self.publish()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            return json.loads(json.dumps(self._series))
+
+    def _publish_path(self) -> str:
+        return os.path.join(current_config.METRICS_DIR, f"{self.name}.{self._pid}.{self._started}.json")
+
+    def _published_paths(self) -> list[tuple[str, int]]:
+        """(path, pid) of every file published for this histogram."""
+        paths = []
+        for path in glob.glob(os.path.join(current_config.METRICS_DIR, f"{self.name}.*.*.json")):
+            pid = os.path.basename(path)[len(self.name) + 1:].split('.')[0]
+            if pid.isdigit():
+                paths.append((path, int(pid)))
+        return paths
+
+    def publish(self) -> None:
+        """Writes this process's series to METRICS_DIR (if configured), atomically."""
+        if not current_config.METRICS_DIR:
+            return
+        try:
+            os.makedirs(current_config.METRICS_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=current_config.METRICS_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            own_path = self._publish_path()
+            os.replace(tmp_path, own_path)
+            # A file with our pid but another start time was left by a dead process that had the same pid
+            for path, pid in self._published_paths():
+                if pid == self._pid and path != own_path:
+                    _remove(path)
+        except Exception as e:
+            print(f"Error publishing metrics: {e}")
+
+    def collect(self) -> dict:
+        """Series of this process, plus those published by the other live processes."""
+        merged = self.snapshot()
+        if not current_config.METRICS_DIR:
+            return merged
+        own_path = self._publish_path()
+        for path, pid in self._published_paths():
+            if path == own_path:
+                continue
+            if pid == os.getpid() or not _pid_alive(pid):
+                # Left by a dead worker: its observations would be counted forever
+                _remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    published = json.load(f)
+            except Exception:
+                continue
+            for label_value, series in published.items():
+                target = merged.setdefault(label_value, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+                target['buckets'] = [a + b for a, b in zip(target['buckets'], series['buckets'])]
+                target['sum'] += series['sum']
+                target['count'] += series['count']
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.collect().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return "\n".join(lines) + "\n"
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+stage_duration = Histogram('stage_duration_seconds', 'Duration of analysis and backtest stages.', 'stage')
+
+class StageTimer:
+    """
+    Collects the durations of the stages of one request, and records each of them in the
+    stage_duration_seconds histogram. Safe to share with the fetch threads of the request.
+    """
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        stage_duration.observe(stage, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def get_ms(self, *stages: str) -> dict:
+        """Durations in milliseconds, for the given stages or all of them."""
+        with self._lock:
+            return {name: round(seconds * 1000.0, 1) for name, seconds in self.durations.items()
+                    if not stages or name in stages}
+
+def timer_or_new(timer: StageTimer = None) -> StageTimer:
+    """Functions that take an optional timer still record their stages in the histogram without one."""
+    return timer if timer is not None else StageTimer()
+
+def render_metrics() -> str:
+    return stage_duration.render()
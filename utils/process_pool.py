@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Pool workers are forked from a small server process instead of from the web worker, so they do
+# not inherit its threads, locks, sockets and HTTP clients; modules they all need are preloaded there
+START_METHOD = 'forkserver'
+PRELOAD_MODULES = ['numpy', 'pandas', 'analysis.technical_analysis']
+
+_pools = {}  # name -> (pool, pid of the process that created it)
+_pools_lock = threading.Lock()
+
+def _context():
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == 'forkserver':
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+def get_process_pool(name: str, max_workers: int) -> ProcessPoolExecutor:
+    """
+    The process pool `name` of this process, created on first use and reused by later calls; `max_workers`
+    only applies when it is created. A pool inherited through a fork, or broken by a worker that died,
+    is replaced. Workers are started when tasks need them, so an idle pool costs no processes.
+    """
+    with _pools_lock:
+        pool, pid = _pools.get(name, (None, None))
+        if pool is None or pid != os.getpid() or pool._broken:
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_context())
+            _pools[name] = (pool, os.getpid())
+        return pool
+
+def shutdown_process_pool(name: str) -> None:
+    """Stops the workers of this process's pool `name`, if it has one; running tasks are finished first."""
+    with _pools_lock:
+        pool, pid = _pools.pop(name, (None, None))
+    if pool is not None and pid == os.getpid():
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def cancel_pending(futures) -> None:
+    """Drops the tasks of a request that have not started, e.g. when its client disconnects."""
+    for future in futures:
+        future.cancel()
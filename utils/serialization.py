@@ -0,0 +1,37 @@
+import orjson
+from flask.json.provider import JSONProvider
+from utils.formatters import json_default
+
+# NumPy arrays and scalars are encoded natively; NaN and infinities become null
+DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps_bytes(obj) -> bytes:
+    """Encodes obj as UTF-8 JSON with orjson; timestamps and other NumPy types go through json_default."""
+    return orjson.dumps(obj, default=json_default, option=DUMPS_OPTIONS)
+
+def dumps(obj) -> str:
+    return dumps_bytes(obj).decode('utf-8')
+
+def loads(data):
+    return orjson.loads(data)
+
+def columnar(rows: list[dict]) -> dict[str, list]:
+    """
+    A list of records as one list per field, in first-seen field order, so that the keys are sent
+    once instead of once per record. Fields missing from a record (e.g. the symbol of
+    single-symbol trades) are None.
+    """
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider encoding with orjson, so jsonify responses skip the standard library encoder."""
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')